@@ -3,11 +3,11 @@ import os
 import shutil
 import json
 import tkinter as tk
-from PIL import Image, ImageDraw, ImageTk, ImageFont
+from PIL import Image, ImageTk, ImageFont
+from romanface import FaceRenderer, upload_tk
 from datetime import datetime
 import pytz
 import time
-import math
 import threading
 import ntplib
 import ctypes
@@ -50,6 +50,7 @@ def load_config():
         "follow_mouse": "True",
         "show_exit_button": "True",
         "digital_clock": "True",
+        "theme": "glow",
         "font_name": "arial.ttf",
         "font_size": "10",
         "ntp_sync": "True",
@@ -161,6 +162,7 @@ class RomanClock:
         self.timezone = pytz.timezone(load_timezone_from_config())
         # self.timezone = pytz.timezone("Asia/singapore")
         self.root = root
+        self.theme = config["theme"]
         self.root.title("Roman Clock")
         self.root.geometry(f"{config['window_width']}x{config['window_height']}")
  
@@ -236,6 +238,9 @@ class RomanClock:
         # Get NTP offset once at start
         self.offset = self.get_ntp_offset()
 
+        self.face = FaceRenderer(100, self.font, self.theme)
+        self.photo = None  # created on the first tick, then updated in place
+
         # Draw clock initially
         self.update_clock()
 
@@ -270,48 +275,14 @@ class RomanClock:
             return 0
 
     def draw_clock(self, hour, minute, second):
-        image = Image.new("RGBA", (100, 100), (0, 0, 0, 0))  # transparent background
-        draw = ImageDraw.Draw(image)
-
-        center = 50
-        radius = 45
-        roman = ["XII", "I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X", "XI"]
-
-        # Draw glowing Roman numerals
-        for i in range(12):
-            angle = math.radians(i * 30 - 90)
-            x = center + radius * 0.8 * math.cos(angle)
-            y = center + radius * 0.8 * math.sin(angle)
-
-            # Glow effect: draw text multiple times offset with translucent green
-            for dx in [-1, 0, 1]:
-                for dy in [-1, 0, 1]:
-                    draw.text((x - 8 + dx, y - 8 + dy), roman[i], font=self.font, fill=(0, 255, 0, 90))
-            # Main text
-            draw.text((x - 8, y - 8), roman[i], font=self.font, fill=(0, 255, 0, 255))
-
-        def draw_hand(length, angle_deg, width, color):
-            angle = math.radians(angle_deg - 90)
-            x = center + length * math.cos(angle)
-            y = center + length * math.sin(angle)
-            draw.line((center, center, x, y), fill=color, width=width)
-
-        # Hour hand glow
-        for offset in [-1, 0, 1]:
-            draw_hand(25, (hour % 12 + minute / 60) * 30 + offset, 4, (0, 255, 0, 120))
-        draw_hand(25, (hour % 12 + minute / 60) * 30, 4, (0, 255, 0, 255))
-
-        # Minute hand glow
-        for offset in [-1, 0, 1]:
-            draw_hand(35, minute * 6 + offset, 2, (0, 255, 255, 120))
-        draw_hand(35, minute * 6, 2, (0, 255, 255, 255))
-
-        # Second hand glow
-        for offset in [-1, 0, 1]:
-            draw_hand(40, second * 6 + offset, 1, (255, 0, 0, 120))
-        draw_hand(40, second * 6, 1, (255, 0, 0, 255))
-
-        return ImageTk.PhotoImage(image)
+        # Only the box under the hands that moved is redrawn and sent to Tk
+        box = self.face.update(hour, minute, second)
+        if self.photo is None:
+            self.photo = ImageTk.PhotoImage(self.face.image)
+            self.scratch = ImageTk.PhotoImage("RGBA", self.face.image.size)
+            self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
+        elif box:
+            upload_tk(self.photo, self.scratch, self.face.image, box)
 
     def update_clock(self):
         now = datetime.now(pytz.utc).astimezone(self.timezone)
@@ -319,9 +290,7 @@ class RomanClock:
         # now = time.localtime(time.time() + self.offset)
         # hour, minute, second = now.tm_hour, now.tm_min, now.tm_sec
 
-        photo = self.draw_clock(hour, minute, second)
-        self.canvas.create_image(0, 0, anchor=tk.NW, image=photo)
-        self.canvas.image = photo  # prevent garbage collection
+        self.draw_clock(hour, minute, second)
     
         if self.label:
             current_time = time.strftime("%H:%M:%S")
@@ -1,9 +1,9 @@
-import math
 import time
 import pytz
 import ntplib
 from datetime import datetime
-from PIL import Image, ImageDraw, ImageFont
+from PIL import ImageFont
+from romanface import FaceRenderer
 from kivy.app import App
 from kivy.uix.widget import Widget
 from kivy.uix.image import Image as KivyImage
@@ -15,17 +15,9 @@ from kivy.graphics.texture import Texture
 from kivy.resources import resource_find
 from kivy.core.window import Window
 from kivy.base import EventLoop
-import io
 
 CONFIG_FILE = "timezone.cfg"
 
-ROMAN_NUMERALS = {
-    1: "I", 2: "II", 3: "III", 4: "IV", 5: "V",
-    6: "VI", 7: "VII", 8: "VIII", 9: "IX", 10: "X",
-    11: "XI", 12: "XII"
-}
-
-
 def load_timezone_from_config():
     try:
         with open(CONFIG_FILE, "r") as f:
@@ -46,6 +38,10 @@ class RomanClockWidget(FloatLayout):
         self.add_widget(self.image)
         self.add_widget(self.label)
 
+        font_path = resource_find("data/fonts/DejaVuSans.ttf")
+        self.face = FaceRenderer(200, ImageFont.truetype(font_path, 16), theme="ring")
+        self.texture = None  # one texture for the app's lifetime, updated in place
+
         self.timezone = pytz.timezone(load_timezone_from_config())
         self.offset = self.get_ntp_offset()
         KivyClock.schedule_interval(self.update_clock, 1)
@@ -62,8 +58,12 @@ class RomanClockWidget(FloatLayout):
         now = datetime.utcfromtimestamp(time.time() + self.offset)
         now = pytz.utc.localize(now).astimezone(self.timezone)
 
-        pil_img = self.draw_clock(now.hour, now.minute, now.second)
-        self.image.texture = self.pil_image_to_texture(pil_img)
+        box = self.face.update(now.hour, now.minute, now.second)
+        if self.texture is None:
+            self.texture = self.pil_image_to_texture(self.face.image)
+            self.image.texture = self.texture
+        elif box:
+            self.blit_region(box)
         self.label.text = now.strftime("%H:%M:%S")
 
     def pil_image_to_texture(self, pil_img):
@@ -74,51 +74,15 @@ class RomanClockWidget(FloatLayout):
         texture.flip_vertical()
         return texture
 
-    def draw_clock(self, hour, minute, second):
-        size = 200
-        center = size // 2
-        radius = size // 2 - 10
-
-        img = Image.new("RGBA", (size, size), (0, 0, 0, 200))
-        draw = ImageDraw.Draw(img)
-
-        # Draw outer circle glow
-        for i in range(8, 0, -1):
-            draw.ellipse(
-                [i, i, size - i, size - i],
-                outline=(0, 255, 0, 20 + i * 10)
-            )
-
-        # Draw Roman numerals
-        for h in range(1, 13):
-            angle = math.radians((h / 12) * 360 - 90)
-            x = center + math.cos(angle) * (radius - 25)
-            y = center + math.sin(angle) * (radius - 25)
-            numeral = ROMAN_NUMERALS[h]
-         # font = ImageFont.truetype("arial.ttf", 16)
-            font_path = resource_find("data/fonts/DejaVuSans.ttf")
-            font = ImageFont.truetype(font_path, 16)
-         # w, h_text = draw.textsize(numeral, font=font)
-            bbox = draw.textbbox((0, 0), numeral, font=font)
-            w, h_text = bbox[2] - bbox[0], bbox[3] - bbox[1]
-            draw.text((x - w / 2, y - h_text / 2), numeral, font=font, fill=(0, 255, 0))
-
-        # Draw hands
-        def draw_hand(angle_deg, length, width, color):
-            angle_rad = math.radians(angle_deg - 90)
-            x = center + length * math.cos(angle_rad)
-            y = center + length * math.sin(angle_rad)
-            draw.line((center, center, x, y), fill=color, width=width)
-
-        second_angle = (second / 60) * 360
-        minute_angle = (minute / 60) * 360 + (second / 60) * 6
-        hour_angle = ((hour % 12) / 12) * 360 + (minute / 60) * 30
-
-        draw_hand(hour_angle, radius * 0.5, 4, (0, 255, 0))
-        draw_hand(minute_angle, radius * 0.75, 3, (0, 255, 0))
-        draw_hand(second_angle, radius * 0.9, 1, (0, 255, 0))
-
-        return img
+    def blit_region(self, box):
+        # Only the part of the face under the hands that moved is uploaded.
+        # Texture rows are in PIL order (flip_vertical only changes how it is
+        # shown), so the box goes to the same x, y.
+        left, top, right, bottom = box
+        data = self.face.image.crop(box).tobytes()
+        self.texture.blit_buffer(data, size=(right - left, bottom - top), pos=(left, top),
+                                 colorfmt='rgba', bufferfmt='ubyte')
+        self.image.canvas.ask_update()
 
 
 class RomanClockApp(App):
@@ -0,0 +1,161 @@
+import argparse
+import sys
+import time
+import tkinter as tk
+from datetime import datetime
+
+import pytz
+from PIL import ImageFont, ImageTk
+
+from romanface import THEMES, FaceRenderer, upload_tk
+
+# Several Roman clocks, one per timezone, hosted in one process: one Tk
+# interpreter, one window and one after() tick driving every face, instead
+# of a process (and two timers) per clock. All faces use the same font
+# object, so faces of the same size and theme share romanface's dial layer
+# and hand sprites and each extra clock only costs its own frame.
+#
+#   python multiclock.py Asia/Singapore Europe/London America/New_York
+#   python multiclock.py --clocks clocks.txt --size 200 --theme outline --ntp
+#
+# clocks.txt has one clock per line: a timezone, optionally followed by a
+# theme. Blank lines and lines starting with # are skipped. Drag the window
+# to move it; Escape or Ctrl+Q quits.
+
+DEFAULT_SIZE = 100
+DEFAULT_THEME = "glow"
+BACKGROUND = "black"
+TICK_SLACK_MS = 5  # fire just after the second turns over, never just before
+
+
+def read_clocks(path, theme):
+    # [(timezone, theme)] from a clock list file
+    clocks = []
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            clocks.append((fields[0], fields[1] if len(fields) > 1 else theme))
+    return clocks
+
+
+def load_font():
+    try:
+        return ImageFont.truetype("arial.ttf", 10)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def ntp_offset(server):
+    # Seconds to add to time.time(), 0 if the server can't be reached
+    try:
+        import ntplib
+        return ntplib.NTPClient().request(server, version=3).tx_time - time.time()
+    except Exception:
+        return 0.0
+
+
+class ClockFace:
+    # One timezone: a canvas holding a single PhotoImage, the digital time
+    # and the place name
+    def __init__(self, master, timezone, size, font, theme):
+        self.timezone = pytz.timezone(timezone)
+        self.face = FaceRenderer(size, font, theme)
+        self.photo = None
+        self.scratch = None
+
+        self.frame = tk.Frame(master, bg=BACKGROUND)
+        self.canvas = tk.Canvas(self.frame, width=size, height=size, bg=BACKGROUND, highlightthickness=0)
+        self.canvas.pack()
+        self.label = tk.Label(self.frame, text="", fg="lime", bg=BACKGROUND, font=("Consolas", 10))
+        self.label.pack()
+        place = timezone.split("/")[-1].replace("_", " ")
+        tk.Label(self.frame, text=place, fg="gray", bg=BACKGROUND, font=("Consolas", 8)).pack()
+
+    def tick(self, utc):
+        now = utc.astimezone(self.timezone)
+        box = self.face.update(now.hour, now.minute, now.second)
+        if self.photo is None:
+            self.photo = ImageTk.PhotoImage(self.face.image)
+            self.scratch = ImageTk.PhotoImage("RGBA", self.face.image.size)
+            self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
+        elif box:
+            upload_tk(self.photo, self.scratch, self.face.image, box)
+        self.label.config(text=now.strftime("%H:%M:%S"))
+
+
+class MultiClock:
+    def __init__(self, root, clocks, size=DEFAULT_SIZE, offset=0.0):
+        self.root = root
+        self.offset = offset
+        self.root.title("Roman Clocks")
+        self.root.configure(bg=BACKGROUND)
+        self.root.attributes("-topmost", True)
+        self.root.overrideredirect(True)  # no window border
+        self.root.resizable(False, False)
+        self.root.bind("<Escape>", lambda e: self.root.destroy())
+        self.root.bind_all("<Control-q>", lambda e: self.root.destroy())
+        # Moved by dragging rather than following the mouse, which would need a second timer
+        self.root.bind("<ButtonPress-1>", self.drag_start)
+        self.root.bind("<B1-Motion>", self.drag)
+        self.drag_from = None
+
+        font = load_font()  # one font for every face, so they share cached dials
+        self.faces = []
+        for timezone, theme in clocks:
+            face = ClockFace(root, timezone, size, font, theme)
+            face.frame.pack(side=tk.LEFT, padx=2)
+            self.faces.append(face)
+        self.tick()
+
+    def tick(self):
+        now = time.time() + self.offset
+        utc = datetime.fromtimestamp(now, pytz.utc)
+        for face in self.faces:
+            face.tick(utc)
+        # Aim for the next whole second rather than now + 1000 ms, so the
+        # ticks don't drift and all faces turn over together
+        self.root.after(int((1 - now % 1) * 1000) + TICK_SLACK_MS, self.tick)
+
+    def drag_start(self, event):
+        self.drag_from = (event.x_root - self.root.winfo_x(), event.y_root - self.root.winfo_y())
+
+    def drag(self, event):
+        if self.drag_from:
+            self.root.geometry(f"+{event.x_root - self.drag_from[0]}+{event.y_root - self.drag_from[1]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show Roman clocks for several timezones in one window.")
+    parser.add_argument("timezones", nargs="*", help="e.g. Asia/Singapore Europe/London")
+    parser.add_argument("--clocks", help="file with one 'timezone [theme]' per line")
+    parser.add_argument("--size", type=int, default=DEFAULT_SIZE, help=f"face size in pixels (default {DEFAULT_SIZE})")
+    parser.add_argument("--theme", default=DEFAULT_THEME, help="default theme: " + ", ".join(THEMES))
+    parser.add_argument("--ntp", nargs="?", const="pool.ntp.org", metavar="SERVER",
+                        help="correct the time from an NTP server once at start")
+    args = parser.parse_args(argv)
+
+    clocks = [(timezone, args.theme) for timezone in args.timezones]
+    if args.clocks:
+        try:
+            clocks += read_clocks(args.clocks, args.theme)
+        except OSError as e:
+            parser.error(str(e))
+    if not clocks:
+        parser.error("no clocks: give timezones or --clocks")
+    for timezone, theme in clocks:
+        if timezone not in pytz.all_timezones_set:
+            parser.error(f"unknown timezone: {timezone}")
+        if theme not in THEMES:
+            parser.error(f"unknown theme: {theme}")
+
+    offset = ntp_offset(args.ntp) if args.ntp else 0.0
+    root = tk.Tk()
+    MultiClock(root, clocks, args.size, offset)
+    root.mainloop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,9 @@
 import tkinter as tk
-from tkinter import filedialog
-import math
+from tkinter import filedialog, messagebox
+
+from toolpath import MOVE_LINE, Toolpath, stats_text
+from toolpath_loader import ToolpathLoader, poll_loader
+from toolpath_view import CanvasToolpathView, RedrawScheduler
 
 class GCodeViewer(tk.Tk):
     def __init__(self):
@@ -16,14 +19,16 @@ class GCodeViewer(tk.Tk):
         self.scale = 10  # Zoom scale
         self.offset_x = 0
         self.offset_y = 0
-        self.gcode = []
-        self.z = 0
-        self.prev = (0, 0)
+        self.toolpath = Toolpath()
+        self.loader = None
+        self.view = CanvasToolpathView(self.canvas, self.segment_style)
+        self.redraws = RedrawScheduler(self, lambda: self.draw_gcode(preview=True), self.draw_gcode)
 
         # Menu
         menubar = tk.Menu(self)
         filemenu = tk.Menu(menubar, tearoff=0)
         filemenu.add_command(label="Open", command=self.open_file)
+        filemenu.add_command(label="Cancel Loading", command=self.cancel_load)
         menubar.add_cascade(label="File", menu=filemenu)
         self.config(menu=menubar)
 
@@ -35,90 +40,52 @@ class GCodeViewer(tk.Tk):
     def open_file(self):
         path = filedialog.askopenfilename(filetypes=[("G-code Files", "*.nc *.gcode")])
         if path:
-            with open(path, 'r') as f:
-                self.gcode = f.readlines()
-            self.z = 0
-            self.prev = (0, 0)
-            self.canvas.delete("all")
-            self.after(100, self.draw_gcode)
-
-    def draw_gcode(self):
-        for line in self.gcode:
-            self.parse_line(line.strip())
-
-    def parse_line(self, line):
-        if line.startswith('(') or line == '':
-            return
-        tokens = line.split()
-        cmd = tokens[0]
-        x = y = z = None
-        i = j = r = None
-        for token in tokens[1:]:
-            if token.startswith('X'):
-                x = float(token[1:])
-            elif token.startswith('Y'):
-                y = float(token[1:])
-            elif token.startswith('Z'):
-                z = float(token[1:])
-            elif token.startswith('I'):
-                i = float(token[1:])
-            elif token.startswith('J'):
-                j = float(token[1:])
-            elif token.startswith('R'):
-                r = float(token[1:])
-
-        if z is not None:
-            self.z = z
-
-        if cmd == 'G0' or cmd == 'G1':
-            self.draw_line(x, y)
-        elif cmd == 'G2' or cmd == 'G3':
-            self.draw_arc(x, y, i, j, cmd)
-
-    def to_canvas_coords(self, x, y):
+            if self.loader:
+                self.loader.cancel()
+            self.loader = ToolpathLoader(path).start()
+            self.toolpath = Toolpath()
+            self.view.set_toolpath(self.toolpath)
+            poll_loader(self, self.loader, self.on_load_chunk, self.on_load_done, self.on_load_cached)
+
+    def on_load_cached(self, toolpath):
+        # No text pane here, so nothing left to read
+        self.loader.cancel()
+        self.loader = None
+        self.toolpath = toolpath
+        self.view.set_toolpath(toolpath)
+        self.title(f"G-code Viewer - {stats_text(toolpath)}")
+        self.draw_gcode()
+
+    def on_load_chunk(self, chunk, text, progress):
+        self.toolpath.extend(chunk)
+        self.draw_gcode()
+        self.title(f"G-code Viewer - loading {progress:.0%}")
+
+    def on_load_done(self, error):
+        if not error:
+            self.loader.save_cache(self.toolpath)
+        self.loader = None
+        self.title(f"G-code Viewer - {stats_text(self.toolpath)}")
+        if error:
+            messagebox.showerror("Open Error", str(error) or type(error).__name__)
+
+    def cancel_load(self):
+        if self.loader:
+            self.loader.cancel()
+            self.loader = None
+            self.title("G-code Viewer - loading cancelled")
+
+    def draw_gcode(self, preview=False):
         width = self.canvas.winfo_width()
         height = self.canvas.winfo_height()
-        cx = (x * self.scale) + self.offset_x + width / 2
-        cy = height / 2 - (y * self.scale) + self.offset_y
-        return cx, cy
-
-    def draw_line(self, x2, y2):
-        x1, y1 = self.prev
-        if x2 is None or y2 is None:
-            return
-        color = "green" if self.z < 0 else "gray"
-        cx1, cy1 = self.to_canvas_coords(x1, y1)
-        cx2, cy2 = self.to_canvas_coords(x2, y2)
-        self.canvas.create_line(cx1, cy1, cx2, cy2, fill=color, width=2)
-        self.prev = (x2, y2)
-
-    def draw_arc(self, x, y, i, j, cmd):
-        x1, y1 = self.prev
-        x2, y2 = x, y
-        if x2 is None or y2 is None or i is None or j is None:
-            return
-        cx = x1 + i
-        cy = y1 + j
-        radius = math.hypot(i, j)
-        steps = 30
-        angle_start = math.atan2(y1 - cy, x1 - cx)
-        angle_end = math.atan2(y2 - cy, x2 - cx)
-
-        if cmd == 'G2' and angle_end > angle_start:
-            angle_end -= 2 * math.pi
-        if cmd == 'G3' and angle_end < angle_start:
-            angle_end += 2 * math.pi
-
-        points = []
-        for s in range(steps + 1):
-            t = angle_start + (angle_end - angle_start) * s / steps
-            px = cx + radius * math.cos(t)
-            py = cy + radius * math.sin(t)
-            points.append(self.to_canvas_coords(px, py))
-
-        for i in range(len(points) - 1):
-            self.canvas.create_line(*points[i], *points[i + 1], fill="cyan", width=2)
-        self.prev = (x2, y2)
+        draw = self.view.preview if preview else self.view.draw
+        draw(self.scale, self.offset_x + width / 2, height / 2 + self.offset_y)
+
+    def segment_style(self, motion, z):
+        if motion > MOVE_LINE:
+            return "cyan", 2
+        return ("green" if z < 0 else "gray"), 2
+
 
     def on_mouse_down(self, event):
         self.last_mouse = (event.x, event.y)
@@ -129,14 +96,12 @@ class GCodeViewer(tk.Tk):
         self.offset_x += dx
         self.offset_y += dy
         self.last_mouse = (event.x, event.y)
-        self.canvas.delete("all")
-        self.draw_gcode()
+        self.redraws.request()
 
     def on_mouse_wheel(self, event):
         factor = 1.1 if event.delta > 0 else 0.9
         self.scale *= factor
-        self.canvas.delete("all")
-        self.draw_gcode()
+        self.redraws.request()
 
 if __name__ == "__main__":
     app = GCodeViewer()
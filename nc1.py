@@ -1,9 +1,19 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, colorchooser
 from tkinter import ttk
-import math
-import re
+import bisect
 import os
+import shutil
+
+from toolpath import MOVE_RAPID, Toolpath, reparse, stats_text
+from toolpath_cache import make_writable
+from toolpath_lines import LineSource, VirtualLineView
+from toolpath_loader import POLL_MS, LodBuilder, ToolpathLoader, poll_loader
+from toolpath_sim import Simulation, SimulationBar
+from toolpath_view import CanvasToolpathView, RasterToolpathView, RedrawScheduler
+
+REPARSE_DELAY_MS = 100  # wait for typing to pause before re-parsing the code pane
+VIRTUAL_PANE_BYTES = 8 * 1024 * 1024  # larger programs get a read-only code pane reading from the file
 
 class GCodeViewer(tk.Tk):
     def __init__(self):
@@ -12,7 +22,8 @@ class GCodeViewer(tk.Tk):
         self.geometry("1200x700")
         self.configure(bg='gray')
 
-        self.gcode_lines = []
+        self.toolpath = Toolpath()
+        self.loader = None
         self.current_file = None
 
         self.zoom = 1.0
@@ -27,6 +38,11 @@ class GCodeViewer(tk.Tk):
         self.mouse_x = 0
         self.mouse_y = 0
         self.crosshair = None
+        self.hover = None
+        self.reparse_job = None
+        self.dirty = None  # [first line, end line, line count delta] of unparsed edits
+        self.lod_builder = None
+        self.lines = None  # LineSource while the read-only code pane is shown
 
         self.create_widgets()
 
@@ -41,6 +57,8 @@ class GCodeViewer(tk.Tk):
         self.code_text = tk.Text(self.code_frame, wrap=tk.NONE, bg=self.code_bg)
         self.code_text.pack(fill=tk.BOTH, expand=True)
         self.code_text.config(state=tk.DISABLED)
+        self.track_edits()
+        self.code_view = VirtualLineView(self.code_frame, self.code_row, command=self.on_code_click, bg=self.code_bg)
         self.main_frame.add(self.code_frame, minsize=300)
 
         # Right: Drawing Canvas
@@ -54,7 +72,12 @@ class GCodeViewer(tk.Tk):
         self.canvas.bind("<KeyPress-Shift_L>", self.on_shift_press)
         self.canvas.bind("<KeyRelease-Shift_L>", self.on_shift_release)
         self.canvas.focus_set()
+        self.simulation = Simulation(self.canvas, self.sim_style)
+        self.sim_bar = SimulationBar(self.canvas_frame, self.simulation)
+        self.sim_bar.pack(side=tk.BOTTOM, fill=tk.X, before=self.canvas)
         self.main_frame.add(self.canvas_frame)
+        self.view = self.make_view()
+        self.redraws = RedrawScheduler(self, self.preview_gcode, self.draw_gcode)
 
     def create_menu(self):
         menubar = tk.Menu(self)
@@ -63,6 +86,7 @@ class GCodeViewer(tk.Tk):
         filemenu.add_command(label="Open", command=self.load_file)
         filemenu.add_command(label="Save", command=self.save_file)
         filemenu.add_command(label="Save As", command=self.save_as_file)
+        filemenu.add_command(label="Cancel Loading", command=self.cancel_load)
         filemenu.add_separator()
         filemenu.add_command(label="Exit", command=self.quit)
         menubar.add_cascade(label="File", menu=filemenu)
@@ -72,6 +96,8 @@ class GCodeViewer(tk.Tk):
         viewmenu.add_command(label="Zoom Out", command=lambda: self.adjust_zoom(0.8))
         viewmenu.add_command(label="Zoom Fit", command=self.zoom_fit)
         viewmenu.add_checkbutton(label="Follow Cursor", command=self.toggle_follow_cursor)
+        self.raster_var = tk.BooleanVar(value=False)
+        viewmenu.add_checkbutton(label="Raster Rendering", variable=self.raster_var, command=self.toggle_raster)
         menubar.add_cascade(label="View", menu=viewmenu)
 
         colormenu = tk.Menu(menubar, tearoff=0)
@@ -84,31 +110,218 @@ class GCodeViewer(tk.Tk):
     def toggle_follow_cursor(self):
         self.follow_cursor = not self.follow_cursor
 
+    def make_view(self):
+        if self.raster_var.get():
+            return RasterToolpathView(self.canvas, self.segment_style, background=self.canvas["bg"])
+        return CanvasToolpathView(self.canvas, self.segment_style)
+
+    def toggle_raster(self):
+        self.view.close()
+        self.view = self.make_view()
+        self.view.set_toolpath(self.toolpath)
+        self.draw_gcode()
+
     def set_code_bg(self):
         color = colorchooser.askcolor(title="Choose Code Background Color")[1]
         if color:
             self.code_text.config(bg=color)
+            self.code_view.text.config(bg=color)
 
     def set_draw_bg(self):
         color = colorchooser.askcolor(title="Choose Canvas Background Color")[1]
         if color:
             self.canvas.config(bg=color)
+            if isinstance(self.view, RasterToolpathView):
+                self.view.set_background(color)
+                self.draw_gcode()
 
     def load_file(self):
         file_path = filedialog.askopenfilename(filetypes=[("G-code files", "*.nc *.gcode"), ("All files", "*.*")])
         if not file_path:
             return
-        with open(file_path, 'r') as f:
-            self.gcode_lines = f.readlines()
+        if self.loader:
+            self.loader.cancel()
         self.current_file = file_path
         self.code_text.config(state=tk.NORMAL)
         self.code_text.delete("1.0", tk.END)
-        self.code_text.insert("1.0", ''.join(self.gcode_lines))
-        self.code_text.config(state=tk.NORMAL)
-        self.draw_gcode()
+        self.reset_edits()
+        self.loader = ToolpathLoader(file_path).start()
+        self.toolpath = Toolpath()
+        self.view.set_toolpath(self.toolpath)
+        self.simulation.set_toolpath(None)
+        self.show_code_pane(self.loader.size > VIRTUAL_PANE_BYTES)
+        poll_loader(self, self.loader, self.on_load_chunk, self.on_load_done, self.on_load_cached)
+
+    def on_load_cached(self, toolpath):
+        self.toolpath = toolpath
+        self.view.set_toolpath(toolpath)
+        self.simulation.set_toolpath(toolpath)
+        self.zoom_fit()
+        if self.lines is not None:
+            # Nothing to stream into the code pane
+            self.loader.cancel()
+            self.loader = None
+            self.lines.offsets = toolpath.line_offsets
+            self.code_view.set_count(len(self.lines))
+            self.title(f"NC/G-code Viewer - {os.path.basename(self.current_file)} (read-only) - {stats_text(toolpath)}")
+
+    def on_load_chunk(self, chunk, text, progress):
+        if self.lines is None:
+            self.code_text.insert(tk.END, text)
+        if chunk is None:  # toolpath came from the cache, just the text is streaming
+            return
+        start = len(self.toolpath)
+        self.toolpath.extend(chunk)
+        if self.lines is not None and self.toolpath.line_offsets is not None:
+            self.lines.offsets = self.toolpath.line_offsets
+            self.code_view.set_count(len(self.lines))
+        if start == 0:
+            self.zoom_fit()
+        else:
+            self.draw_gcode()
+        self.title(f"NC/G-code Viewer - loading {progress:.0%}")
+
+    def on_load_done(self, error):
+        if not error:
+            self.loader.save_cache(self.toolpath)
+        self.loader = None
+        self.simulation.set_toolpath(self.toolpath)
+        read_only = " (read-only)" if self.lines is not None else ""
+        self.title(f"NC/G-code Viewer - {os.path.basename(self.current_file)}{read_only} - {stats_text(self.toolpath)}")
+        if error:
+            messagebox.showerror("Open Error", str(error) or type(error).__name__)
         self.zoom_fit()
 
+    def cancel_load(self):
+        if self.loader:
+            self.loader.cancel()
+            self.loader = None
+            self.title("NC/G-code Viewer - loading cancelled")
+
+    def show_code_pane(self, virtual):
+        # Huge programs are shown read-only through a VirtualLineView over the
+        # file instead of being copied into the editable Text widget.
+        if self.lines is not None:
+            self.lines.close()
+            self.lines = None
+        if virtual:
+            self.lines = LineSource(self.current_file, self.toolpath.line_offsets)
+            self.code_text.pack_forget()
+            self.code_view.pack(fill=tk.BOTH, expand=True)
+            self.code_view.reset(len(self.lines))
+        else:
+            self.code_view.pack_forget()
+            self.code_text.pack(fill=tk.BOTH, expand=True)
+
+    def code_row(self, k):
+        return self.lines.line(k)
+
+    def on_code_click(self, line):
+        # Highlight the first segment of the clicked line, if it has one
+        i = bisect.bisect_left(self.toolpath.line_no, line)
+        if i < len(self.toolpath) and self.toolpath.line_no[i] == line:
+            self.hover = i
+            self.view.highlight(i, "hover", color="orange")
+
+    def track_edits(self):
+        # Route the code pane's Tcl widget command through on_code_command,
+        # so every insert/delete tells us which lines it touched.
+        widget = str(self.code_text)
+        self.code_command = widget + "_orig"
+        self.tk.call("rename", widget, self.code_command)
+        self.tk.createcommand(widget, self.on_code_command)
+
+    def code_line(self, index):
+        return int(self.tk.call(self.code_command, "index", index).split(".")[0]) - 1
+
+    def on_code_command(self, *args):
+        op = args[0] if args else None
+        if self.loader or op not in ("insert", "delete", "replace", "edit"):
+            return self.tk.call((self.code_command,) + args)
+        if op == "edit" and args[1:2] not in (("undo",), ("redo",)):
+            return self.tk.call((self.code_command,) + args)
+
+        before = self.code_line("end-1c")
+        if op == "insert":
+            touched = [self.code_line(args[1])]
+        elif op == "delete" and len(args) == 2:
+            touched = [self.code_line(args[1]), self.code_line(args[1] + " +1c")]
+        elif op == "edit":
+            touched = [0, before]
+        else:
+            touched = [self.code_line(index) for index in args[1:3 if op == "replace" else None]]
+        result = self.tk.call((self.code_command,) + args)
+        delta = self.code_line("end-1c") - before
+        self.note_edit(min(touched), max(touched) + 1, delta)
+        return result
+
+    def note_edit(self, first, end, delta):
+        # Lines first..end became first..end + delta; merge with earlier
+        # edits that haven't been parsed yet.
+        if self.dirty is None:
+            self.dirty = [first, end + delta, delta]
+        else:
+            old_first, old_end, old_delta = self.dirty
+            self.dirty = [min(first, old_first), max(old_end, end) + delta, old_delta + delta]
+        if self.reparse_job:
+            self.after_cancel(self.reparse_job)
+        self.reparse_job = self.after(REPARSE_DELAY_MS, self.reparse_code)
+
+    def reset_edits(self):
+        self.dirty = None
+        self.lod_builder = None
+        if self.reparse_job:
+            self.after_cancel(self.reparse_job)
+            self.reparse_job = None
+
+    def code_lines(self, first, end):
+        text = self.code_text.get(f"{first + 1}.0", f"{end + 1}.0")
+        lines = text.split("\n")
+        if text.endswith("\n"):
+            lines.pop()
+        return lines
+
+    def reparse_code(self):
+        # Only the edited lines, plus however many after them it takes for
+        # the position to match the old program again, are parsed.
+        self.reparse_job = None
+        if self.loader or self.dirty is None:
+            return
+        first, end, delta = self.dirty
+        self.dirty = None
+        tp = self.toolpath
+        make_writable(tp)  # no-op unless it was loaded from the cache
+        changed, rect = reparse(tp, self.code_lines, first, end - delta, end, self.code_line("end-1c") + 1)
+        if tp.lod is not None and tp.lod.approximate and self.lod_builder is None:
+            # The splice kept runs that stand in for dropped repeats; a
+            # fresh pyramid drops them once they no longer match anything
+            self.lod_builder = LodBuilder(tp).start()
+            self.after(POLL_MS, self.poll_lod, self.lod_builder)
+        self.view.toolpath_changed(rect)
+        self.simulation.toolpath_changed(changed)
+        self.hover = None
+        self.draw_gcode()
+
+    def poll_lod(self, builder):
+        if builder is not self.lod_builder or builder.toolpath is not self.toolpath:
+            return
+        if not builder.done():
+            self.after(POLL_MS, self.poll_lod, builder)
+            return
+        self.lod_builder = None
+        if builder.version != self.toolpath.version:
+            # Edited again meanwhile: the spliced pyramid is current, start over
+            if self.toolpath.lod.approximate:
+                self.lod_builder = LodBuilder(self.toolpath).start()
+                self.after(POLL_MS, self.poll_lod, self.lod_builder)
+            return
+        self.toolpath.lod = builder.pyramid
+        self.view.set_toolpath(self.toolpath)
+        self.draw_gcode()
+
     def save_file(self):
+        if self.lines is not None:
+            return  # read-only code pane, the file on disk is what's shown
         if self.current_file:
             with open(self.current_file, 'w') as f:
                 f.write(self.code_text.get("1.0", tk.END))
@@ -118,8 +331,11 @@ class GCodeViewer(tk.Tk):
     def save_as_file(self):
         file_path = filedialog.asksaveasfilename(defaultextension=".nc")
         if file_path:
-            with open(file_path, 'w') as f:
-                f.write(self.code_text.get("1.0", tk.END))
+            if self.lines is not None:
+                shutil.copyfile(self.current_file, file_path)
+            else:
+                with open(file_path, 'w') as f:
+                    f.write(self.code_text.get("1.0", tk.END))
             self.current_file = file_path
 
     def adjust_zoom(self, factor):
@@ -127,8 +343,8 @@ class GCodeViewer(tk.Tk):
         self.draw_gcode()
 
     def on_mousewheel(self, event):
-        factor = 1.1 if event.delta > 0 else 0.9
-        self.adjust_zoom(factor)
+        self.zoom *= 1.1 if event.delta > 0 else 0.9
+        self.redraws.request()
 
     def on_drag_start(self, event):
         self.last_drag_x = event.x
@@ -141,7 +357,7 @@ class GCodeViewer(tk.Tk):
         self.pan_y += dy
         self.last_drag_x = event.x
         self.last_drag_y = event.y
-        self.draw_gcode()
+        self.redraws.request()
 
     def on_shift_press(self, event):
         self.follow_key_held = True
@@ -160,9 +376,26 @@ class GCodeViewer(tk.Tk):
             target_y = event.y + self.zoom * cy
             self.pan_x += (target_x - self.pan_x) * 0.2
             self.pan_y += (target_y - self.pan_y) * 0.2
-            self.draw_gcode()
+            self.redraws.request()
 
         self.draw_crosshair(event.x, event.y)
+        self.hover_segment(self.view.pick(event.x, event.y))
+
+    def hover_segment(self, i):
+        # Highlight the segment under the crosshair and its source line in the code pane
+        self.view.highlight(i, "hover", color="orange")
+        if i == self.hover:
+            return
+        self.hover = i
+        if self.lines is not None:
+            self.code_view.select(None if i is None else self.toolpath.line_no[i])
+            return
+        self.code_text.tag_remove("hover", "1.0", tk.END)
+        if i is not None:
+            line = self.toolpath.line_no[i] + 1
+            self.code_text.tag_add("hover", f"{line}.0", f"{line}.end")
+            self.code_text.tag_config("hover", background="yellow")
+            self.code_text.see(f"{line}.0")
 
     def draw_crosshair(self, x, y):
         self.canvas.delete("crosshair")
@@ -170,7 +403,7 @@ class GCodeViewer(tk.Tk):
         self.canvas.create_line(x, y - 10, x, y + 10, fill='red', tags="crosshair")
 
     def zoom_fit(self):
-        if not self.gcode_lines:
+        if not len(self.toolpath):
             return
         minx, miny, maxx, maxy = self.get_bounds()
         canvas_w = self.canvas.winfo_width()
@@ -180,84 +413,28 @@ class GCodeViewer(tk.Tk):
             return
         self.zoom = min(canvas_w / (maxx - minx + 1), canvas_h / (maxy - miny + 1)) * 0.9
         self.pan_x = canvas_w / 2 - self.zoom * (minx + maxx) / 2
-        self.pan_y = canvas_h / 2 - self.zoom * (miny + maxy) / 2
+        self.pan_y = canvas_h / 2 + self.zoom * (miny + maxy) / 2
         self.draw_gcode()
 
     def get_bounds(self):
-        x, y = 0, 0
-        minx = miny = float('inf')
-        maxx = maxy = float('-inf')
-        for line in self.gcode_lines:
-            if line.startswith("G01") or line.startswith("G1") or line.startswith("G0") or line.startswith("G00"):
-                coords = self.extract_coords(line)
-                if 'X' in coords: x = coords['X']
-                if 'Y' in coords: y = coords['Y']
-                minx = min(minx, x)
-                maxx = max(maxx, x)
-                miny = min(miny, y)
-                maxy = max(maxy, y)
-        return minx, miny, maxx, maxy
-
-    def extract_coords(self, line):
-        coords = {}
-        match = re.findall(r"([XYZIJR])([-+]?[0-9]*\.?[0-9]+)", line.upper())
-        for axis, val in match:
-            coords[axis] = float(val)
-        return coords
+        # Cached on the toolpath, so this is cheap enough for every mouse move
+        return self.toolpath.bounds() or (0, 0, 0, 0)
 
     def draw_gcode(self):
-        self.canvas.delete("all")
-        x = y = 0
-        for line in self.gcode_lines:
-            cmd = line.strip().upper()
-            coords = self.extract_coords(cmd)
-            if cmd.startswith("G0") or cmd.startswith("G1"):
-                x1, y1 = x, y
-                x2 = coords.get('X', x)
-                y2 = coords.get('Y', y)
-                self.draw_line(x1, y1, x2, y2)
-                x, y = x2, y2
-            elif cmd.startswith("G2") or cmd.startswith("G3"):
-                clockwise = cmd.startswith("G2")
-                x1, y1 = x, y
-                x2 = coords.get('X', x1)
-                y2 = coords.get('Y', y1)
-                if 'I' in coords and 'J' in coords:
-                    cx = x1 + coords['I']
-                    cy = y1 + coords['J']
-                    self.draw_arc(x1, y1, x2, y2, cx, cy, clockwise)
-                    x, y = x2, y2
-
-    def draw_line(self, x1, y1, x2, y2):
-        self.canvas.create_line(
-            x1 * self.zoom + self.pan_x,
-            -y1 * self.zoom + self.pan_y,
-            x2 * self.zoom + self.pan_x,
-            -y2 * self.zoom + self.pan_y,
-            fill="blue",
-            width=1.5
-        )
-
-    def draw_arc(self, x1, y1, x2, y2, cx, cy, clockwise):
-        start_angle = math.atan2(y1 - cy, x1 - cx)
-        end_angle = math.atan2(y2 - cy, x2 - cx)
-        radius = math.hypot(x1 - cx, y1 - cy)
-
-        if clockwise and end_angle > start_angle:
-            end_angle -= 2 * math.pi
-        elif not clockwise and end_angle < start_angle:
-            end_angle += 2 * math.pi
-
-        steps = max(10, int(abs(end_angle - start_angle) * radius))
-        points = []
-        for i in range(steps + 1):
-            angle = start_angle + (end_angle - start_angle) * i / steps
-            x = cx + radius * math.cos(angle)
-            y = cy + radius * math.sin(angle)
-            points.append((x, y))
-
-        for i in range(len(points) - 1):
-            self.draw_line(*points[i], *points[i + 1])
+        self.view.draw(self.zoom, self.pan_x, self.pan_y)
+        self.simulation.draw(self.zoom, self.pan_x, self.pan_y)
+
+    def preview_gcode(self):
+        # Pan/zoom events go through self.redraws: this once per frame, draw_gcode once they stop
+        self.view.preview(self.zoom, self.pan_x, self.pan_y)
+        self.simulation.preview(self.zoom, self.pan_x, self.pan_y)
+
+    def segment_style(self, motion, z):
+        return "blue", 1.5
+
+    def sim_style(self, motion, z):
+        return ("gray" if motion == MOVE_RAPID else "magenta"), 2.5
+
 
 if __name__ == "__main__":
     app = GCodeViewer()
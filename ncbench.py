@@ -0,0 +1,286 @@
+import argparse
+import json
+import math
+import os
+import platform
+import queue
+import random
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+from ncrender import fit_view, render_toolpath, segment_style
+from toolpath import Toolpath, parse_gcode
+from toolpath_index import SegmentGrid
+from toolpath_loader import ToolpathLoader
+from toolpath_lod import LodPyramid
+from toolpath_render import TileRenderer, toolpath_polylines
+from toolpath_view import CanvasToolpathView
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Benchmarks for the toolpath pipeline on synthetic programs. Every case
+# (generator x size) runs in its own worker process so its peak RSS can be
+# reported, and times each stage the viewers go through:
+#
+#   parse       parse_gcode over the lines in memory
+#   load        ToolpathLoader streaming the program from disk (parse, index, LOD)
+#   bounds      Toolpath.bounds() from cold
+#   index/lod   SegmentGrid.build / LodPyramid.build
+#   tessellate  toolpath_polylines over every segment at fit zoom
+#   render_fit  headless TileRenderer frame of the whole program (LOD path)
+#   render_zoom headless frame zoomed 20x into the middle (index path)
+#   canvas      CanvasToolpathView draw at fit zoom; only with --canvas and a
+#               display (xvfb-run python ncbench.py --canvas works headless)
+#
+#   python ncbench.py --sizes 10k,100k --save baseline.json
+#   python ncbench.py --sizes 10k,100k --compare baseline.json   # exit 1 on regressions
+
+GENERATORS = {}
+DEFAULT_SIZES = "10k,100k,1m"
+FRAME_SIZE = (800, 600)
+ZOOM = 20
+REGRESSION_TOLERANCE = 0.25  # fraction slower than the baseline that counts as a regression
+MIN_SECONDS = 0.005  # stages faster than this are too noisy to compare
+
+
+def generator(name):
+    def register(fn):
+        GENERATORS[name] = fn
+        return fn
+    return register
+
+
+@generator("micro")
+def micro_segments(count):
+    # Dense 10 um G1 steps along a spiral, like a finishing pass exported as lines
+    rnd = random.Random(1)
+    yield "G21 G90 G0 X0 Y0 Z5"
+    yield "G1 Z-1 F800"
+    angle = 0.0
+    for n in range(count - 2):
+        r = 5 + angle * 0.2
+        angle += 0.01 / r
+        if n % 5000 == 4999:
+            yield "G0 Z5"
+        yield f"G1 X{r * math.cos(angle):.4f} Y{r * math.sin(angle):.4f} Z{-1 - rnd.random() * 0.01:.4f}"
+
+
+@generator("arcs")
+def arc_contours(count):
+    # Rows of half circles (G2/G3 with I) joined by short lines, like a wire-cut contour
+    yield "G21 G90 G17 G0 X0 Y0 Z0"
+    yield "G1 F200"
+    x = y = 0.0
+    for n in range(count - 2):
+        if n % 3 == 2:
+            y += 0.5
+            yield f"G1 X{x:.3f} Y{y:.3f}"
+        else:
+            r = 1 + (n % 7) * 0.25
+            code = "G2" if n % 2 else "G3"
+            x += 2 * r
+            yield f"{code} X{x:.3f} Y{y:.3f} I{r:.3f} J0"
+        if x > 500:
+            x = 0.0
+            yield "G0 X0"
+
+
+@generator("pocket")
+def pocketing(count):
+    # Zigzag clearing of a 100 x 60 pocket in 0.5 mm steps down, retracting between levels
+    yield "G21 G90 G0 X0 Y0 Z5"
+    n = 1
+    z = 0.0
+    while n < count:
+        z -= 0.5
+        yield "G0 X0 Y0 Z1"
+        yield f"G1 Z{z:.3f} F300"
+        n += 2
+        y = 0.0
+        while y <= 60 and n < count:
+            yield f"G1 X100 Y{y:.2f} F1200"
+            y += 0.8
+            yield f"G1 Y{y:.2f}"
+            yield "G1 X0"
+            y += 0.8
+            yield f"G1 Y{y:.2f}"
+            n += 4
+        yield "G0 Z5"
+        n += 1
+
+
+def parse_count(text):
+    text = text.strip().lower()
+    scale = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def best_time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def load_file(path):
+    # Same merge the viewers do in on_load_chunk, without a UI
+    loader = ToolpathLoader(path).start()
+    toolpath = Toolpath()
+    while True:
+        try:
+            message = loader.queue.get(timeout=60)
+        except queue.Empty:
+            raise RuntimeError("loader stalled")
+        if message[0] == "done":
+            if message[1]:
+                raise message[1]
+            return toolpath
+        if message[0] == "cached":
+            toolpath = message[1]
+        elif message[1] is not None:
+            toolpath.extend(message[1])
+
+
+def cold_bounds(toolpath):
+    toolpath.invalidate_bounds(0)
+    toolpath.bounds()
+
+
+def tessellate(toolpath):
+    scale, ox, oy = fit_view(toolpath, *FRAME_SIZE)
+    for _ in toolpath_polylines(toolpath, range(len(toolpath)), scale, ox, oy, segment_style):
+        pass
+
+
+def render_zoomed(toolpath):
+    width, height = FRAME_SIZE
+    scale, ox, oy = fit_view(toolpath, width, height)
+    renderer = TileRenderer(segment_style)
+    renderer.toolpath = toolpath
+    renderer.render(scale * ZOOM, width / 2 - (width / 2 - ox) * ZOOM, height / 2 - (height / 2 - oy) * ZOOM,
+                    width, height)
+
+
+def canvas_draw(toolpath):
+    import tkinter as tk
+    root = tk.Tk()
+    try:
+        canvas = tk.Canvas(root, width=FRAME_SIZE[0], height=FRAME_SIZE[1])
+        canvas.pack()
+        root.update()
+        view = CanvasToolpathView(canvas, segment_style)
+        view.set_toolpath(toolpath)
+        view.draw(*fit_view(toolpath, *FRAME_SIZE))
+        root.update()
+    finally:
+        root.destroy()
+
+
+def run_case(case):
+    # Worker process: (name, results) for one generator/size
+    kind, count, repeat, canvas = case
+    lines = list(GENERATORS[kind](count))
+    stages = {}
+
+    def stage(name, fn, items):
+        seconds = best_time(fn, repeat)
+        stages[name] = {"seconds": round(seconds, 6), "per_second": round(items / seconds) if seconds else None}
+
+    stage("parse", lambda: parse_gcode(lines), len(lines))
+    fd, path = tempfile.mkstemp(suffix=".nc")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write("\n".join(lines))
+        stage("load", lambda: load_file(path), len(lines))
+        toolpath = load_file(path)
+    finally:
+        os.remove(path)
+    del lines
+    segments = len(toolpath)
+    stage("bounds", lambda: cold_bounds(toolpath), segments)
+    stage("index", lambda: SegmentGrid.build(toolpath), segments)
+    stage("lod", lambda: LodPyramid.build(toolpath), segments)
+    stage("tessellate", lambda: tessellate(toolpath), segments)
+    stage("render_fit", lambda: render_toolpath(toolpath, *FRAME_SIZE), segments)
+    stage("render_zoom", lambda: render_zoomed(toolpath), segments)
+    if canvas:
+        stage("canvas", lambda: canvas_draw(toolpath), segments)
+
+    result = {"lines": count, "segments": segments, "stages": stages}
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result["peak_rss_mb"] = round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    return f"{kind}-{count}", result
+
+
+def compare(results, baseline, tolerance):
+    # Lines describing every stage that got slower than baseline * (1 + tolerance)
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get("results", {}).get(name)
+        if old is None:
+            continue
+        for stage, timing in result["stages"].items():
+            before = old["stages"].get(stage)
+            if before is None or before["seconds"] < MIN_SECONDS:
+                continue
+            ratio = timing["seconds"] / before["seconds"]
+            if ratio > 1 + tolerance:
+                regressions.append(f"{name} {stage}: {before['seconds']:.4f}s -> {timing['seconds']:.4f}s "
+                                   f"({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark parsing and rendering on synthetic G-code.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"line counts, e.g. 10k,1m,10m (default {DEFAULT_SIZES})")
+    parser.add_argument("--kinds", default=",".join(GENERATORS), help="generators to run: " + ", ".join(GENERATORS))
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage, the best one counts (default 3)")
+    parser.add_argument("--canvas", action="store_true", help="also time Tk canvas drawing (needs a display or Xvfb)")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    kinds = [kind for kind in args.kinds.split(",") if kind]
+    unknown = [kind for kind in kinds if kind not in GENERATORS]
+    if unknown:
+        parser.error("unknown generator: " + ", ".join(unknown))
+    if args.canvas and sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        parser.error("--canvas needs a display; run it under xvfb-run")
+    cases = [(kind, parse_count(size), args.repeat, args.canvas) for size in args.sizes.split(",") for kind in kinds]
+
+    results = {}
+    # One fresh process per case, so peak RSS is that case's alone
+    with Pool(1, maxtasksperchild=1) as pool:
+        for name, result in pool.imap(run_case, cases):
+            results[name] = result
+            memory = f", peak {result['peak_rss_mb']} MB" if "peak_rss_mb" in result else ""
+            print(f"{name}: {result['segments']} segments{memory}")
+            for stage, timing in result["stages"].items():
+                rate = f"{timing['per_second']:>12,}/s" if timing["per_second"] else ""
+                print(f"  {stage:<12} {timing['seconds']:>10.4f}s {rate}")
+
+    report = {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print("REGRESSION " + line, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+import argparse
+import sys
+
+from toolpath_check import check_toolpath, load_polygon
+from toolpath_loader import load_program
+
+# Command line front end of toolpath_check: prints "program:line: issue" for
+# every rapid through the stock and every cut leaving the boundary, and exits
+# with 1 if there were any.
+#
+#   python nccheck.py part.nc --boundary fixture.txt
+#   python nccheck.py part.nc --boundary outline.nc --stock blank.txt --stock-top 0.5
+#
+# Polygons are text files with one "x y" (or "x,y") vertex per line, or a
+# G-code contour.
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check a G-code program against the stock and a boundary.")
+    parser.add_argument("program")
+    parser.add_argument("--boundary", help="polygon cut moves must stay inside")
+    parser.add_argument("--stock", help="stock outline for the rapid check (default: the boundary)")
+    parser.add_argument("--stock-top", type=float, default=0.0, help="Z of the stock top (default 0)")
+    args = parser.parse_args(argv)
+
+    try:
+        toolpath = load_program(args.program)
+        boundary = load_polygon(args.boundary) if args.boundary else None
+        stock = load_polygon(args.stock) if args.stock else None
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    issues = check_toolpath(toolpath, boundary, stock, args.stock_top)
+    for issue in issues:
+        print(f"{args.program}:{issue.line_no + 1}: {issue.kind}")
+    return 1 if issues else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
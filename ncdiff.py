@@ -0,0 +1,167 @@
+import argparse
+import os
+import sys
+import tkinter as tk
+
+from toolpath_diff import ADDED, MOVED, REMOVED, SAME, changed_runs, diff_toolpaths
+from toolpath_index import SegmentGrid
+from toolpath_lines import VirtualLineView
+from toolpath_loader import load_program
+from toolpath_lod import LodPyramid
+from toolpath_view import CanvasToolpathView, RedrawScheduler
+
+# Compare two revisions of a program move by move (toolpath_diff) and show
+# them overlaid in the same coordinates: unchanged moves dimmed, removed ones
+# red, added ones green, moves that only changed place orange. The list on
+# the right has one row per changed run; clicking it zooms to the run.
+#
+#   python ncdiff.py part_rev3.nc part_rev4.nc
+#   python ncdiff.py part_rev3.nc part_rev4.nc --stat
+
+COLORS = {SAME: "gray35", REMOVED: "red", ADDED: "green2", MOVED: "orange"}
+LABELS = {REMOVED: "removed", ADDED: "added", MOVED: "moved"}
+FIT_MARGIN = 0.9
+
+
+def layer(toolpath, status, wanted):
+    # Segments of toolpath whose status is wanted, indexed for culled drawing
+    tp = toolpath.take([i for i, s in enumerate(status) if s == wanted])
+    if len(tp):
+        tp.index = SegmentGrid.build(tp)
+        tp.lod = LodPyramid.build(tp)
+    return tp
+
+
+def change_list(old, new, status_old, status_new):
+    # (toolpath, start, end, status) of every changed run, in program order
+    runs = [(old, a, b, s) for a, b, s in changed_runs(status_old)]
+    runs += [(new, a, b, s) for a, b, s in changed_runs(status_new)]
+    runs.sort(key=lambda run: (run[0].line_no[run[1]], run[0] is new))
+    return runs
+
+
+class DiffViewer(tk.Tk):
+    def __init__(self, old_path, new_path, old, new):
+        super().__init__()
+        self.title(f"NC Diff - {os.path.basename(old_path)} -> {os.path.basename(new_path)}")
+        self.geometry("1200x700")
+        self.old = old
+        self.new = new
+        status_old, status_new = diff_toolpaths(old, new)
+        self.runs = change_list(old, new, status_old, status_new)
+
+        side = tk.Frame(self)
+        side.pack(side=tk.RIGHT, fill=tk.Y)
+        counts = {s: sum(b - a for _, a, b, st in self.runs if st == s) for s in LABELS}
+        counts[MOVED] //= 2  # each moved move is counted on both sides
+        summary = ", ".join(f"{counts[s]} {LABELS[s]}" for s in (REMOVED, ADDED, MOVED))
+        tk.Label(side, text=summary, anchor="w").pack(fill=tk.X)
+        self.run_list = VirtualLineView(side, self.run_row, count=len(self.runs), command=self.zoom_to_run, width=40)
+        self.run_list.pack(fill=tk.BOTH, expand=True)
+
+        self.canvas = tk.Canvas(self, bg="black")
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.views = []
+        for toolpath, status, s in ((new, status_new, SAME), (old, status_old, REMOVED),
+                                    (new, status_new, ADDED), (old, status_old, MOVED), (new, status_new, MOVED)):
+            view = CanvasToolpathView(self.canvas, self.layer_style(s), tag=f"diff{len(self.views)}")
+            view.set_toolpath(layer(toolpath, status, s))
+            self.views.append(view)
+
+        self.scale = 1.0
+        self.ox = self.oy = 0.0
+        self.last_drag = None
+        self.redraws = RedrawScheduler(self, lambda: self.redraw(preview=True), self.redraw)
+        self.canvas.bind("<ButtonPress-1>", self.on_drag_start)
+        self.canvas.bind("<B1-Motion>", self.on_drag)
+        self.canvas.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.canvas.bind("<Button-4>", lambda event: self.zoom_at(event.x, event.y, 1.1))
+        self.canvas.bind("<Button-5>", lambda event: self.zoom_at(event.x, event.y, 0.9))
+        self.after(100, self.fit, self.bounds())
+
+    def layer_style(self, status):
+        color = COLORS[status]
+        width = 1 if status == SAME else 2
+        return lambda motion, z: (color, width)
+
+    def run_row(self, k):
+        toolpath, a, b, s = self.runs[k]
+        side = "old" if toolpath is self.old else "new"
+        first, last = toolpath.line_no[a] + 1, toolpath.line_no[b - 1] + 1
+        lines = f"line {first}" if first == last else f"lines {first}-{last}"
+        return f"{side} {lines}: {b - a} {LABELS[s]}"
+
+    def bounds(self):
+        boxes = [tp.bounds() for tp in (self.old, self.new)]
+        boxes = [box for box in boxes if box is not None] or [(0.0, 0.0, 1.0, 1.0)]
+        return (min(box[0] for box in boxes), min(box[1] for box in boxes),
+                max(box[2] for box in boxes), max(box[3] for box in boxes))
+
+    def fit(self, box):
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if width <= 1 or height <= 1:
+            self.after(100, self.fit, box)
+            return
+        xmin, ymin, xmax, ymax = box
+        self.scale = min(width / max(xmax - xmin, 1e-6), height / max(ymax - ymin, 1e-6)) * FIT_MARGIN
+        self.ox = width / 2 - self.scale * (xmin + xmax) / 2
+        self.oy = height / 2 + self.scale * (ymin + ymax) / 2
+        self.redraw()
+
+    def zoom_to_run(self, k):
+        toolpath, a, b, _ = self.runs[k]
+        xmin, ymin, xmax, ymax = toolpath.range_bounds(a, b)
+        pad = max(xmax - xmin, ymax - ymin, 1.0)  # show some surroundings too
+        self.fit((xmin - pad, ymin - pad, xmax + pad, ymax + pad))
+
+    def redraw(self, preview=False):
+        for view in self.views:
+            (view.preview if preview else view.draw)(self.scale, self.ox, self.oy)
+
+    def on_drag_start(self, event):
+        self.last_drag = (event.x, event.y)
+
+    def on_drag(self, event):
+        self.ox += event.x - self.last_drag[0]
+        self.oy += event.y - self.last_drag[1]
+        self.last_drag = (event.x, event.y)
+        self.redraws.request()
+
+    def on_mouse_wheel(self, event):
+        self.zoom_at(event.x, event.y, 1.1 if event.delta > 0 else 0.9)
+
+    def zoom_at(self, x, y, factor):
+        # Keep the world point under the mouse in place
+        self.scale *= factor
+        self.ox = x - (x - self.ox) * factor
+        self.oy = y - (y - self.oy) * factor
+        self.redraws.request()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two G-code programs move by move.")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--stat", action="store_true", help="print the changed runs instead of opening a window")
+    args = parser.parse_args(argv)
+
+    try:
+        old = load_program(args.old)
+        new = load_program(args.new)
+    except OSError as e:
+        print(e, file=sys.stderr)
+        return 2
+    if not args.stat:
+        DiffViewer(args.old, args.new, old, new).mainloop()
+        return 0
+
+    status_old, status_new = diff_toolpaths(old, new)
+    runs = change_list(old, new, status_old, status_new)
+    for toolpath, a, b, s in runs:
+        path = args.old if toolpath is old else args.new
+        print(f"{path}:{toolpath.line_no[a] + 1}-{toolpath.line_no[b - 1] + 1}: {b - a} {LABELS[s]}")
+    return 1 if runs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
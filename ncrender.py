@@ -0,0 +1,133 @@
+import argparse
+import glob
+import os
+import sys
+from functools import partial
+from multiprocessing import Pool
+
+from toolpath import MOVE_LINE, RAPID_RATE, format_duration, program_stats
+from toolpath_loader import load_program
+from toolpath_render import TileRenderer
+
+# Headless thumbnails: load each program (from its sidecar cache when valid)
+# and rasterize it with the same TileRenderer the viewers use, no Tk window
+# involved. Files are spread over a process pool.
+#
+#   python ncrender.py programs/ "archive/**/*.nc" -o thumbs --size 400x300
+#
+# With --report nothing is rendered; each program's move count, cut/rapid
+# length and estimated cycle time are printed instead.
+
+EXTENSIONS = (".nc", ".gcode")
+MARGIN = 0.9  # fraction of the image the fitted program fills
+
+COLOR_RAPID = "gray"
+COLOR_CUT = "green"
+COLOR_SAFE = "blue"
+COLOR_ARC = "orange"
+
+
+def segment_style(motion, z2):
+    # Same colors as wirecutnc
+    if motion > MOVE_LINE:
+        return COLOR_ARC, 2
+    return (COLOR_CUT if z2 < 0 else COLOR_SAFE if motion == MOVE_LINE else COLOR_RAPID), 2
+
+
+def fit_view(toolpath, width, height):
+    # (scale, ox, oy) centering the program in a width x height image
+    bounds = toolpath.bounds()
+    if bounds is None:
+        return 1.0, width / 2, height / 2
+    xmin, ymin, xmax, ymax = bounds
+    scale = min(width / max(xmax - xmin, 1e-6), height / max(ymax - ymin, 1e-6)) * MARGIN
+    return scale, width / 2 - scale * (xmin + xmax) / 2, height / 2 + scale * (ymin + ymax) / 2
+
+
+def render_toolpath(toolpath, width, height, style=segment_style, background="black"):
+    renderer = TileRenderer(style, background)
+    renderer.toolpath = toolpath
+    scale, ox, oy = fit_view(toolpath, width, height)
+    return renderer.render(scale, ox, oy, width, height)
+
+
+def render_file(path, out_dir, root, width, height, background):
+    # Runs in a pool worker; returns (path, png path, error message). With
+    # out_dir, the program's directory below root is mirrored there, so
+    # programs with the same name in different directories don't collide.
+    name = os.path.splitext(os.path.basename(path))[0] + ".png"
+    directory = os.path.dirname(path)
+    if out_dir:
+        directory = os.path.normpath(os.path.join(out_dir, os.path.relpath(os.path.abspath(directory), root)))
+    out = os.path.join(directory, name)
+    try:
+        os.makedirs(directory or ".", exist_ok=True)
+        image = render_toolpath(load_program(path), width, height, background=background)
+        image.save(out)
+    except (OSError, ValueError) as e:
+        return path, None, str(e)
+    return path, out, None
+
+
+def report_file(path, rapid_rate):
+    # Pool worker for --report; returns (path, report line, error message)
+    try:
+        toolpath = load_program(path)
+    except (OSError, ValueError) as e:
+        return path, None, str(e)
+    cut, rapid, seconds = program_stats(toolpath, rapid_rate)
+    return path, f"{len(toolpath)} moves, cut {cut:.1f} mm, rapid {rapid:.1f} mm, {format_duration(seconds)}", None
+
+
+def find_programs(patterns):
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            names = sorted(os.listdir(pattern))
+            found += [os.path.join(pattern, n) for n in names if n.lower().endswith(EXTENSIONS)]
+        else:
+            found += sorted(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+    return list(dict.fromkeys(found))
+
+
+def parse_size(text):
+    width, _, height = text.lower().partition("x")
+    return int(width), int(height or width)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render G-code programs to PNG without a GUI.")
+    parser.add_argument("inputs", nargs="+", help="files, directories or glob patterns")
+    parser.add_argument("-o", "--out-dir", help="where to write PNGs, mirroring the input directories "
+                                                "(default: next to each program)")
+    parser.add_argument("--size", type=parse_size, default=(800, 600), help="WIDTHxHEIGHT, default 800x600")
+    parser.add_argument("--background", default="black")
+    parser.add_argument("--report", action="store_true", help="print length and cycle time estimates instead of rendering")
+    parser.add_argument("--rapid-rate", type=float, default=RAPID_RATE, help=f"G0 feed in mm/min for --report (default {RAPID_RATE:g})")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    paths = find_programs(args.inputs)
+    if not paths:
+        print("no .nc/.gcode files found", file=sys.stderr)
+        return 1
+    if args.report:
+        job = partial(report_file, rapid_rate=args.rapid_rate)
+    else:
+        root = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths])
+        width, height = args.size
+        job = partial(render_file, out_dir=args.out_dir, root=root, width=width, height=height,
+                      background=args.background)
+    failed = 0
+    with Pool(args.jobs) as pool:
+        for path, out, error in pool.imap_unordered(job, paths, chunksize=4):
+            if error:
+                failed += 1
+                print(f"{path}: {error}", file=sys.stderr)
+            else:
+                print(f"{path}: {out}" if args.report else f"{path} -> {out}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
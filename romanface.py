@@ -0,0 +1,189 @@
+import functools
+import math
+
+from PIL import Image, ImageDraw
+
+# Roman clock face drawing shared by the RomanClock scripts. The dial (the
+# numerals and their glow) never changes, so it is drawn once per size, font
+# and theme into an RGBA layer and kept; a tick only copies that layer and
+# draws the three hands on top instead of redrawing 12 numerals x 9 passes.
+# The hands only have 720 (hour) and 60 (minute, second) positions, so each
+# one is drawn once too, as a small sprite in an LRU cache, and a tick
+# composites three sprites.
+#
+# FaceRenderer keeps the face between ticks and only redraws the box the
+# moved hands covered before and cover now; the clocks upload just that box
+# (upload_tk for a Tk PhotoImage, Texture.blit_buffer with pos= in Kivy).
+
+ROMAN = ["XII", "I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X", "XI"]
+HAND_POSITIONS = (720, 60, 60)  # hour hand moves every minute, the others every tick
+HAND_CACHE_SIZE = 1024  # hand sprites kept; a full day of one face uses 840
+
+# numeral_radius: distance of the numerals from the center, as a fraction of
+# the face size
+# ring: (color, passes) of a glowing ring around the edge, or None
+# hands: (length as a fraction of the face size, width, color, glow color or None)
+# for the hour, minute and second hand
+THEMES = {
+    # Green numerals with a halo and glowing hands on a transparent background
+    "glow": {
+        "background": (0, 0, 0, 0),
+        "numeral": (0, 255, 0, 255),
+        "glow": (0, 255, 0, 90),
+        "numeral_radius": 0.36,
+        "ring": None,
+        "hands": ((0.25, 4, (0, 255, 0, 255), (0, 255, 0, 120)),
+                  (0.35, 2, (0, 255, 255, 255), (0, 255, 255, 120)),
+                  (0.40, 1, (255, 0, 0, 255), (255, 0, 0, 120))),
+    },
+    # White numerals outlined in cyan on black, plain hands
+    "outline": {
+        "background": (0, 0, 0, 255),
+        "numeral": (255, 255, 255, 255),
+        "glow": (0, 255, 255, 255),
+        "numeral_radius": 0.36,
+        "ring": None,
+        "hands": ((0.20, 4, (0, 255, 0, 255), None),
+                  (0.30, 2, (0, 255, 255, 255), None),
+                  (0.35, 1, (255, 0, 0, 255), None)),
+    },
+    # All green on translucent black inside a glowing ring (the Kivy clock)
+    "ring": {
+        "background": (0, 0, 0, 200),
+        "numeral": (0, 255, 0, 255),
+        "glow": None,
+        "numeral_radius": 0.325,
+        "ring": ((0, 255, 0), 8),
+        "hands": ((0.225, 4, (0, 255, 0, 255), None),
+                  (0.3375, 3, (0, 255, 0, 255), None),
+                  (0.405, 1, (0, 255, 0, 255), None)),
+    },
+}
+
+_dials = {}
+
+
+def font_key(font):
+    # Truetype fonts loaded twice from the same file are the same font
+    path = getattr(font, "path", None)
+    return (path, font.size) if path else font
+
+
+def draw_dial(size, font, theme):
+    image = Image.new("RGBA", (size, size), theme["background"])
+    draw = ImageDraw.Draw(image)
+    if theme["ring"]:
+        color, passes = theme["ring"]
+        for i in range(passes, 0, -1):
+            draw.ellipse([i, i, size - i, size - i], outline=color + (20 + i * 10,))
+    center = size / 2
+    radius = size * theme["numeral_radius"]
+    for i, text in enumerate(ROMAN):
+        angle = math.radians(i * 30 - 90)
+        left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+        tx = center + radius * math.cos(angle) - (right - left) / 2
+        ty = center + radius * math.sin(angle) - (bottom - top) / 2
+        # Glow: the text again, one pixel off in every direction, under the main pass
+        if theme["glow"]:
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    if dx or dy:
+                        draw.text((tx + dx, ty + dy), text, font=font, fill=theme["glow"])
+        draw.text((tx, ty), text, font=font, fill=theme["numeral"])
+    return image
+
+
+def dial_layer(size, font, theme="glow"):
+    # Cached; callers must copy() before drawing on it
+    key = (size, font_key(font), theme)
+    layer = _dials.get(key)
+    if layer is None:
+        layer = _dials[key] = draw_dial(size, font, THEMES[theme])
+    return layer
+
+
+@functools.lru_cache(maxsize=HAND_CACHE_SIZE)
+def hand_sprite(hand, position, size, theme="glow"):
+    # (image, box) of hand 0/1/2 (hour/minute/second) at one of its
+    # HAND_POSITIONS, cropped to what was drawn; box is where it goes
+    length, width, color, glow = THEMES[theme]["hands"][hand]
+    angle = position * 360 / HAND_POSITIONS[hand]
+    image = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    center = size / 2
+    passes = [(angle - 1, glow), (angle + 1, glow)] if glow else []
+    for a, fill in passes + [(angle, color)]:
+        a = math.radians(a - 90)
+        x = center + length * size * math.cos(a)
+        y = center + length * size * math.sin(a)
+        draw.line((center, center, x, y), fill=fill, width=width)
+    box = image.getbbox()
+    return image.crop(box), box
+
+
+def hand_positions(hour, minute, second):
+    return ((hour % 12) * 60 + minute, minute, second)
+
+
+def union(boxes):
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def intersect(a, b):
+    box = (max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3]))
+    return box if box[0] < box[2] and box[1] < box[3] else None
+
+
+class FaceRenderer:
+    # One clock face kept from tick to tick. update() puts the dial back
+    # under the hands that moved and pastes the hands again, but only within
+    # the box those hands covered before or cover now (usually the second
+    # hand's old and new place), and returns that box so the caller can
+    # upload just those pixels.
+    def __init__(self, size, font, theme="glow"):
+        self.size = size
+        self.theme = theme
+        self.dial = dial_layer(size, font, theme)
+        self.image = self.dial.copy()
+        self.positions = None
+        self.sprites = None
+
+    def update(self, hour, minute, second):
+        # Changed (left, top, right, bottom) of self.image, or None
+        positions = hand_positions(hour, minute, second)
+        if positions == self.positions:
+            return None
+        sprites = [hand_sprite(hand, p, self.size, self.theme) for hand, p in enumerate(positions)]
+        if self.sprites is None:
+            dirty = (0, 0, self.size, self.size)
+        else:
+            boxes = []
+            for old, new in zip(self.sprites, sprites):
+                if old is not new:
+                    boxes += (old[1], new[1])
+            dirty = union(boxes)
+        self.positions = positions
+        self.sprites = sprites
+
+        image = self.image
+        image.paste(self.dial.crop(dirty), dirty[:2])
+        for sprite, box in sprites:
+            clip = intersect(box, dirty)
+            if clip is None:
+                continue
+            # Not paste() with the sprite as its own mask, which scales the
+            # translucent glow's color and alpha by its alpha a second time
+            image.alpha_composite(sprite, clip[:2], (clip[0] - box[0], clip[1] - box[1],
+                                                     clip[2] - box[0], clip[3] - box[1]))
+        return dirty
+
+
+def upload_tk(photo, scratch, image, box):
+    # Copy box of image into the Tk photo at the same place. ImageTk can only
+    # paste a whole image at (0, 0), so the box goes into the corner of
+    # scratch (a PhotoImage the size of photo) and Tk copies it across.
+    left, top, right, bottom = box
+    scratch.paste(image.crop(box))
+    photo.tk.call(str(photo), "copy", str(scratch), "-from", 0, 0, right - left, bottom - top,
+                  "-to", left, top, "-compositingrule", "set")
@@ -1,7 +1,7 @@
 import tkinter as tk 
-from PIL import Image, ImageDraw, ImageTk, ImageFont
+from PIL import ImageTk, ImageFont
+from romanface import FaceRenderer, upload_tk
 import time
-import math
 import winsound
 import threading
 import ntplib
@@ -47,6 +47,8 @@ class RomanClock:
         # Sync time
         self.offset = self.get_ntp_offset()
 
+        self.face = FaceRenderer(200, self.font, theme="outline")
+        self.photo = None  # created on the first tick, then updated in place
         self.update_clock()
 
     def toggle_sound(self):
@@ -72,50 +74,20 @@ class RomanClock:
         win32gui.SetLayeredWindowAttributes(hwnd, 0, 255, win32con.LWA_ALPHA)
 
     def draw_clock(self, hour, minute, second):
-        image = Image.new("RGB", (200, 200), "black")
-        draw = ImageDraw.Draw(image)
-
-        center = 100
-        radius = 90
-        roman = ["XII", "I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X", "XI"]
-
-        # Draw numerals
-        for i in range(12):
-            angle = math.radians(i * 30 - 90)
-            x = center + radius * 0.8 * math.cos(angle)
-            y = center + radius * 0.8 * math.sin(angle)
-            bbox = draw.textbbox((0, 0), roman[i], font=self.font)
-            w, h = bbox[2] - bbox[0], bbox[3] - bbox[1]
-            tx, ty = x - w / 2, y - h / 2
-
-        # Draw glow by layering surrounding text in bright color
-            for dx in [-1, 0, 1]:
-               for dy in [-1, 0, 1]:
-                   if dx != 0 or dy != 0:
-                       draw.text((tx + dx, ty + dy), roman[i], font=self.font, fill="cyan")
-    
-        # Center white text
-            draw.text((tx, ty), roman[i], font=self.font, fill="white")
-
-    def draw_hand(length, angle_deg, width, color):
-            angle = math.radians(angle_deg - 90)
-            x = center + length * math.cos(angle)
-            y = center + length * math.sin(angle)
-            draw.line((center, center, x, y), fill=color, width=width)
-
-        draw_hand(40, (hour % 12 + minute / 60) * 30, 4, "lime")     # Hour hand
-        draw_hand(60, minute * 6, 2, "cyan")                         # Minute hand
-        draw_hand(70, second * 6, 1, "red")                          # Second hand
-
-        return ImageTk.PhotoImage(image)
+        # Only the box under the hands that moved is redrawn and sent to Tk
+        box = self.face.update(hour, minute, second)
+        if self.photo is None:
+            self.photo = ImageTk.PhotoImage(self.face.image)
+            self.scratch = ImageTk.PhotoImage("RGBA", self.face.image.size)
+            self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
+        elif box:
+            upload_tk(self.photo, self.scratch, self.face.image, box)
 
     def update_clock(self):
         now = time.localtime(time.time() + self.offset)
         hour, minute, second = now.tm_hour, now.tm_min, now.tm_sec
 
-        photo = self.draw_clock(hour, minute, second)
-        self.canvas.create_image(0, 0, anchor=tk.NW, image=photo)
-        self.canvas.image = photo  # Prevent garbage collection
+        self.draw_clock(hour, minute, second)
 
         self.label.config(text=time.strftime("%H:%M:%S", now))
 
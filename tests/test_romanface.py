@@ -0,0 +1,40 @@
+import os
+import sys
+
+from PIL import Image, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from romanface import FaceRenderer, dial_layer, hand_positions, hand_sprite
+
+SIZE = 100
+
+
+def full_redraw(hour, minute, second, theme):
+    # The whole face from scratch: dial, then each hand composited over it
+    image = dial_layer(SIZE, ImageFont.load_default(), theme).copy()
+    for hand, position in enumerate(hand_positions(hour, minute, second)):
+        sprite, box = hand_sprite(hand, position, SIZE, theme)
+        layer = Image.new("RGBA", image.size, (0, 0, 0, 0))
+        layer.paste(sprite, box[:2])
+        image = Image.alpha_composite(image, layer)
+    return image
+
+
+def test_glow_frames_match_full_redraw():
+    face = FaceRenderer(SIZE, ImageFont.load_default(), "glow")
+    for hour, minute, second in [(10, 8, 0), (10, 8, 1), (10, 8, 2), (10, 9, 40), (3, 15, 15)]:
+        face.update(hour, minute, second)
+        assert face.image.tobytes() == full_redraw(hour, minute, second, "glow").tobytes()
+
+
+def test_glow_keeps_its_color():
+    # The translucent glow over the transparent background stays (255, 0, 0, 120)
+    face = FaceRenderer(SIZE, ImageFont.load_default(), "glow")
+    face.update(0, 0, 15)
+    sprite, box = hand_sprite(2, 15, SIZE, "glow")
+    for x in range(sprite.width):
+        for y in range(sprite.height):
+            pixel = sprite.getpixel((x, y))
+            if pixel[3] and face.dial.getpixel((box[0] + x, box[1] + y))[3] == 0:
+                assert face.image.getpixel((box[0] + x, box[1] + y)) == pixel
@@ -0,0 +1,25 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import toolpath
+from toolpath import parse_gcode
+
+
+def dwells(lines):
+    return list(parse_gcode(["G21 G90 G1 F100"] + lines + ["G1 X1"]).dwell)
+
+
+def test_dwell_p_is_milliseconds():
+    assert dwells(["G4 P1500"]) == [1.5]
+
+
+def test_dwell_x_and_u_are_seconds():
+    assert dwells(["G4 X2.5"]) == [2.5]
+    assert dwells(["G4 U0.5", "G04 P250"]) == [0.75]
+
+
+def test_dwell_p_unit_is_configurable(monkeypatch):
+    monkeypatch.setattr(toolpath, "DWELL_P_UNIT", 1.0)
+    assert dwells(["G4 P2"]) == [2.0]
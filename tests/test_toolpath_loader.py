@@ -0,0 +1,48 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from toolpath import GCodeParser, Toolpath, parse_gcode
+from toolpath_index import SegmentGrid
+from toolpath_loader import ToolpathLoader
+
+
+def load(path, chunk_size):
+    # What the viewers do with the loader's messages, without Tk
+    loader = ToolpathLoader(path, chunk_size).start()
+    toolpath = Toolpath()
+    while True:
+        message = loader.queue.get(timeout=10)
+        if message[0] == "done":
+            assert message[1] is None
+            return toolpath
+        toolpath.extend(message[1])
+
+
+def test_comment_header_chunk_keeps_the_real_grid(tmp_path):
+    lines = [f"(header comment {n})" for n in range(200)]
+    lines += ["G0 X0 Y0", "G1 F100"] + [f"G1 X{n % 50} Y{n // 50}" for n in range(2000)]
+    path = tmp_path / "header.nc"
+    path.write_text("\n".join(lines) + "\n")
+
+    toolpath = load(str(path), chunk_size=4096)
+    expected = parse_gcode(lines)
+    assert len(toolpath) == len(expected)
+    grid = SegmentGrid.build(expected)
+    assert toolpath.index.cell_size != 1.0
+    for rect in [(0, 0, 5, 5), (10, 10, 12, 30), (-1, -1, 100, 100)]:
+        assert toolpath.index.query(toolpath, *rect) == grid.query(expected, *rect)
+
+
+def test_unexpected_errors_end_the_load(tmp_path, monkeypatch):
+    path = tmp_path / "broken.nc"
+    path.write_text("G0 X0 Y0\nG1 X1 Y1 F100\n")
+
+    def fail(self, lines):
+        raise KeyError("boom")
+
+    monkeypatch.setattr(GCodeParser, "feed", fail)
+    loader = ToolpathLoader(str(path)).start()
+    message = loader.queue.get(timeout=10)
+    assert message[0] == "done" and isinstance(message[1], KeyError)
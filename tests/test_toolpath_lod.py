@@ -0,0 +1,73 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import ImageChops
+
+from ncbench import GENERATORS
+from ncrender import fit_view, segment_style
+from toolpath import parse_gcode, reparse
+from toolpath_lod import LodPyramid
+from toolpath_render import TileRenderer
+
+
+def scan(level, xmin, ymin, xmax, ymax):
+    return [k for k in range(len(level))
+            if level.xmin[k] <= xmax and level.xmax[k] >= xmin and
+            level.ymin[k] <= ymax and level.ymax[k] >= ymin]
+
+
+def test_coarse_levels_have_fewer_runs():
+    pyramid = LodPyramid.build(parse_gcode(list(GENERATORS["arcs"](10000))))
+    counts = [len(level) for level in pyramid.levels]
+    assert counts == sorted(counts, reverse=True)
+    assert counts[-1] < counts[0] / 20
+
+
+def test_runs_in_matches_a_scan():
+    pyramid = LodPyramid.build(parse_gcode(list(GENERATORS["arcs"](5000))))
+    for level in pyramid.levels:
+        for rect in [(0, 0, 50, 50), (100, 200, 400, 260), (-1e9, -1e9, 1e9, 1e9)]:
+            assert level.runs_in(*rect) == scan(level, *rect)
+
+
+def test_zigzag_denser_than_a_cell_collapses():
+    lines = ["G0 X0 Y0", "G1 F100"]
+    for k in range(1000):
+        lines.append(f"G1 X{10 if k % 2 == 0 else 0} Y{k * 0.001:.3f}")
+    level = LodPyramid.build(parse_gcode(lines)).levels[-1]
+    assert len(level.xs) <= 4
+
+
+def frame(toolpath):
+    scale, ox, oy = fit_view(toolpath, 400, 300)
+    renderer = TileRenderer(segment_style)
+    renderer.toolpath = toolpath
+    return renderer.render(scale, ox, oy, 400, 300).convert("L")
+
+
+def test_edits_splice_the_pyramid():
+    rnd = random.Random(3)
+    for kind, count in [("arcs", 3000), ("pocket", 6000)]:
+        lines = list(GENERATORS[kind](count))
+        tp = parse_gcode(lines)
+        tp.lod = LodPyramid.build(tp)
+        for level in tp.lod.levels:
+            level.runs_in(0, 0, 1, 1)  # indexes are spliced along
+        for _ in range(6):
+            first = rnd.randrange(len(lines))
+            old_end = min(len(lines), first + rnd.randrange(20))
+            new = [f"G1 X{rnd.uniform(0, 100):.3f} Y{rnd.uniform(0, 60):.3f}" for _ in range(rnd.randrange(20))]
+            lines[first:old_end] = new
+            reparse(tp, lambda a, b: lines[a:b], first, old_end, first + len(new), len(lines))
+        assert tp.lod.count == len(tp)
+        for level in tp.lod.levels:
+            assert list(level.first) == sorted(level.first)
+            assert all(a <= b for a, b in zip(level.first, level.last))
+            assert level.runs_in(-1e9, -1e9, 1e9, 1e9) == list(range(len(level)))
+        fresh = parse_gcode(lines)
+        fresh.lod = LodPyramid.build(fresh)
+        diff = ImageChops.difference(frame(tp), frame(fresh)).point(lambda v: 255 if v else 0)
+        assert diff.histogram()[255] < 100, kind
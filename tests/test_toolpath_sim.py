@@ -0,0 +1,74 @@
+import os
+import sys
+import tkinter as tk
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from toolpath import parse_gcode
+from toolpath_sim import Simulation, SimulationBar
+
+PROGRAM = ["G21 G90", "G0 X0 Y0 Z5", "G1 Z-1 F100", "G1 X10 Y0", "G1 X10 Y10", "G0 Z5"]
+
+
+class FakeCanvas:
+    # Just enough of tk.Canvas for Simulation without a display
+    def __init__(self):
+        self.items = 0
+
+    def create_line(self, *args, **kw):
+        self.items += 1
+        return self.items
+
+    create_oval = create_line
+
+    def coords(self, *args):
+        pass
+
+    def itemconfig(self, *args, **kw):
+        pass
+
+    def delete(self, *args):
+        pass
+
+    def tag_raise(self, *args):
+        pass
+
+    def after(self, ms, func, *args):
+        return None
+
+    def after_cancel(self, job):
+        pass
+
+
+def style(motion, z):
+    return "red", 2
+
+
+def test_new_simulation_has_no_time():
+    sim = Simulation(FakeCanvas(), style)
+    assert sim.total == 0.0 and sim.time == 0.0
+
+
+def test_set_toolpath_resets_total():
+    sim = Simulation(FakeCanvas(), style)
+    sim.set_toolpath(parse_gcode(PROGRAM))
+    assert sim.total > 0
+    sim.set_toolpath(None)
+    assert sim.total == 0.0
+    sim.set_toolpath(parse_gcode([]))
+    assert sim.total == 0.0
+
+
+def test_bar_around_fresh_simulation():
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip("no display")
+    try:
+        canvas = tk.Canvas(root)
+        bar = SimulationBar(root, Simulation(canvas, style))
+        assert bar.step == 0
+    finally:
+        root.destroy()
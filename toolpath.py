@@ -0,0 +1,596 @@
+import array
+import bisect
+import math
+import re
+
+PARSER_VERSION = 3  # bump when parsing changes, invalidates toolpath caches
+# Seconds per unit of a G4 P word. Fanuc, Marlin and most hobby controllers
+# take P in milliseconds; set 1.0 for LinuxCNC or Grbl, where P is seconds.
+# X and U are seconds everywhere that has them.
+DWELL_P_UNIT = 0.001
+
+MOVE_RAPID = 0
+MOVE_LINE = 1
+MOVE_CW = 2
+MOVE_CCW = 3
+
+MODAL_NONE = 4  # no motion mode yet
+
+PLANE_XY = 0
+PLANE_ZX = 1
+PLANE_YZ = 2
+
+# Per-segment modes byte: modal motion, distance mode, units and plane in
+# effect after the segment's line.
+MODE_MOTION_MASK = 7
+MODE_INCREMENTAL = 8
+MODE_INCH = 16
+MODE_PLANE_SHIFT = 5
+
+RAPID_RATE = 5000.0  # mm/min assumed for G0 in cycle time estimates
+
+MOTION_CODES = {
+    "0": MOVE_RAPID, "00": MOVE_RAPID,
+    "1": MOVE_LINE, "01": MOVE_LINE,
+    "2": MOVE_CW, "02": MOVE_CW,
+    "3": MOVE_CCW, "03": MOVE_CCW,
+}
+
+# G word -> (kind, argument) for the codes the parser understands
+G_CODES = {code: ("motion", motion) for code, motion in MOTION_CODES.items()}
+G_CODES.update({
+    "90": ("distance", False), "91": ("distance", True),
+    "20": ("units", 25.4), "21": ("units", 1.0),
+    "17": ("plane", PLANE_XY), "18": ("plane", PLANE_ZX), "19": ("plane", PLANE_YZ),
+    "43": ("tool_offset", 0), "49": ("tool_offset", None),
+    "4": ("dwell", None), "04": ("dwell", None),
+    "10": ("setting", None), "28": ("setting", None), "30": ("setting", None),
+    "92": ("setting", None), "53": ("machine", None),
+})
+# G80 and the canned cycles end the modal motion; cycles aren't expanded
+G_CODES.update({str(code): ("motion", MODAL_NONE) for code in range(80, 90)})
+
+# Float columns of the toolpath, one entry per segment. Lines leave cx/cy/radius at 0.
+# xmin..ymax is the XY bounding box of the segment, exact for arcs. feed is
+# the modal feed rate (mm/min), length the true 3D length (mm) and dwell the
+# G4 time (s) before the segment.
+FLOAT_COLUMNS = ("x0", "y0", "z0", "x1", "y1", "z1", "cx", "cy", "radius",
+                 "xmin", "ymin", "xmax", "ymax", "feed", "length", "dwell")
+
+WORD_RE = re.compile(r"([A-Z])\s*([-+]?[0-9]*\.?[0-9]+)")
+COMMENT_RE = re.compile(r"\([^)]*\)")
+
+BOUNDS_BLOCK = 4096  # segments per cached bounds block
+ROW_BATCH = 65536  # segments the parser collects before handing them to the toolpath
+
+
+class Toolpath:
+    # Columnar, array-backed segment store. Segment i is described by
+    # motion[i], the start/end points, the arc center and radius, the source
+    # line index it came from, and the modal state/feed after that line.
+    # index (toolpath_index.SegmentGrid) and
+    # lod (toolpath_lod.LodPyramid) are optional acceleration structures kept
+    # in step with the segments.
+    #
+    # Overall bounds are cached per block of BOUNDS_BLOCK segments, so
+    # appending or splicing only rescans the blocks that actually changed.
+    # line_offsets, when known, holds the byte offset of every source line in
+    # the file the program was loaded from. version counts splices.
+    def __init__(self):
+        self.motion = array.array("b")
+        self.line_no = array.array("i")
+        self.modes = array.array("b")
+        for name in FLOAT_COLUMNS:
+            setattr(self, name, array.array("d"))
+        self.index = None
+        self.lod = None
+        self.block_bounds = []  # (xmin, ymin, xmax, ymax) per full block, None when stale
+        self.line_offsets = None
+        self.version = 0
+
+    def __len__(self):
+        return len(self.motion)
+
+    def columns(self):
+        return [("motion", self.motion), ("line_no", self.line_no), ("modes", self.modes)] + \
+               [(name, getattr(self, name)) for name in FLOAT_COLUMNS]
+
+    def add(self, motion, x0, y0, z0, x1, y1, z1, cx, cy, radius, line_no,
+            modes=MODAL_NONE, feed=0.0, length=0.0, dwell=0.0):
+        self.motion.append(motion)
+        self.line_no.append(line_no)
+        self.modes.append(modes)
+        self.feed.append(feed)
+        self.length.append(length)
+        self.dwell.append(dwell)
+        self.x0.append(x0)
+        self.y0.append(y0)
+        self.z0.append(z0)
+        self.x1.append(x1)
+        self.y1.append(y1)
+        self.z1.append(z1)
+        self.cx.append(cx)
+        self.cy.append(cy)
+        self.radius.append(radius)
+        if motion >= MOVE_CW:
+            xmin, ymin, xmax, ymax = arc_bounds(x0, y0, x1, y1, cx, cy, radius, motion == MOVE_CW)
+        else:
+            xmin, xmax = (x0, x1) if x0 < x1 else (x1, x0)
+            ymin, ymax = (y0, y1) if y0 < y1 else (y1, y0)
+        self.xmin.append(xmin)
+        self.ymin.append(ymin)
+        self.xmax.append(xmax)
+        self.ymax.append(ymax)
+
+    def add_rows(self, rows):
+        # Bulk add(): rows are (motion, x0, y0, z0, x1, y1, z1, cx, cy, radius,
+        # line_no, modes, feed, length, dwell) tuples. Boxes are computed for
+        # all rows as if they were lines, then fixed up for the arcs.
+        if not rows:
+            return
+        start = len(self)
+        names = ("motion", "x0", "y0", "z0", "x1", "y1", "z1", "cx", "cy", "radius",
+                 "line_no", "modes", "feed", "length", "dwell")
+        columns = tuple(zip(*rows))
+        for name, values in zip(names, columns):
+            getattr(self, name).extend(values)
+        # Comprehensions beat map(min, ...): no builtin call per value
+        x0, y0, _, x1, y1 = columns[1:6]
+        self.xmin.extend([a if a < b else b for a, b in zip(x0, x1)])
+        self.ymin.extend([a if a < b else b for a, b in zip(y0, y1)])
+        self.xmax.extend([a if a > b else b for a, b in zip(x0, x1)])
+        self.ymax.extend([a if a > b else b for a, b in zip(y0, y1)])
+        for k, row in enumerate(rows):
+            if row[0] >= MOVE_CW:
+                i = start + k
+                self.xmin[i], self.ymin[i], self.xmax[i], self.ymax[i] = arc_bounds(*row[1:3], *row[4:6], *row[7:10],
+                                                                                    row[0] == MOVE_CW)
+
+    def extend(self, other):
+        # other.index must use ids relative to self (see ToolpathLoader)
+        start = len(self)
+        for (_, column), (_, more) in zip(self.columns(), other.columns()):
+            column.extend(more)
+        for name in ("index", "lod", "line_offsets"):
+            if name != "line_offsets" and not len(other):
+                continue  # nothing to index, and other's grid sizes may be made up
+            mine = getattr(self, name)
+            more = getattr(other, name)
+            if more is None or (mine is None and start):
+                setattr(self, name, None)
+            elif mine is None:
+                setattr(self, name, more)
+            elif name == "line_offsets":
+                mine.extend(more)
+            else:
+                mine.merge(more)
+
+    def copy(self):
+        # Segments only, without index and lod
+        tp = Toolpath()
+        for (_, column), (_, mine) in zip(tp.columns(), self.columns()):
+            column.extend(mine)
+        return tp
+
+    def take(self, ids):
+        # New toolpath made of segments ids (in that order), without index and lod
+        tp = Toolpath()
+        for (_, column), (_, mine) in zip(tp.columns(), self.columns()):
+            column.extend([mine[i] for i in ids])
+        return tp
+
+    def replace(self, start, end, other, line_delta=0):
+        # Splice other's segments in place of segments start..end. Segments
+        # after the splice get line_delta added to their line numbers. The
+        # spatial index and the LOD pyramid are updated in place. Returns the
+        # world rectangle the removed and added segments span, or None.
+        boxes = [tp.range_bounds(a, b) for tp, a, b in ((self, start, end), (other, 0, len(other))) if b > a]
+        index = self.index
+        if index is not None:
+            index.remove_range(self, start, end)
+        for (_, column), (_, more) in zip(self.columns(), other.columns()):
+            column[start:end] = more
+        after = start + len(other)
+        if line_delta:
+            self.line_no[after:] = array.array("i", [n + line_delta for n in self.line_no[after:]])
+        if index is not None:
+            index.shift(end, after - end)
+            index.insert_range(self, start, after)
+        if self.lod is not None:
+            self.lod.replace(self, start, end, after)
+        self.line_offsets = None  # the text no longer matches the file
+        self.version += 1
+        if after == end:
+            self.invalidate_bounds(start, end)
+        else:
+            self.invalidate_bounds(start)
+        if not boxes:
+            return None
+        return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+    def invalidate_bounds(self, start, end=None):
+        # Segments start..end changed (end=None: everything from start on)
+        first = start // BOUNDS_BLOCK
+        if end is None:
+            del self.block_bounds[first:]
+            return
+        for k in range(first, min(len(self.block_bounds), (end - 1) // BOUNDS_BLOCK + 1)):
+            self.block_bounds[k] = None
+
+    def bounds(self):
+        # (xmin, ymin, xmax, ymax) over all segments, arcs included, or None
+        # when empty. Only stale blocks and the partial last block are scanned.
+        n = len(self)
+        if not n:
+            return None
+        blocks = self.block_bounds
+        full = n // BOUNDS_BLOCK
+        del blocks[full:]
+        blocks.extend([None] * (full - len(blocks)))
+        parts = []
+        for k, box in enumerate(blocks):
+            if box is None:
+                box = blocks[k] = self.range_bounds(k * BOUNDS_BLOCK, (k + 1) * BOUNDS_BLOCK)
+            parts.append(box)
+        if full * BOUNDS_BLOCK < n:
+            parts.append(self.range_bounds(full * BOUNDS_BLOCK, n))
+        return (min(b[0] for b in parts), min(b[1] for b in parts),
+                max(b[2] for b in parts), max(b[3] for b in parts))
+
+    def range_bounds(self, start, end):
+        return (min(self.xmin[start:end]), min(self.ymin[start:end]),
+                max(self.xmax[start:end]), max(self.ymax[start:end]))
+
+    def is_arc(self, i):
+        return self.motion[i] >= MOVE_CW
+
+
+class GCodeParser:
+    # Single pass modal interpreter. Feed it lines (all at once or in chunks)
+    # and it appends segments to self.toolpath while carrying the modal state
+    # forward: position, motion mode (G0-G3 stay active for coordinate-only
+    # lines), G90/G91, G20/G21, the arc plane G17-G19, feed rate and spindle
+    # speed. Coordinates and feeds are stored in mm and mm/min.
+    #
+    # Arcs in the XZ/YZ planes project to straight lines in the XY view and are
+    # stored as such, with their true length. G4 dwells are attached to the
+    # next segment (see DWELL_P_UNIT). G10/G28/G30/G92 lines don't move (their axis words are not
+    # a target), and G43/G49 tool length offsets don't change the programmed
+    # tool tip path, so they're only tracked. N words, M/T codes and unknown
+    # G codes are skipped.
+    def __init__(self, toolpath=None):
+        self.toolpath = toolpath if toolpath is not None else Toolpath()
+        self.x = self.y = self.z = 0.0
+        self.motion = MODAL_NONE
+        self.incremental = False
+        self.unit = 1.0  # mm per program unit
+        self.plane = PLANE_XY
+        self.feed_rate = 0.0
+        self.spindle = 0.0
+        self.tool_offset = None  # H number while G43 is active
+        self.dwell = 0.0  # seconds of G4 waiting for the next segment
+        self.line_no = 0
+
+    def modes(self):
+        return (self.motion | (MODE_INCREMENTAL if self.incremental else 0) |
+                (MODE_INCH if self.unit != 1.0 else 0) | (self.plane << MODE_PLANE_SHIFT))
+
+    def state(self):
+        # Everything that decides how the following lines are interpreted
+        return self.x, self.y, self.z, self.modes(), self.feed_rate, self.dwell
+
+    def restore(self, toolpath, i):
+        # Modal state right after the line that produced segment i
+        self.x, self.y, self.z = toolpath.x1[i], toolpath.y1[i], toolpath.z1[i]
+        modes = toolpath.modes[i]
+        self.motion = modes & MODE_MOTION_MASK
+        self.incremental = bool(modes & MODE_INCREMENTAL)
+        self.unit = 25.4 if modes & MODE_INCH else 1.0
+        self.plane = modes >> MODE_PLANE_SHIFT
+        self.feed_rate = toolpath.feed[i]
+        self.dwell = 0.0
+        self.line_no = toolpath.line_no[i] + 1
+
+    def feed(self, lines):
+        # Segments are collected as row tuples and handed to the toolpath in
+        # batches (Toolpath.add_rows), which is much cheaper than appending to
+        # every column per segment. Modal state lives in locals in the loop.
+        rows = []
+        append = rows.append
+        findall = WORD_RE.findall
+        g_codes = G_CODES
+        sqrt = math.sqrt
+        x, y, z = self.x, self.y, self.z
+        motion, incremental, unit, plane = self.motion, self.incremental, self.unit, self.plane
+        feed_rate, dwell = self.feed_rate, self.dwell
+        modes = self.modes()
+        n = self.line_no
+        for line in lines:
+            line_no = n
+            n += 1
+            if "(" in line:
+                line = COMMENT_RE.sub(" ", line)
+            if ";" in line:
+                line = line.split(";", 1)[0]
+            line = line.upper()
+            words = findall(line)
+            if not words:
+                continue
+            args = dict(words)
+
+            action = None
+            if "G" in args:
+                codes = (args["G"],) if line.count("G") == 1 else [v for letter, v in words if letter == "G"]
+                for value in codes:
+                    code = g_codes.get(value)
+                    if code is None:
+                        continue
+                    kind, arg = code
+                    if kind == "motion":
+                        motion = arg
+                    elif kind == "distance":
+                        incremental = arg
+                    elif kind == "units":
+                        unit = arg
+                    elif kind == "plane":
+                        plane = arg
+                    elif kind == "tool_offset":
+                        self.tool_offset = arg
+                    else:
+                        action = kind
+                modes = (motion | (MODE_INCREMENTAL if incremental else 0) |
+                         (MODE_INCH if unit != 1.0 else 0) | (plane << MODE_PLANE_SHIFT))
+
+            if "F" in args:
+                feed_rate = float(args["F"]) * unit
+            if action is not None:
+                if action == "dwell":
+                    if "P" in args:
+                        dwell += float(args["P"]) * DWELL_P_UNIT
+                    else:
+                        dwell += float(args.get("X", args.get("U", 0.0)))
+                    continue
+                if action == "setting":
+                    continue
+            if "S" in args:
+                self.spindle = float(args["S"])
+            if "H" in args and self.tool_offset is not None:
+                self.tool_offset = int(float(args["H"]))
+            if motion == MODAL_NONE:
+                continue
+            tx = args.get("X")
+            ty = args.get("Y")
+            tz = args.get("Z")
+            if tx is None and ty is None and tz is None:
+                if motion < MOVE_CW or not ("I" in args or "J" in args or "K" in args):
+                    continue  # modal motion needs a target (a full circle needs its center)
+
+            if incremental and action != "machine":
+                nx = x if tx is None else x + float(tx) * unit
+                ny = y if ty is None else y + float(ty) * unit
+                nz = z if tz is None else z + float(tz) * unit
+            else:
+                nx = x if tx is None else float(tx) * unit
+                ny = y if ty is None else float(ty) * unit
+                nz = z if tz is None else float(tz) * unit
+
+            if motion >= MOVE_CW and ("I" in args or "J" in args or "K" in args or "R" in args):
+                clockwise = motion == MOVE_CW
+                # (a, b) in-plane axes with their center words, c the helix axis
+                if plane == PLANE_XY:
+                    a0, b0, a1, b1, c0, c1, ka, kb = x, y, nx, ny, z, nz, "I", "J"
+                elif plane == PLANE_ZX:
+                    a0, b0, a1, b1, c0, c1, ka, kb = z, x, nz, nx, y, ny, "K", "I"
+                else:
+                    a0, b0, a1, b1, c0, c1, ka, kb = y, z, ny, nz, x, nx, "J", "K"
+                if "R" in args and ka not in args and kb not in args:
+                    ca, cb = center_from_radius(a0, b0, a1, b1, float(args["R"]) * unit, clockwise)
+                else:
+                    ca = a0 + float(args.get(ka, 0.0)) * unit
+                    cb = b0 + float(args.get(kb, 0.0)) * unit
+                radius = math.hypot(a0 - ca, b0 - cb)
+                length = math.hypot(radius * arc_sweep(a0, b0, a1, b1, ca, cb, clockwise), c1 - c0)
+                if plane == PLANE_XY:
+                    append((motion, x, y, z, nx, ny, nz, ca, cb, radius, line_no, modes, feed_rate, length, dwell))
+                else:
+                    append((MOVE_LINE, x, y, z, nx, ny, nz, 0.0, 0.0, 0.0, line_no, modes, feed_rate, length, dwell))
+            else:
+                dx = nx - x
+                dy = ny - y
+                dz = nz - z
+                append((MOVE_LINE if motion else MOVE_RAPID, x, y, z, nx, ny, nz, 0.0, 0.0, 0.0, line_no,
+                        modes, feed_rate, sqrt(dx * dx + dy * dy + dz * dz), dwell))
+            dwell = 0.0
+            x, y, z = nx, ny, nz
+            if len(rows) >= ROW_BATCH:
+                self.toolpath.add_rows(rows)
+                rows.clear()
+
+        self.toolpath.add_rows(rows)
+        self.x, self.y, self.z = x, y, z
+        self.motion, self.incremental, self.unit, self.plane = motion, incremental, unit, plane
+        self.feed_rate, self.dwell = feed_rate, dwell
+        self.line_no = n
+        return self.toolpath
+
+
+def parse_gcode(lines):
+    return GCodeParser().feed(lines)
+
+
+def reparse(toolpath, read_lines, first, old_end, new_end, total):
+    # Incremental re-parse after source lines first..old_end were replaced by
+    # new lines first..new_end. read_lines(a, b) returns new lines a..b and
+    # total is the new line count. Parsing resumes from the modal state saved
+    # with the last segment before the edit and runs past the edit only until
+    # the state matches the old program's again; everything after that is
+    # kept and just renumbered. Returns the first segment that changed and
+    # the rectangle the changes span (see Toolpath.replace).
+    line_no = toolpath.line_no
+    delta = new_end - old_end
+    start = bisect.bisect_left(line_no, first)
+    parser = GCodeParser()
+    if start:
+        parser.restore(toolpath, start - 1)
+    parser.toolpath = Toolpath()
+    parser.feed(read_lines(parser.line_no, new_end))
+
+    end = len(toolpath)
+    line = new_end
+    pending = iter(())
+    step = 16
+    while line < total:
+        # The old state after old_line is only known if that line produced a segment
+        old_line = line - 1 - delta
+        j = bisect.bisect_right(line_no, old_line) - 1
+        if old_line >= first and j >= 0 and line_no[j] == old_line and parser.state() == segment_state(toolpath, j):
+            end = j + 1
+            break
+        text = next(pending, None)
+        if text is None:
+            batch = read_lines(line, min(total, line + step))
+            if not batch:
+                break
+            step *= 2
+            pending = iter(batch)
+            text = next(pending)
+        parser.feed((text,))
+        line += 1
+    return start, toolpath.replace(start, end, parser.toolpath, delta)
+
+
+def segment_state(toolpath, i):
+    # GCodeParser.state() as it was right after segment i's line
+    return (toolpath.x1[i], toolpath.y1[i], toolpath.z1[i], toolpath.modes[i], toolpath.feed[i], 0.0)
+
+
+def segment_times(toolpath, rapid_rate=RAPID_RATE, start=0):
+    # Seconds spent on each segment from start on, including the dwell
+    # before it. Feed moves without a feed rate take no time.
+    times = array.array("d", bytes(8 * (len(toolpath) - start)))
+    motion, feed, length, dwell = toolpath.motion, toolpath.feed, toolpath.length, toolpath.dwell
+    for i in range(start, len(toolpath)):
+        rate = rapid_rate if motion[i] == MOVE_RAPID else feed[i]
+        times[i - start] = dwell[i] + (length[i] * 60.0 / rate if rate > 0 else 0.0)
+    return times
+
+
+def program_stats(toolpath, rapid_rate=RAPID_RATE):
+    # (cut length mm, rapid length mm, estimated cycle time in seconds)
+    cut = rapid = 0.0
+    for m, length in zip(toolpath.motion, toolpath.length):
+        if m == MOVE_RAPID:
+            rapid += length
+        else:
+            cut += length
+    return cut, rapid, math.fsum(segment_times(toolpath, rapid_rate))
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+def stats_text(toolpath, rapid_rate=RAPID_RATE):
+    cut, rapid, seconds = program_stats(toolpath, rapid_rate)
+    return f"{len(toolpath)} moves, cut {cut:.0f} mm, rapid {rapid:.0f} mm, ~{format_duration(seconds)}"
+
+
+def center_from_radius(x1, y1, x2, y2, r, clockwise):
+    dx = x2 - x1
+    dy = y2 - y1
+    chord_len = math.hypot(dx, dy)
+    if chord_len == 0:
+        return x1, y1
+
+    mx = (x1 + x2) / 2
+    my = (y1 + y2) / 2
+
+    h = math.sqrt(abs(r**2 - (chord_len / 2)**2))
+    ux = -dy / chord_len
+    uy = dx / chord_len
+
+    cx1 = mx + h * ux
+    cy1 = my + h * uy
+    cx2 = mx - h * ux
+    cy2 = my - h * uy
+
+    def cross_z(cx, cy):
+        vx1 = x1 - cx
+        vy1 = y1 - cy
+        vx2 = x2 - cx
+        vy2 = y2 - cy
+        return vx1 * vy2 - vy1 * vx2
+
+    if clockwise:
+        return (cx1, cy1) if cross_z(cx1, cy1) < 0 else (cx2, cy2)
+    else:
+        return (cx1, cy1) if cross_z(cx1, cy1) > 0 else (cx2, cy2)
+
+
+def arc_angles(x1, y1, x2, y2, cx, cy, clockwise):
+    start_angle = math.atan2(y1 - cy, x1 - cx)
+    end_angle = math.atan2(y2 - cy, x2 - cx)
+    if clockwise:
+        if end_angle >= start_angle:
+            end_angle -= 2 * math.pi
+    else:
+        if end_angle <= start_angle:
+            end_angle += 2 * math.pi
+    return start_angle, end_angle
+
+
+def arc_points(x1, y1, x2, y2, cx, cy, radius, clockwise, steps):
+    # Flat [x, y, x, y, ...] list of steps + 1 points along the arc, in world
+    # units. Points come from rotating the radius vector by a fixed step, so
+    # there is one cos/sin per arc rather than per point.
+    start_angle, end_angle = arc_angles(x1, y1, x2, y2, cx, cy, clockwise)
+    step = (end_angle - start_angle) / steps
+    c = math.cos(step)
+    s = math.sin(step)
+    dx = x1 - cx
+    dy = y1 - cy
+    points = [x1, y1]
+    for _ in range(steps - 1):
+        dx, dy = dx * c - dy * s, dx * s + dy * c
+        points.append(cx + dx)
+        points.append(cy + dy)
+    points.append(x2)
+    points.append(y2)
+    return points
+
+
+def chord_steps(radius, sweep, tolerance):
+    # Number of chords keeping the distance between arc and chord under tolerance
+    if radius <= tolerance:
+        return 1
+    step = 2 * math.acos(1 - tolerance / radius)
+    return max(1, int(math.ceil(sweep / step)))
+
+
+def arc_sweep(x1, y1, x2, y2, cx, cy, clockwise):
+    start_angle, end_angle = arc_angles(x1, y1, x2, y2, cx, cy, clockwise)
+    return abs(end_angle - start_angle)
+
+
+def arc_bounds(x1, y1, x2, y2, cx, cy, radius, clockwise):
+    # Exact XY bounding box: the end points plus every axis extreme the arc sweeps over
+    start_angle, end_angle = arc_angles(x1, y1, x2, y2, cx, cy, clockwise)
+    lo, hi = min(start_angle, end_angle), max(start_angle, end_angle)
+    xmin, xmax = min(x1, x2), max(x1, x2)
+    ymin, ymax = min(y1, y2), max(y1, y2)
+    for k in range(4):
+        angle = k * math.pi / 2
+        angle += 2 * math.pi * math.ceil((lo - angle) / (2 * math.pi))
+        if angle <= hi:
+            if k == 0:
+                xmax = max(xmax, cx + radius)
+            elif k == 1:
+                ymax = max(ymax, cy + radius)
+            elif k == 2:
+                xmin = min(xmin, cx - radius)
+            else:
+                ymin = min(ymin, cy - radius)
+    return xmin, ymin, xmax, ymax
@@ -0,0 +1,249 @@
+import array
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import sys
+import threading
+
+from toolpath import DWELL_P_UNIT, PARSER_VERSION, Toolpath
+from toolpath_index import SegmentGrid
+from toolpath_lod import LodLevel, LodPyramid
+
+# Sidecar cache of a parsed program: "<program>.tpcache" holds the toolpath
+# columns, cached bounds, source line offsets, spatial index and LOD pyramid
+# as raw arrays, so a cache hit is an mmap plus a few memoryview casts.
+#
+# Layout: MAGIC, 8-byte header length, JSON header, then the sections, each
+# 8-byte aligned. The header records the cache/parser versions and the
+# source file's size, mtime and content hash. A cache whose size/mtime still
+# match is trusted as is; if only the mtime moved the file is re-hashed.
+#
+# Loaded toolpaths are read-only (memoryview columns and LOD levels).
+# make_writable() copies them into arrays before anything splices them.
+
+MAGIC = b"TPCACHE\0"
+CACHE_VERSION = 3  # 2: coarse LOD levels drop dots and merge runs, 3: LOD source ranges and repeats
+CACHE_SUFFIX = ".tpcache"
+HASH_CHUNK = 4 * 1024 * 1024
+WRITE_CHUNK = 1 << 20  # elements per write, bounds the temporary copies
+LOD_ARRAYS = ("xs", "ys", "starts", "first", "last", "shared", "motion", "z", "xmin", "ymin", "xmax", "ymax")
+
+
+def cache_path(path):
+    return path + CACHE_SUFFIX
+
+
+def new_hash():
+    return hashlib.blake2b(digest_size=20)
+
+
+def file_digest(path):
+    h = new_hash()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class PackedCells:
+    # Read-only stand-in for SegmentGrid.cells backed by sorted flat arrays:
+    # keys[k] packs cell (ix, iy), its ids are ids[offsets[k]:offsets[k + 1]].
+    def __init__(self, keys, offsets, ids):
+        self.keys = keys
+        self.offsets = offsets
+        self.ids = ids
+
+    @staticmethod
+    def pack(ix, iy):
+        return (ix << 32) + (iy + (1 << 31))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, key, default=None):
+        packed = self.pack(*key)
+        k = bisect.bisect_left(self.keys, packed)
+        if k == len(self.keys) or self.keys[k] != packed:
+            return default
+        return self.ids[self.offsets[k]:self.offsets[k + 1]]
+
+    def items(self):
+        for k, packed in enumerate(self.keys):
+            key = (packed >> 32, (packed & 0xFFFFFFFF) - (1 << 31))
+            yield key, self.ids[self.offsets[k]:self.offsets[k + 1]]
+
+
+def cache_sections(toolpath):
+    # (name, array-like) pairs making up the cache; the header describes the rest
+    toolpath.bounds()  # fills in block_bounds
+    sections = [("col." + name, column) for name, column in toolpath.columns()]
+    blocks = array.array("d")
+    for box in toolpath.block_bounds:
+        if box is None:
+            break
+        blocks.extend(box)
+    sections.append(("block_bounds", blocks))
+    if toolpath.line_offsets is not None:
+        sections.append(("line_offsets", toolpath.line_offsets))
+
+    index = toolpath.index
+    if index is not None:
+        keys = array.array("q")
+        offsets = array.array("q", [0])
+        ids = array.array("i")
+        for key in sorted(index.cells):
+            keys.append(PackedCells.pack(*key))
+            ids.extend(index.cells[key])
+            offsets.append(len(ids))
+        sections += [("index.keys", keys), ("index.offsets", offsets),
+                     ("index.ids", ids), ("index.big", index.big)]
+    if toolpath.lod is not None:
+        for n, level in enumerate(toolpath.lod.levels):
+            sections += [(f"lod{n}.{name}", getattr(level, name)) for name in LOD_ARRAYS]
+    return sections
+
+
+def save_cache(path, toolpath, digest, stat):
+    # stat is os.stat() of the program taken before it was read
+    sections = cache_sections(toolpath)
+    header = {
+        "version": CACHE_VERSION,
+        "parser": PARSER_VERSION,
+        "dwell_p_unit": DWELL_P_UNIT,
+        "byteorder": sys.byteorder,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "digest": digest,
+        "count": len(toolpath),
+        "sections": {},
+    }
+    if toolpath.index is not None:
+        header["cell_size"] = toolpath.index.cell_size
+    if toolpath.lod is not None:
+        header["lod_cells"] = [level.cell for level in toolpath.lod.levels]
+        header["lod_base"] = toolpath.lod.base_cell
+    offset = 0
+    for name, data in sections:
+        typecode = data.typecode if isinstance(data, array.array) else data.format
+        header["sections"][name] = (typecode, offset, len(data))
+        offset += (len(data) * data.itemsize + 7) & ~7
+
+    encoded = json.dumps(header).encode()
+    start = (len(MAGIC) + 8 + len(encoded) + 7) & ~7
+    tmp = cache_path(path) + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            f.write(start.to_bytes(8, "little"))
+            f.write(encoded)
+            f.write(b"\0" * (start - f.tell()))
+            for name, data in sections:
+                for a in range(0, len(data), WRITE_CHUNK):
+                    f.write(data[a:a + WRITE_CHUNK])
+                f.write(b"\0" * (-f.tell() % 8))
+        os.replace(tmp, cache_path(path))
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def load_cache(path):
+    # Toolpath for path from its sidecar cache, or None when missing/stale
+    try:
+        stat = os.stat(path)
+        with open(cache_path(path), "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            start = int.from_bytes(f.read(8), "little")
+            header = json.loads(f.read(start - len(MAGIC) - 8).rstrip(b"\0"))
+            if (header["version"], header["parser"], header.get("dwell_p_unit"), header["byteorder"]) != \
+                    (CACHE_VERSION, PARSER_VERSION, DWELL_P_UNIT, sys.byteorder):
+                return None
+            if header["size"] != stat.st_size:
+                return None
+            if header["mtime_ns"] != stat.st_mtime_ns and file_digest(path) != header["digest"]:
+                return None
+            data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    except (OSError, ValueError, KeyError):
+        return None
+
+    sections = header["sections"]
+
+    def section(name):
+        typecode, offset, count = sections[name]
+        a = start + offset
+        return data[a:a + count * array.array(typecode).itemsize].cast(typecode)
+
+    tp = Toolpath()
+    for name, _ in tp.columns():
+        setattr(tp, name, section("col." + name))
+    blocks = section("block_bounds")
+    tp.block_bounds = [tuple(blocks[k:k + 4]) for k in range(0, len(blocks), 4)]
+    if "line_offsets" in sections:
+        tp.line_offsets = section("line_offsets")
+    if "index.keys" in sections:
+        tp.index = SegmentGrid(header["cell_size"])
+        tp.index.cells = PackedCells(section("index.keys"), section("index.offsets"), section("index.ids"))
+        tp.index.big = section("index.big")
+    if "lod_cells" in header:
+        tp.lod = LodPyramid(header["lod_base"], 0)
+        tp.lod.count = header["count"]
+        for n, cell in enumerate(header["lod_cells"]):
+            level = LodLevel(cell)
+            for name in LOD_ARRAYS:
+                setattr(level, name, section(f"lod{n}.{name}"))
+            tp.lod.levels.append(level)
+    return tp
+
+
+def make_writable(toolpath):
+    # Copies mmap-backed columns and index cells into arrays, in place
+    for name, column in toolpath.columns():
+        if not isinstance(column, array.array):
+            setattr(toolpath, name, writable(column))
+    if toolpath.line_offsets is not None and not isinstance(toolpath.line_offsets, array.array):
+        toolpath.line_offsets = writable(toolpath.line_offsets)
+    index = toolpath.index
+    if index is not None and isinstance(index.cells, PackedCells):
+        index.cells = {key: writable(ids) for key, ids in index.cells.items()}
+        index.big = writable(index.big)
+    if toolpath.lod is not None:
+        for level in toolpath.lod.levels:
+            for name in LOD_ARRAYS:
+                if not isinstance(getattr(level, name), array.array):
+                    setattr(level, name, writable(getattr(level, name)))
+
+
+def writable(view):
+    a = array.array(view.format)
+    a.frombytes(view.cast("B"))
+    return a
+
+
+class CacheWriter:
+    # Writes the cache on a worker thread once a program finished loading.
+    # If the toolpath is edited meanwhile the half-written cache is dropped.
+    def __init__(self, path, toolpath, digest, stat):
+        self.path = path
+        self.toolpath = toolpath
+        self.digest = digest
+        self.stat = stat
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        version = self.toolpath.version
+        try:
+            save_cache(self.path, self.toolpath, self.digest, self.stat)
+        except (OSError, RuntimeError, BufferError, ValueError):
+            return
+        if self.toolpath.version != version:
+            try:
+                os.remove(cache_path(self.path))
+            except OSError:
+                pass
@@ -0,0 +1,195 @@
+import bisect
+import itertools
+import math
+import operator
+
+from toolpath import MOVE_CW, arc_points, arc_sweep, chord_steps, parse_gcode
+from toolpath_index import SegmentGrid
+
+# Sanity checks of a parsed program against the stock:
+#
+#   rapid through stock  G0 move that goes below the stock top (Z 0) inside
+#                        the stock outline (anywhere if there is no outline),
+#                        other than a straight retract
+#   cut outside boundary feed move leaving the allowed boundary polygon
+#
+# Polygons are lists of (x, y). The boundary check is driven by the
+# toolpath's SegmentGrid: grid cells away from the polygon edges are classed
+# inside/outside once, by scanline parity of their center, so segments that
+# only sit in inside cells are never looked at one by one. Only segments in
+# cells touching the boundary or outside it (and the "big" ones) get exact
+# polygon tests.
+
+RAPID_THROUGH_STOCK = "rapid through stock"
+CUT_OUTSIDE_BOUNDARY = "cut outside boundary"
+ARC_TOLERANCE = 0.01  # mm, chord error when testing arcs against the polygon
+
+
+class Issue:
+    def __init__(self, kind, segment, line_no):
+        self.kind = kind
+        self.segment = segment
+        self.line_no = line_no
+
+    def __str__(self):
+        return f"line {self.line_no + 1}: {self.kind}"
+
+
+class Polygon:
+    # Closed polygon, inside by even-odd rule
+    def __init__(self, points):
+        self.points = [(float(x), float(y)) for x, y in points]
+        if len(self.points) > 1 and self.points[0] == self.points[-1]:
+            self.points.pop()
+        n = len(self.points)
+        self.edges = [self.points[k] + self.points[(k + 1) % n] for k in range(n)]
+        xs = [p[0] for p in self.points]
+        ys = [p[1] for p in self.points]
+        self.bounds = (min(xs), min(ys), max(xs), max(ys))
+
+    def crossings(self, y):
+        # Sorted x where the horizontal line at y crosses the outline
+        return sorted(x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+                      for x0, y0, x1, y1 in self.edges if (y0 <= y) != (y1 <= y))
+
+    def contains(self, x, y):
+        return bisect.bisect_right(self.crossings(y), x) % 2 == 1
+
+    def crosses(self, points):
+        # True if the polyline [x, y, x, y, ...] properly crosses an edge
+        for k in range(0, len(points) - 2, 2):
+            ax, ay, bx, by = points[k:k + 4]
+            lox, hix = min(ax, bx), max(ax, bx)
+            loy, hiy = min(ay, by), max(ay, by)
+            for x0, y0, x1, y1 in self.edges:
+                if max(x0, x1) < lox or min(x0, x1) > hix or max(y0, y1) < loy or min(y0, y1) > hiy:
+                    continue
+                if segments_cross(ax, ay, bx, by, x0, y0, x1, y1):
+                    return True
+        return False
+
+    def leaves(self, points):
+        # True if some part of the polyline lies outside
+        if any(not self.contains(points[k], points[k + 1]) for k in range(0, len(points), 2)):
+            return True
+        return self.crosses(points)
+
+    def touches(self, points):
+        # True if some part of the polyline lies inside
+        if any(self.contains(points[k], points[k + 1]) for k in range(0, len(points), 2)):
+            return True
+        return self.crosses(points)
+
+
+def segments_cross(ax, ay, bx, by, cx, cy, dx, dy):
+    # Proper crossing only: running along or touching an edge is fine
+    d1 = (dx - cx) * (ay - cy) - (dy - cy) * (ax - cx)
+    d2 = (dx - cx) * (by - cy) - (dy - cy) * (bx - cx)
+    d3 = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+    d4 = (bx - ax) * (dy - ay) - (by - ay) * (dx - ax)
+    return ((d1 > 0) != (d2 > 0)) and ((d3 > 0) != (d4 > 0)) and d1 and d2 and d3 and d4
+
+
+def segment_polyline(tp, i, t0=0.0, t1=1.0):
+    # XY points of segment i between fractions t0 and t1; arcs (never rapids)
+    # are always whole, as chords
+    x0, y0, x1, y1 = tp.x0[i], tp.y0[i], tp.x1[i], tp.y1[i]
+    if tp.motion[i] >= MOVE_CW:
+        cx, cy, r = tp.cx[i], tp.cy[i], tp.radius[i]
+        clockwise = tp.motion[i] == MOVE_CW
+        steps = chord_steps(r, arc_sweep(x0, y0, x1, y1, cx, cy, clockwise), ARC_TOLERANCE)
+        return arc_points(x0, y0, x1, y1, cx, cy, r, clockwise, steps)
+    dx = x1 - x0
+    dy = y1 - y0
+    return [x0 + dx * t0, y0 + dy * t0, x0 + dx * t1, y0 + dy * t1]
+
+
+def boundary_cells(grid, polygon):
+    # Grid cells any polygon edge passes through (plus their neighbors, which
+    # keeps the sampling below conservative)
+    size = grid.cell_size
+    touched = set()
+    for x0, y0, x1, y1 in polygon.edges:
+        steps = int(math.hypot(x1 - x0, y1 - y0) / (size / 2)) + 1
+        for k in range(steps + 1):
+            ix = math.floor((x0 + (x1 - x0) * k / steps) / size)
+            iy = math.floor((y0 + (y1 - y0) * k / steps) / size)
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    touched.add((ix + dx, iy + dy))
+    return touched
+
+
+def cuts_outside(toolpath, boundary):
+    # Feed moves leaving the boundary polygon, found through the spatial index
+    tp = toolpath
+    grid = tp.index if tp.index is not None else SegmentGrid.build(tp)
+    size = grid.cell_size
+    edge_cells = boundary_cells(grid, boundary)
+    candidates = set(grid.big)
+    rows = {}
+    for (ix, iy), ids in grid.cells.items():
+        if (ix, iy) in edge_cells:
+            candidates.update(ids)
+            continue
+        xs = rows.get(iy)
+        if xs is None:
+            xs = rows[iy] = boundary.crossings((iy + 0.5) * size)
+        if bisect.bisect_right(xs, (ix + 0.5) * size) % 2 == 0:  # cell center outside
+            candidates.update(ids)
+    motion = tp.motion
+    return sorted(i for i in candidates if motion[i] and boundary.leaves(segment_polyline(tp, i)))
+
+
+def rapids_through_stock(toolpath, stock=None, stock_top=0.0):
+    # G0 moves dipping below stock_top within the stock outline
+    tp = toolpath
+    found = []
+    # Rapids are MOVE_RAPID == 0: compress() picks them out without a Python loop
+    for i in itertools.compress(range(len(tp)), map(operator.not_, tp.motion)):
+        z0, z1 = tp.z0[i], tp.z1[i]
+        if z0 >= stock_top and z1 >= stock_top:
+            continue
+        if z1 >= z0 and tp.x0[i] == tp.x1[i] and tp.y0[i] == tp.y1[i]:
+            continue  # straight up out of a cut
+        if stock is None:
+            found.append(i)
+            continue
+        # Fractions of the move spent below the stock top
+        t0 = 0.0 if z0 < stock_top else (z0 - stock_top) / (z0 - z1)
+        t1 = 1.0 if z1 < stock_top else (z0 - stock_top) / (z0 - z1)
+        if stock.touches(segment_polyline(tp, i, t0, t1)):
+            found.append(i)
+    return found
+
+
+def check_toolpath(toolpath, boundary=None, stock=None, stock_top=0.0):
+    # Issues sorted by line. stock defaults to the boundary polygon.
+    if stock is None:
+        stock = boundary
+    issues = [Issue(RAPID_THROUGH_STOCK, i, toolpath.line_no[i])
+              for i in rapids_through_stock(toolpath, stock, stock_top)]
+    if boundary is not None and len(toolpath):
+        issues += [Issue(CUT_OUTSIDE_BOUNDARY, i, toolpath.line_no[i]) for i in cuts_outside(toolpath, boundary)]
+    issues.sort(key=lambda issue: (issue.line_no, issue.segment))
+    return issues
+
+
+def load_polygon(path):
+    # "x y" / "x,y" per line, or a G-code contour whose moves trace the outline
+    with open(path) as f:
+        text = f.read()
+    if path.lower().endswith((".nc", ".gcode")):
+        tp = parse_gcode(text.split("\n"))
+        points = []
+        for i in range(len(tp)):
+            if tp.motion[i]:
+                xy = segment_polyline(tp, i)
+                points += zip(xy[0::2], xy[1::2])
+        return Polygon(points)
+    points = []
+    for line in text.splitlines():
+        fields = line.replace(",", " ").split()
+        if len(fields) >= 2 and not line.lstrip().startswith("#"):
+            points.append((float(fields[0]), float(fields[1])))
+    return Polygon(points)
@@ -0,0 +1,152 @@
+import array
+import bisect
+from collections import Counter, defaultdict
+
+# Move-level diff of two parsed programs. Every move is reduced to a
+# normalized key (motion, end point, arc center, rounded to DIFF_RESOLUTION)
+# and interned to an int, so comparing moves is comparing ints and the
+# formatting of the source (N words, whitespace, decimals, comments) doesn't
+# matter. The start point is left out: it is the previous move's end, so an
+# inserted move doesn't also mark the move after it as changed.
+#
+# Alignment is a patience/histogram diff: trim the common head and tail,
+# anchor on keys that occur equally rarely on both sides, keep the longest
+# increasing run of anchors and recurse between them. That is O(n log n)
+# instead of the O(n * m) of a text diff, so million-move programs are fine.
+#
+# Unmatched moves whose key exists on the other side too are reported as
+# MOVED rather than REMOVED/ADDED.
+
+SAME = 0
+ADDED = 1
+REMOVED = 2
+MOVED = 3
+
+DIFF_RESOLUTION = 1e-3  # mm
+
+
+def move_keys(toolpath, table, resolution=DIFF_RESOLUTION):
+    # Interned key of every move; table maps normalized moves to ints and is
+    # shared between the two programs being compared.
+    q = 1 / resolution
+    keys = array.array("q")
+    append = keys.append
+    setdefault = table.setdefault
+    tp = toolpath
+    for m, x, y, z, cx, cy in zip(tp.motion, tp.x1, tp.y1, tp.z1, tp.cx, tp.cy):
+        key = (m, round(x * q), round(y * q), round(z * q), round(cx * q), round(cy * q))
+        append(setdefault(key, len(table)))
+    return keys
+
+
+def longest_increasing(pairs):
+    # Longest subsequence of (i, j) pairs (sorted by i) with increasing j
+    tails = []  # j of the last pair of the best run of each length
+    tail_ids = []
+    back = []
+    for k, (_, j) in enumerate(pairs):
+        n = bisect.bisect_left(tails, j)
+        back.append(tail_ids[n - 1] if n else -1)
+        if n == len(tails):
+            tails.append(j)
+            tail_ids.append(k)
+        else:
+            tails[n] = j
+            tail_ids[n] = k
+    run = []
+    k = tail_ids[-1] if tail_ids else -1
+    while k >= 0:
+        run.append(pairs[k])
+        k = back[k]
+    run.reverse()
+    return run
+
+
+def anchors(a, a0, a1, b, b0, b1):
+    # Pairs of the rarest keys occurring equally often in a[a0:a1] and
+    # b[b0:b1] (unique ones if there are any), k-th occurrence with k-th,
+    # reduced to an increasing run
+    count_a = Counter(a[a0:a1])
+    count_b = Counter(b[b0:b1])
+    common = [key for key, n in count_a.items() if count_b.get(key) == n]
+    if not common:
+        return []
+    rarest = min(count_a[key] for key in common)
+    wanted = {key for key in common if count_a[key] == rarest}
+    positions = defaultdict(list)
+    for j in range(b0, b1):
+        if b[j] in wanted:
+            positions[b[j]].append(j)
+    seen = Counter()
+    pairs = []
+    for i in range(a0, a1):
+        key = a[i]
+        if key in wanted:
+            pairs.append((i, positions[key][seen[key]]))
+            seen[key] += 1
+    return longest_increasing(pairs)
+
+
+def match_moves(a, b):
+    # (i, j) pairs of equal keys aligning a with b, in no particular order
+    pairs = []
+    regions = [(0, len(a), 0, len(b))]
+    while regions:
+        a0, a1, b0, b1 = regions.pop()
+        while a0 < a1 and b0 < b1 and a[a0] == b[b0]:
+            pairs.append((a0, b0))
+            a0 += 1
+            b0 += 1
+        while a0 < a1 and b0 < b1 and a[a1 - 1] == b[b1 - 1]:
+            a1 -= 1
+            b1 -= 1
+            pairs.append((a1, b1))
+        if a0 == a1 or b0 == b1:
+            continue
+        i0, j0 = a0, b0
+        for i, j in anchors(a, a0, a1, b, b0, b1):
+            pairs.append((i, j))
+            regions.append((i0, i, j0, j))
+            i0, j0 = i + 1, j + 1
+        if i0 != a0:
+            regions.append((i0, a1, j0, b1))
+        # else: nothing in this region lines up, it stays unmatched
+    return pairs
+
+
+def diff_toolpaths(old, new, resolution=DIFF_RESOLUTION):
+    # (status of every old move, status of every new move); old moves are
+    # SAME/REMOVED/MOVED, new ones SAME/ADDED/MOVED.
+    table = {}
+    a = move_keys(old, table, resolution)
+    b = move_keys(new, table, resolution)
+    status_a = array.array("b", [REMOVED]) * len(a)
+    status_b = array.array("b", [ADDED]) * len(b)
+    for i, j in match_moves(a, b):
+        status_a[i] = SAME
+        status_b[j] = SAME
+
+    removed = defaultdict(list)
+    for i in range(len(a) - 1, -1, -1):
+        if status_a[i] == REMOVED:
+            removed[a[i]].append(i)
+    for j in range(len(b)):
+        if status_b[j] == ADDED and removed.get(b[j]):
+            status_b[j] = MOVED
+            status_a[removed[b[j]].pop()] = MOVED
+    return status_a, status_b
+
+
+def changed_runs(status):
+    # (start, end, status) of every run of changed moves
+    runs = []
+    start = None
+    for i, s in enumerate(status):
+        if start is not None and s != status[start]:
+            runs.append((start, i, status[start]))
+            start = None
+        if start is None and s != SAME:
+            start = i
+    if start is not None:
+        runs.append((start, len(status), status[start]))
+    return runs
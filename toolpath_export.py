@@ -0,0 +1,190 @@
+import math
+import zlib
+
+from PIL import ImageColor
+
+from toolpath import MOVE_CW, arc_angles
+
+# Vector export straight from a Toolpath. Both writers walk the segments once
+# and write as they go, so memory use doesn't grow with the program. Arcs stay
+# arcs: SVG "A" commands, and in PDF (which has no arc operator) at most four
+# Bezier curves per arc.
+#
+# style(motion, z) -> (color, width); widths are in pixels/points of the page.
+
+PAGE_SIZE = 842.0  # points, the long side of the PDF page (A4)
+PAGE_MARGIN = 20.0
+SVG_SIZE = 1000.0  # pixels, the long side of the SVG viewport
+PATH_COMMANDS = 2000  # segments per SVG <path>/PDF stroke before starting a new one
+
+
+def page_transform(toolpath, size, margin):
+    # (scale, xmin, ymin, width, height) fitting the program into size x size
+    bounds = toolpath.bounds() or (0.0, 0.0, 1.0, 1.0)
+    xmin, ymin, xmax, ymax = bounds
+    w = max(xmax - xmin, 1e-6)
+    h = max(ymax - ymin, 1e-6)
+    scale = (size - 2 * margin) / max(w, h)
+    return scale, xmin, ymin, w * scale + 2 * margin, h * scale + 2 * margin
+
+
+def strokes(toolpath, style):
+    # Yields (i, (color, width), new) for every segment; new is True when
+    # segment i can't continue the previous stroke (style change, gap, or
+    # PATH_COMMANDS reached).
+    current = None
+    end = None
+    count = 0
+    x0s, y0s, x1s, y1s = toolpath.x0, toolpath.y0, toolpath.x1, toolpath.y1
+    for i in range(len(toolpath)):
+        st = style(toolpath.motion[i], toolpath.z1[i])
+        new = st != current or end != (x0s[i], y0s[i]) or count >= PATH_COMMANDS
+        if new:
+            current = st
+            count = 0
+        count += 1
+        end = (x1s[i], y1s[i])
+        yield i, st, new
+
+
+def fmt(v):
+    return f"{v:.4f}".rstrip("0").rstrip(".")
+
+
+def write_svg(toolpath, path, style, background=None):
+    scale, xmin, ymin, width, height = page_transform(toolpath, SVG_SIZE, 0)
+    # World coordinates in the file, Y flipped by the viewBox/transform
+    pad = 10 / scale
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{fmt(width + 20)}" height="{fmt(height + 20)}" '
+                f'viewBox="{fmt(xmin - pad)} {fmt(-ymin - height / scale - pad)} '
+                f'{fmt(width / scale + 2 * pad)} {fmt(height / scale + 2 * pad)}">\n')
+        if background:
+            f.write(f'<rect x="{fmt(xmin - pad)}" y="{fmt(-ymin - height / scale - pad)}" width="100%" '
+                    f'height="100%" fill="{background}"/>\n')
+        f.write('<g transform="scale(1,-1)" fill="none" stroke-linecap="round" stroke-linejoin="round">\n')
+        tp = toolpath
+        open_path = False
+        for i, (color, width), new in strokes(tp, style):
+            if new:
+                if open_path:
+                    f.write('"/>\n')
+                f.write(f'<path stroke="{color}" stroke-width="{fmt(width / scale)}" '
+                        f'd="M{fmt(tp.x0[i])} {fmt(tp.y0[i])}')
+                open_path = True
+            if tp.motion[i] >= MOVE_CW:
+                f.write(svg_arc(tp, i))
+            else:
+                f.write(f" L{fmt(tp.x1[i])} {fmt(tp.y1[i])}")
+        if open_path:
+            f.write('"/>\n')
+        f.write("</g>\n</svg>\n")
+
+
+def svg_arc(tp, i):
+    # The Y flip is applied by the group transform, so these are world-space
+    # arcs: counter-clockwise means sweep-flag 1.
+    x0, y0, x1, y1 = tp.x0[i], tp.y0[i], tp.x1[i], tp.y1[i]
+    cx, cy, r = tp.cx[i], tp.cy[i], tp.radius[i]
+    clockwise = tp.motion[i] == MOVE_CW
+    start, end = arc_angles(x0, y0, x1, y1, cx, cy, clockwise)
+    sweep_flag = 0 if clockwise else 1
+    radius = fmt(r)
+    if abs(end - start) > math.pi:
+        # Split through the midpoint: avoids the ambiguous full-circle case
+        mid = (start + end) / 2
+        mx = cx + r * math.cos(mid)
+        my = cy + r * math.sin(mid)
+        return (f" A{radius} {radius} 0 0 {sweep_flag} {fmt(mx)} {fmt(my)}"
+                f" A{radius} {radius} 0 0 {sweep_flag} {fmt(x1)} {fmt(y1)}")
+    return f" A{radius} {radius} 0 0 {sweep_flag} {fmt(x1)} {fmt(y1)}"
+
+
+def write_pdf(toolpath, path, style, background=None):
+    scale, xmin, ymin, width, height = page_transform(toolpath, PAGE_SIZE, PAGE_MARGIN)
+    tp = toolpath
+    offsets = []
+    with open(path, "wb") as f:
+        def begin_object():
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % len(offsets))
+
+        f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        begin_object()
+        f.write(b"<< /Type /Catalog /Pages 2 0 R >>\nendobj\n")
+        begin_object()
+        f.write(b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>\nendobj\n")
+        begin_object()
+        f.write(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %s %s] /Contents 4 0 R >>\nendobj\n"
+                % (fmt(width).encode(), fmt(height).encode()))
+
+        # Content stream, compressed as it is written. Its length goes into
+        # object 5, written afterwards.
+        begin_object()
+        f.write(b"<< /Length 5 0 R /Filter /FlateDecode >>\nstream\n")
+        start = f.tell()
+        compressor = zlib.compressobj()
+        buffer = []
+
+        def emit(text):
+            buffer.append(text)
+            if len(buffer) >= 4096:
+                f.write(compressor.compress("".join(buffer).encode()))
+                buffer.clear()
+
+        if background:
+            emit(f"{pdf_color(background, 'rg')} 0 0 {fmt(width)} {fmt(height)} re f\n")
+        # World -> page: scale, then shift the bounding box to the margin
+        emit(f"1 J 1 j {fmt(scale)} 0 0 {fmt(scale)} {fmt(PAGE_MARGIN - xmin * scale)} "
+             f"{fmt(PAGE_MARGIN - ymin * scale)} cm\n")
+        stroking = False
+        for i, (color, line_width), new in strokes(tp, style):
+            if new:
+                if stroking:
+                    emit("S\n")
+                emit(f"{pdf_color(color, 'RG')} {fmt(line_width / scale)} w {fmt(tp.x0[i])} {fmt(tp.y0[i])} m\n")
+                stroking = True
+            if tp.motion[i] >= MOVE_CW:
+                emit(pdf_arc(tp, i))
+            else:
+                emit(f"{fmt(tp.x1[i])} {fmt(tp.y1[i])} l\n")
+        if stroking:
+            emit("S\n")
+        f.write(compressor.compress("".join(buffer).encode()))
+        f.write(compressor.flush())
+        length = f.tell() - start
+        f.write(b"\nendstream\nendobj\n")
+        begin_object()
+        f.write(b"%d\nendobj\n" % length)
+
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets) + 1, xref))
+
+
+def pdf_color(color, op):
+    r, g, b = ImageColor.getrgb(color)[:3]
+    return f"{fmt(r / 255)} {fmt(g / 255)} {fmt(b / 255)} {op}"
+
+
+def pdf_arc(tp, i):
+    # Cubic Bezier pieces of at most 90 degrees each
+    x0, y0, x1, y1 = tp.x0[i], tp.y0[i], tp.x1[i], tp.y1[i]
+    cx, cy, r = tp.cx[i], tp.cy[i], tp.radius[i]
+    start, end = arc_angles(x0, y0, x1, y1, cx, cy, tp.motion[i] == MOVE_CW)
+    pieces = max(1, int(math.ceil(abs(end - start) / (math.pi / 2) - 1e-9)))
+    step = (end - start) / pieces
+    k = 4 / 3 * math.tan(step / 4) * r
+    out = []
+    a = start
+    for n in range(pieces):
+        b = a + step
+        ca, sa, cb, sb = math.cos(a), math.sin(a), math.cos(b), math.sin(b)
+        px, py = (x1, y1) if n == pieces - 1 else (cx + r * cb, cy + r * sb)
+        out.append(f"{fmt(cx + r * ca - k * sa)} {fmt(cy + r * sa + k * ca)} "
+                   f"{fmt(cx + r * cb + k * sb)} {fmt(cy + r * sb - k * cb)} {fmt(px)} {fmt(py)} c\n")
+        a = b
+    return "".join(out)
@@ -0,0 +1,161 @@
+import array
+import math
+
+from toolpath import MOVE_LINE, MOVE_CW, arc_angles
+
+TARGET_PER_CELL = 4
+MAX_CELLS_PER_SEGMENT = 64  # longer segments go to the "big" list instead
+
+
+class SegmentGrid:
+    # Uniform hash grid over segment bounding boxes. Cells map to arrays of
+    # segment ids, so chunks parsed elsewhere can be merged cheaply with
+    # merge() as long as they were built with the same cell size.
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.big = array.array("i")
+
+    @classmethod
+    def build(cls, toolpath):
+        grid = cls(choose_cell_size(toolpath))
+        grid.insert_range(toolpath, 0, len(toolpath))
+        return grid
+
+    def insert_range(self, toolpath, start, end, base=0):
+        # Segments start..end of toolpath are stored as ids base+start..base+end
+        inv = 1.0 / self.cell_size
+        cells = self.cells
+        floor = math.floor
+        xmin, ymin, xmax, ymax = toolpath.xmin, toolpath.ymin, toolpath.xmax, toolpath.ymax
+        for i in range(start, end):
+            ix0 = floor(xmin[i] * inv)
+            iy0 = floor(ymin[i] * inv)
+            ix1 = floor(xmax[i] * inv)
+            iy1 = floor(ymax[i] * inv)
+            if (ix1 - ix0 + 1) * (iy1 - iy0 + 1) > MAX_CELLS_PER_SEGMENT:
+                self.big.append(base + i)
+                continue
+            for ix in range(ix0, ix1 + 1):
+                for iy in range(iy0, iy1 + 1):
+                    ids = cells.get((ix, iy))
+                    if ids is None:
+                        cells[(ix, iy)] = array.array("i", (base + i,))
+                    else:
+                        ids.append(base + i)
+
+    def remove_range(self, toolpath, start, end):
+        # Undoes insert_range(toolpath, start, end) while the boxes are unchanged
+        inv = 1.0 / self.cell_size
+        cells = self.cells
+        floor = math.floor
+        xmin, ymin, xmax, ymax = toolpath.xmin, toolpath.ymin, toolpath.xmax, toolpath.ymax
+        big = False
+        for i in range(start, end):
+            ix0 = floor(xmin[i] * inv)
+            iy0 = floor(ymin[i] * inv)
+            ix1 = floor(xmax[i] * inv)
+            iy1 = floor(ymax[i] * inv)
+            if (ix1 - ix0 + 1) * (iy1 - iy0 + 1) > MAX_CELLS_PER_SEGMENT:
+                big = True
+                continue
+            for ix in range(ix0, ix1 + 1):
+                for iy in range(iy0, iy1 + 1):
+                    ids = cells[(ix, iy)]
+                    ids.remove(i)
+                    if not ids:
+                        del cells[(ix, iy)]
+        if big:
+            # One pass over the big list rather than a remove() per segment
+            self.big = array.array("i", [i for i in self.big if not start <= i < end])
+
+    def shift(self, start, delta):
+        # Renumbers ids >= start after segments were inserted or removed before them
+        if not delta:
+            return
+        for key, ids in self.cells.items():
+            if max(ids) >= start:
+                self.cells[key] = array.array("i", [i + delta if i >= start else i for i in ids])
+        self.big = array.array("i", [i + delta if i >= start else i for i in self.big])
+
+    def merge(self, other):
+        if other.cell_size != self.cell_size:
+            raise ValueError(f"can't merge grids of cell size {other.cell_size} into {self.cell_size}")
+        cells = self.cells
+        for key, ids in other.cells.items():
+            mine = cells.get(key)
+            if mine is None:
+                cells[key] = ids
+            else:
+                mine.extend(ids)
+        self.big.extend(other.big)
+
+    def candidates(self, xmin, ymin, xmax, ymax):
+        inv = 1.0 / self.cell_size
+        ix0 = math.floor(xmin * inv)
+        iy0 = math.floor(ymin * inv)
+        ix1 = math.floor(xmax * inv)
+        iy1 = math.floor(ymax * inv)
+        found = set(self.big)
+        if (ix1 - ix0 + 1) * (iy1 - iy0 + 1) > len(self.cells):
+            for (ix, iy), ids in self.cells.items():
+                if ix0 <= ix <= ix1 and iy0 <= iy <= iy1:
+                    found.update(ids)
+        else:
+            cells = self.cells
+            for ix in range(ix0, ix1 + 1):
+                for iy in range(iy0, iy1 + 1):
+                    ids = cells.get((ix, iy))
+                    if ids is not None:
+                        found.update(ids)
+        return found
+
+    def query(self, toolpath, xmin, ymin, xmax, ymax):
+        # Sorted ids (program order) of segments whose box overlaps the rectangle
+        sxmin, symin, sxmax, symax = toolpath.xmin, toolpath.ymin, toolpath.xmax, toolpath.ymax
+        return sorted(i for i in self.candidates(xmin, ymin, xmax, ymax)
+                      if sxmin[i] <= xmax and sxmax[i] >= xmin and symin[i] <= ymax and symax[i] >= ymin)
+
+    def nearest(self, toolpath, x, y, max_dist):
+        # (segment id, distance) of the closest segment within max_dist, or None
+        best = None
+        best_dist = max_dist
+        for i in self.candidates(x - max_dist, y - max_dist, x + max_dist, y + max_dist):
+            if (toolpath.xmin[i] - best_dist > x or toolpath.xmax[i] + best_dist < x or
+                    toolpath.ymin[i] - best_dist > y or toolpath.ymax[i] + best_dist < y):
+                continue
+            dist = segment_distance(toolpath, i, x, y)
+            if dist <= best_dist and (best is None or dist < best_dist or i < best):
+                best, best_dist = i, dist
+        return None if best is None else (best, best_dist)
+
+
+def choose_cell_size(toolpath):
+    n = len(toolpath)
+    if not n:
+        return 1.0
+    width = max(toolpath.xmax) - min(toolpath.xmin)
+    height = max(toolpath.ymax) - min(toolpath.ymin)
+    extent = max(width, height, 1e-6)
+    area = max(width, extent / 4096) * max(height, extent / 4096)
+    return max(math.sqrt(area * TARGET_PER_CELL / n), extent / 4096)
+
+
+def segment_distance(toolpath, i, x, y):
+    x0, y0, x1, y1 = toolpath.x0[i], toolpath.y0[i], toolpath.x1[i], toolpath.y1[i]
+    motion = toolpath.motion[i]
+    if motion <= MOVE_LINE:
+        dx = x1 - x0
+        dy = y1 - y0
+        length2 = dx * dx + dy * dy
+        t = 0.0 if length2 == 0 else max(0.0, min(1.0, ((x - x0) * dx + (y - y0) * dy) / length2))
+        return math.hypot(x - (x0 + t * dx), y - (y0 + t * dy))
+
+    cx, cy, radius = toolpath.cx[i], toolpath.cy[i], toolpath.radius[i]
+    start_angle, end_angle = arc_angles(x0, y0, x1, y1, cx, cy, motion == MOVE_CW)
+    lo, hi = min(start_angle, end_angle), max(start_angle, end_angle)
+    angle = math.atan2(y - cy, x - cx)
+    angle += 2 * math.pi * math.ceil((lo - angle) / (2 * math.pi))
+    if angle <= hi:
+        return abs(math.hypot(x - cx, y - cy) - radius)
+    return min(math.hypot(x - x0, y - y0), math.hypot(x - x1, y - y1))
@@ -0,0 +1,120 @@
+import array
+import mmap
+import tkinter as tk
+import tkinter.font as tkfont
+
+WHEEL_ROWS = 3  # rows scrolled per mouse wheel notch
+
+
+class LineSource:
+    # Random access to the lines of a program without reading it into
+    # memory: the file is mmapped and offsets[k] is the byte offset of line
+    # k (Toolpath.line_offsets). offsets may keep growing while the program
+    # is still streaming in; only lines it covers are visible.
+    def __init__(self, path, offsets=None):
+        self.path = path
+        self.offsets = offsets if offsets is not None else array.array("q")
+        with open(path, "rb") as f:
+            try:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                self.data = b""
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def line(self, k):
+        start = self.offsets[k]
+        end = self.offsets[k + 1] if k + 1 < len(self.offsets) else len(self.data)
+        return self.data[start:end].rstrip(b"\r\n").decode("utf-8", "replace")
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data = b""
+
+
+class VirtualLineView(tk.Frame):
+    # Read-only scrolling list that only materializes the rows on screen.
+    # The Text widget holds just the visible window of rows, re-filled from
+    # row_text(k) on scroll/resize, and the scrollbar is driven by hand from
+    # the row count, so a million-line program costs as much as fifty lines.
+    #
+    # command(k) is called when row k is clicked.
+    def __init__(self, master, row_text, count=0, command=None, **options):
+        super().__init__(master)
+        self.row_text = row_text
+        self.count = count
+        self.command = command
+        self.top = 0
+        self.selected = None
+        self.text = tk.Text(self, wrap=tk.NONE, cursor="arrow", **options)
+        self.font = tkfont.Font(font=self.text["font"])
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.text.tag_config("selected", background="yellow")
+        self.text.config(state=tk.DISABLED)
+        self.text.bind("<Configure>", lambda event: self.refresh())
+        self.text.bind("<MouseWheel>", lambda event: self.yview("scroll", -WHEEL_ROWS if event.delta > 0 else WHEEL_ROWS, "units"))
+        self.text.bind("<Button-4>", lambda event: self.yview("scroll", -WHEEL_ROWS, "units"))
+        self.text.bind("<Button-5>", lambda event: self.yview("scroll", WHEEL_ROWS, "units"))
+        self.text.bind("<ButtonRelease-1>", self.on_click)
+
+    def visible_rows(self):
+        return max(1, self.text.winfo_height() // max(1, self.font.metrics("linespace")))
+
+    def reset(self, count=0):
+        self.top = 0
+        self.selected = None
+        self.set_count(count)
+
+    def set_count(self, count):
+        self.count = count
+        self.refresh()
+
+    def refresh(self):
+        rows = self.visible_rows()
+        self.top = max(0, min(self.top, self.count - rows))
+        end = min(self.count, self.top + rows)
+        self.text.config(state=tk.NORMAL)
+        self.text.delete("1.0", tk.END)
+        self.text.insert("1.0", "\n".join(self.row_text(k) for k in range(self.top, end)))
+        if self.selected is not None and self.top <= self.selected < end:
+            row = self.selected - self.top + 1
+            self.text.tag_add("selected", f"{row}.0", f"{row}.end")
+        self.text.config(state=tk.DISABLED)
+        if self.count:
+            self.scrollbar.set(self.top / self.count, end / self.count)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def yview(self, *args):
+        # Scrollbar protocol: ("moveto", fraction) or ("scroll", n, "units"/"pages")
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * self.count)
+        elif args[0] == "scroll":
+            n = int(args[1])
+            self.top += n * self.visible_rows() if args[2] == "pages" else n
+        self.refresh()
+
+    def see(self, k):
+        rows = self.visible_rows()
+        if not self.top <= k < self.top + rows:
+            self.top = k - rows // 2
+        self.refresh()
+
+    def select(self, k):
+        # Highlights row k (None clears) and scrolls it into view
+        self.selected = k
+        if k is None:
+            self.refresh()
+        else:
+            self.see(k)
+
+    def on_click(self, event):
+        k = self.top + int(self.text.index(f"@{event.x},{event.y}").split(".")[0]) - 1
+        if k < self.count:
+            self.select(k)
+            if self.command:
+                self.command(k)
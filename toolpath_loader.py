@@ -0,0 +1,184 @@
+import array
+import itertools
+import os
+import queue
+import threading
+import time
+
+from toolpath import GCodeParser, Toolpath, parse_gcode
+from toolpath_cache import CacheWriter, load_cache, new_hash
+from toolpath_index import SegmentGrid, choose_cell_size
+from toolpath_lod import LodPyramid, choose_base_cell
+
+CHUNK_SIZE = 4 * 1024 * 1024
+POLL_MS = 50
+POLL_BUDGET = 0.03  # seconds of UI time spent merging chunks per poll
+
+
+class ToolpathLoader:
+    # Reads a program in fixed-size chunks on a worker thread and parses it
+    # incrementally. Each parsed chunk is handed to the UI thread through a
+    # bounded queue, so memory stays flat no matter how large the file is.
+    #
+    # If the program has a valid sidecar cache (toolpath_cache), the worker
+    # first sends the whole toolpath in a ("cached", toolpath) message and
+    # then only streams the text: chunk messages carry None instead of a
+    # toolpath. The cache is checked on the worker too, since a changed mtime
+    # means hashing the whole file. Without a cache, call save_cache() with
+    # the merged toolpath once loading is done.
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.stat = os.stat(path)
+        self.size = self.stat.st_size
+        self.cached = None
+        self.digest = None
+        self.offset = 0
+        self.queue = queue.Queue(maxsize=8)
+        self.cancelled = threading.Event()
+        self.cell_size = None
+        self.lod_cell = None
+        self.parsed = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def put(self, message):
+        while not self.cancelled.is_set():
+            try:
+                self.queue.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def save_cache(self, toolpath):
+        if self.cached is None and self.digest is not None:
+            CacheWriter(self.path, toolpath, self.digest, self.stat).start()
+
+    def run(self):
+        # Any error ends the load with a ("done", error) message: were the
+        # thread to die on it, the UI would poll the queue forever
+        try:
+            self.load()
+        except Exception as e:
+            self.put(("done", e))
+
+    def load(self):
+        self.cached = load_cache(self.path)
+        if self.cached is not None and not self.put(("cached", self.cached)):
+            return
+        parser = GCodeParser()
+        digest = new_hash()
+        pending = b""
+        done = 0
+        with open(self.path, "rb") as f:
+            while not self.cancelled.is_set():
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                done += len(chunk)
+                chunk = pending + chunk
+                cut = chunk.rfind(b"\n") + 1
+                pending = chunk[cut:]
+                if cut and not self.parse_chunk(parser, chunk[:cut], done):
+                    return
+            if pending and not self.cancelled.is_set():
+                self.parse_chunk(parser, pending, done)
+        if not self.cancelled.is_set():
+            self.digest = digest.hexdigest()
+        self.put(("done", None))
+
+    def parse_chunk(self, parser, data, done):
+        text = data.decode("utf-8", "replace")
+        if self.cached is not None:
+            return self.put(("chunk", None, text, done))
+        parser.toolpath = Toolpath()
+        lines = text.split("\n")
+        if not lines[-1]:
+            lines.pop()
+        chunk = parser.feed(lines)
+
+        # Byte offset of every line, for the cache and the line views
+        lengths = [len(line) + 1 for line in data.split(b"\n")[:len(lines) - 1]]
+        chunk.line_offsets = array.array("q", itertools.accumulate(lengths, initial=self.offset))
+        self.offset += len(data)
+
+        # The spatial index and LOD pyramid are built here too, with ids
+        # already offset to their final position, so the UI thread only
+        # merges arrays. Grid sizes are fixed by the first chunk with segments.
+        # Chunks without segments (a header of comments) get neither, or the
+        # first one would fix made-up sizes.
+        if len(chunk):
+            if self.cell_size is None:
+                self.cell_size = choose_cell_size(chunk)
+                self.lod_cell = choose_base_cell(chunk)
+            chunk.index = SegmentGrid(self.cell_size)
+            chunk.index.insert_range(chunk, 0, len(chunk), base=self.parsed)
+            chunk.lod = LodPyramid(self.lod_cell)
+            chunk.lod.add_range(chunk, 0, len(chunk))
+        self.parsed += len(chunk)
+        return self.put(("chunk", chunk, text, done))
+
+
+def load_program(path):
+    # Whole program at once, for tools without a UI: from the sidecar cache
+    # if it is valid, else parsed in one go (no index/LOD)
+    toolpath = load_cache(path)
+    if toolpath is None:
+        with open(path, "rb") as f:
+            toolpath = parse_gcode(f.read().decode("utf-8", "replace").split("\n"))
+    return toolpath
+
+
+class LodBuilder:
+    # Rebuilds the LOD pyramid of a toolpath on a worker thread once edits
+    # left the spliced one approximate (see LodPyramid.replace). Works on a
+    # copy, so the UI thread can keep editing; poll done() and install
+    # pyramid if the toolpath version hasn't changed since.
+    def __init__(self, toolpath):
+        self.toolpath = toolpath
+        self.version = toolpath.version
+        self.snapshot = toolpath.copy()
+        self.pyramid = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        self.pyramid = LodPyramid.build(self.snapshot)
+
+    def done(self):
+        return not self.thread.is_alive()
+
+
+def poll_loader(widget, loader, on_chunk, on_done, on_cached):
+    # Drains the loader queue from the Tk main loop via after(). on_cached gets
+    # the toolpath from the cache, before any chunk; on_chunk gets
+    # (toolpath_chunk, text, fraction_done); on_done gets the error or None.
+    # A cancelled loader just stops polling, the caller resets its own state.
+    deadline = time.perf_counter() + POLL_BUDGET
+    while time.perf_counter() < deadline:
+        if loader.cancelled.is_set():
+            return
+        try:
+            message = loader.queue.get_nowait()
+        except queue.Empty:
+            break
+        if message[0] == "done":
+            on_done(message[1])
+            return
+        if message[0] == "cached":
+            on_cached(message[1])
+            continue
+        _, chunk, text, done = message
+        on_chunk(chunk, text, done / loader.size if loader.size else 1.0)
+    widget.after(POLL_MS, poll_loader, widget, loader, on_chunk, on_done, on_cached)
@@ -0,0 +1,347 @@
+import array
+import bisect
+import math
+
+from toolpath import MOVE_LINE, MOVE_CW, arc_points, arc_sweep, chord_steps
+from toolpath_index import SegmentGrid, choose_cell_size
+
+LOD_LEVELS = 12
+LOD_BASE_DIVISIONS = 8192  # finest level cell = program extent / this
+LOD_RUN_POINTS = 256  # coarse runs stop taking in the next run at this length, to stay cullable
+LOD_UNIQUE_POINTS = 256  # coarse runs up to this length are dropped if an earlier one has the same cells
+
+
+class LodLevel:
+    # One simplified copy of the toolpath. Points are snapped to a grid of
+    # `cell` units: consecutive points falling in the same cell are dropped,
+    # and so is a point that just goes back along the edge drawn before it
+    # (zigzags denser than a cell), so the drawing never moves by more than
+    # `error` world units.
+    # Run k is a polyline over points starts[k]:starts[k + 1], drawn with the
+    # style of motion[k] / z[k]; xmin..ymax hold each run's bounding box,
+    # indexed by a SegmentGrid built on the first runs_in(). The run was
+    # built from source units first[k]:last[k] (segments at the base level,
+    # runs of the finer level above it), so edits can rebuild just the runs
+    # they touch; shared[k] is set when a later run was dropped as a repeat
+    # of run k.
+    def __init__(self, cell):
+        self.cell = cell
+        self.inv = 1.0 / cell
+        self.error = cell * math.sqrt(2)
+        self.xs = array.array("d")
+        self.ys = array.array("d")
+        self.starts = array.array("i")
+        self.first = array.array("i")
+        self.last = array.array("i")
+        self.shared = array.array("b")
+        self.motion = array.array("b")
+        self.z = array.array("d")
+        self.xmin = array.array("d")
+        self.ymin = array.array("d")
+        self.xmax = array.array("d")
+        self.ymax = array.array("d")
+        self.index = None
+        self.last_cell = self.before = self.before2 = None  # cells of the run's last three points
+        self.pending = None
+
+    def __len__(self):
+        return len(self.starts)
+
+    def run_points(self, k):
+        start = self.starts[k]
+        end = self.starts[k + 1] if k + 1 < len(self.starts) else len(self.xs)
+        return start, end
+
+    def cell_of(self, x, y):
+        return math.floor(x * self.inv), math.floor(y * self.inv)
+
+    def begin_run(self, first, motion, z, x, y):
+        self.starts.append(len(self.xs))
+        self.first.append(first)
+        self.last.append(first + 1)
+        self.shared.append(0)
+        self.motion.append(motion)
+        self.z.append(z)
+        self.xs.append(x)
+        self.ys.append(y)
+        self.last_cell = self.cell_of(x, y)
+        self.before = self.before2 = None
+        self.pending = None
+
+    def add_point(self, x, y):
+        inv = self.inv
+        key = (math.floor(x * inv), math.floor(y * inv))
+        if key == self.last_cell:
+            self.pending = (x, y)
+            return
+        if key == self.before and self.last_cell == self.before2:
+            # Cells Y X Y X: the last point only retraced the edge before it
+            xs, ys = self.xs, self.ys
+            xs.pop()
+            ys.pop()
+            self.last_cell, self.before = key, self.before2
+            self.before2 = self.cell_of(xs[-3], ys[-3]) if len(xs) - self.starts[-1] >= 3 else None
+            self.pending = (x, y)
+            return
+        self.xs.append(x)
+        self.ys.append(y)
+        self.last_cell, self.before, self.before2 = key, self.last_cell, self.before
+        self.pending = None
+
+    def end_run(self):
+        start = self.starts[-1]
+        if self.pending is not None or len(self.xs) - start < 2:
+            x, y = self.pending or (self.xs[-1], self.ys[-1])
+            self.xs.append(x)
+            self.ys.append(y)
+        self.pending = None
+        xs = self.xs[start:]
+        ys = self.ys[start:]
+        self.xmin.append(min(xs))
+        self.ymin.append(min(ys))
+        self.xmax.append(max(xs))
+        self.ymax.append(max(ys))
+
+    def end_unique_run(self, key, seen):
+        # end_run(), then drops the run again if it is short and an earlier
+        # run of the same style went through the same cells (the same
+        # contour at another depth, say); seen maps those cell sequences to
+        # the run kept for them
+        self.end_run()
+        start = self.starts[-1]
+        if len(self.xs) - start > LOD_UNIQUE_POINTS:
+            return
+        cells = (key,) + tuple(map(self.cell_of, self.xs[start:], self.ys[start:]))
+        kept = seen.get(cells)
+        if kept is None:
+            seen[cells] = len(self.starts) - 1
+            return
+        self.shared[kept] = 1
+        self.starts.pop()
+        del self.xs[start:]
+        del self.ys[start:]
+        for name in ("first", "last", "shared", "motion", "z", "xmin", "ymin", "xmax", "ymax"):
+            getattr(self, name).pop()
+
+    def coarsen(self, lo=0, hi=None):
+        # Next level (twice the cell size) built from this level's points.
+        # Runs inside a single one of its cells are dropped, a run that
+        # starts in the cell where the last one of the same style ended is
+        # appended to it, and repeats of short runs are dropped, so coarse
+        # levels have few runs, not one per move. Only runs lo..hi are used
+        # when rebuilding part of a level.
+        level = LodLevel(self.cell * 2)
+        cell_of = level.cell_of
+        xs, ys = self.xs, self.ys
+        seen = {}
+        key = None
+        for k in range(lo, len(self.starts) if hi is None else hi):
+            if cell_of(self.xmin[k], self.ymin[k]) == cell_of(self.xmax[k], self.ymax[k]):
+                continue
+            a, b = self.run_points(k)
+            run_key = lod_key(self.motion[k], self.z[k])
+            if (run_key != key or cell_of(xs[a], ys[a]) != level.last_cell or
+                    len(level.xs) - level.starts[-1] >= LOD_RUN_POINTS):
+                if key is not None:
+                    level.end_unique_run(key, seen)
+                level.begin_run(k, self.motion[k], self.z[k], xs[a], ys[a])
+                key = run_key
+            for p in range(a + 1, b):
+                level.add_point(xs[p], ys[p])
+            level.last[-1] = k + 1
+        if key is not None:
+            level.end_unique_run(key, seen)
+        return level
+
+    def merge(self, other, first_offset):
+        # Appends other's runs; their source ids are relative to other
+        offset = len(self.xs)
+        count = len(self.starts)
+        self.xs.extend(other.xs)
+        self.ys.extend(other.ys)
+        self.starts.extend(start + offset for start in other.starts)
+        self.first.extend(first + first_offset for first in other.first)
+        self.last.extend(last + first_offset for last in other.last)
+        for name in ("shared", "motion", "z", "xmin", "ymin", "xmax", "ymax"):
+            getattr(self, name).extend(getattr(other, name))
+        if self.index is not None:
+            self.index.insert_range(self, count, len(self.starts))
+
+    def copy_runs(self, ks, first):
+        # New level holding runs ks, moved to the empty source range first:first
+        level = LodLevel(self.cell)
+        for k in ks:
+            a, b = self.run_points(k)
+            level.starts.append(len(level.xs))
+            level.xs.extend(self.xs[a:b])
+            level.ys.extend(self.ys[a:b])
+            level.first.append(first)
+            level.last.append(first)
+            for name in ("shared", "motion", "z", "xmin", "ymin", "xmax", "ymax"):
+                getattr(level, name).append(getattr(self, name)[k])
+        return level
+
+    def joined(self, other):
+        self.merge(other, 0)
+        return self
+
+    def span(self, lo, hi):
+        # (ka, kb, u0, u1): runs ka..kb are all the runs built from any of
+        # the source units lo..hi, and together with those units they cover
+        # units u0..u1. Units between runs were dropped and stay dropped.
+        ka = bisect.bisect_right(self.last, lo)
+        kb = max(bisect.bisect_left(self.first, hi), ka)
+        if ka == kb:
+            return ka, kb, lo, hi
+        return ka, kb, min(self.first[ka], lo), max(self.last[kb - 1], hi)
+
+    def splice(self, ka, kb, part, delta):
+        # Runs ka..kb replaced by part's runs, whose source ids are final
+        # already; source ids of the runs after them move by delta
+        index = self.index
+        if index is not None:
+            index.remove_range(self, ka, kb)
+        p0 = self.starts[ka] if ka < len(self.starts) else len(self.xs)
+        p1 = self.starts[kb] if kb < len(self.starts) else len(self.xs)
+        moved = p0 + len(part.xs) - p1
+        self.xs[p0:p1] = part.xs
+        self.ys[p0:p1] = part.ys
+        starts = [start + p0 for start in part.starts]
+        if moved:
+            self.starts[ka:] = array.array("i", starts + [start + moved for start in self.starts[kb:]])
+        else:
+            self.starts[ka:kb] = array.array("i", starts)
+        for name in ("first", "last"):
+            ids = getattr(self, name)
+            if delta:
+                ids[ka:] = array.array("i", list(getattr(part, name)) + [i + delta for i in ids[kb:]])
+            else:
+                ids[ka:kb] = getattr(part, name)
+        for name in ("shared", "motion", "z", "xmin", "ymin", "xmax", "ymax"):
+            getattr(self, name)[ka:kb] = getattr(part, name)
+        if index is not None:
+            index.shift(kb, len(part) - (kb - ka))
+            index.insert_range(self, ka, ka + len(part))
+
+    def runs_in(self, xmin, ymin, xmax, ymax):
+        # Runs whose box overlaps the rectangle, in program order
+        if self.index is None:
+            self.index = SegmentGrid(choose_cell_size(self))
+            self.index.insert_range(self, 0, len(self.starts))
+        return self.index.query(self, xmin, ymin, xmax, ymax)
+
+
+class LodPyramid:
+    # Levels of increasingly coarse LodLevels (cell doubling each level). The
+    # renderers draw the coarsest level whose error is under one pixel.
+    def __init__(self, base_cell, levels=LOD_LEVELS):
+        self.base_cell = base_cell
+        self.levels = [LodLevel(base_cell * 2 ** k) for k in range(levels)]
+        self.count = 0  # segments covered
+        self.approximate = False  # see replace()
+
+    @classmethod
+    def build(cls, toolpath):
+        pyramid = cls(choose_base_cell(toolpath))
+        pyramid.add_range(toolpath, 0, len(toolpath))
+        return pyramid
+
+    def add_range(self, toolpath, start, end):
+        # Segments start..end, appended after the ones covered so far
+        level = build_base_level(toolpath, start, end, self.base_cell)
+        parts = [level]
+        for _ in range(len(self.levels) - 1):
+            level = level.coarsen()
+            parts.append(level)
+        other = LodPyramid(self.base_cell, 0)
+        other.levels = parts
+        other.count = end - start
+        self.merge(other, -start)
+
+    def merge(self, other, first_offset=0):
+        if other.base_cell != self.base_cell:
+            raise ValueError(f"can't merge LOD pyramids of base cell {other.base_cell} into {self.base_cell}")
+        offsets = [self.count + first_offset] + [len(level) for level in self.levels[:-1]]
+        for mine, part, offset in zip(self.levels, other.levels, offsets):
+            mine.merge(part, offset)
+        self.count += other.count
+
+    def replace(self, toolpath, start, end, after):
+        # Follows Toolpath.replace(): segments start..end became start..after.
+        # Each level only rebuilds the runs built from what changed below it.
+        # Runs that later repeats were dropped for are kept as they were,
+        # since they still stand in for those repeats; the pyramid is then
+        # approximate (they may outlive the repeats) until built again.
+        lo, hi, delta = start, end, after - end
+        self.count += delta
+        for n, level in enumerate(self.levels):
+            ka, kb, u0, u1 = level.span(lo, hi)
+            if n:
+                part = self.levels[n - 1].coarsen(u0, u1 + delta)
+            else:
+                part = build_base_level(toolpath, u0, u1 + delta, level.cell)
+            kept = [k for k in range(ka, kb) if level.shared[k]]
+            if kept:
+                part = level.copy_runs(kept, u0).joined(part)
+                self.approximate = True
+            level.splice(ka, kb, part, delta)
+            lo, hi, delta = ka, kb, len(part) - (kb - ka)
+
+    def level_for(self, scale, max_error_px=1.0):
+        for level in reversed(self.levels):
+            if level.error * scale <= max_error_px:
+                return level
+        return None
+
+
+def choose_base_cell(toolpath):
+    if not len(toolpath):
+        return 1.0
+    extent = max(max(toolpath.xmax) - min(toolpath.xmin),
+                 max(toolpath.ymax) - min(toolpath.ymin), 1e-6)
+    return extent / LOD_BASE_DIVISIONS
+
+
+def lod_key(motion, z):
+    # Moves that every viewer styles alike (they only tell rapids, lines and
+    # arcs and cut/not cut apart) can share a run
+    return min(motion, MOVE_CW), z < 0
+
+
+def build_base_level(tp, start, end, cell):
+    level = LodLevel(cell)
+    key = None
+    end_x = end_y = None
+    for i in range(start, end):
+        motion = tp.motion[i]
+        z = tp.z1[i]
+        x0, y0 = tp.x0[i], tp.y0[i]
+        if key != lod_key(motion, z) or x0 != end_x or y0 != end_y:
+            if key is not None:
+                level.end_run()
+            level.begin_run(i, motion, z, x0, y0)
+            key = lod_key(motion, z)
+        x1, y1 = tp.x1[i], tp.y1[i]
+        if motion <= MOVE_LINE:
+            level.add_point(x1, y1)
+        else:
+            cx, cy, radius = tp.cx[i], tp.cy[i], tp.radius[i]
+            clockwise = motion == MOVE_CW
+            steps = chord_steps(radius, arc_sweep(x0, y0, x1, y1, cx, cy, clockwise), cell / 2)
+            points = arc_points(x0, y0, x1, y1, cx, cy, radius, clockwise, steps)
+            for p in range(2, len(points), 2):
+                level.add_point(points[p], points[p + 1])
+        level.last[-1] = i + 1
+        end_x, end_y = x1, y1
+    if key is not None:
+        level.end_run()
+    return level
+
+
+def run_points(level, k, scale, ox, oy):
+    # Flat point list of run k under the mapping (x * scale + ox, oy - y * scale)
+    a, b = level.run_points(k)
+    points = [0.0] * (2 * (b - a))
+    points[0::2] = [x * scale + ox for x in level.xs[a:b]]
+    points[1::2] = [oy - y * scale for y in level.ys[a:b]]
+    return points
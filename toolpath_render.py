@@ -0,0 +1,288 @@
+import math
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageDraw
+
+from toolpath import MOVE_CW
+from toolpath_lod import run_points
+
+TILE_SIZE = 256
+TILE_CACHE_SIZE = 256
+CHORD_ERROR_PX = 0.25  # max distance between an arc and its chords, in pixels
+LINE_PAD = 4  # pixels, covers line widths spilling over a tile edge
+
+
+class TileRenderer:
+    # Rasterizes a Toolpath into fixed-size PIL tiles. Tiles live in an LRU
+    # keyed by (scale, tx, ty) in "world pixel" space (x * scale, -y * scale),
+    # so panning only renders the tiles that newly come into view.
+    #
+    # style(motion, z) -> (color, width)
+    def __init__(self, style, background="black",
+                 tile_size=TILE_SIZE, cache_size=TILE_CACHE_SIZE):
+        self.style = style
+        self.background = background
+        self.tile_size = tile_size
+        self.cache_size = cache_size
+        self.tiles = OrderedDict()
+        self.toolpath = None
+        self.count = 0
+
+    def set_toolpath(self, toolpath):
+        self.toolpath = toolpath
+        self.invalidate()
+
+    def invalidate(self):
+        self.tiles.clear()
+        self.count = 0
+
+    def invalidate_rect(self, rect):
+        # Segments inside the world rectangle rect were spliced (see
+        # Toolpath.replace): only the tiles they cross are rendered again.
+        # Tiles still streaming in are dropped too, their counts are stale.
+        xmin, ymin, xmax, ymax = rect
+        for key in list(self.tiles):
+            scale, tx, ty = key
+            tile = self.tiles[key]
+            txmin, tymin, txmax, tymax = self.tile_rect(scale, [(tx, ty, tile)])
+            if tile[2] != self.count or (txmin <= xmax and txmax >= xmin and tymin <= ymax and tymax >= ymin):
+                del self.tiles[key]
+            else:
+                tile[2] = len(self.toolpath)
+        self.count = len(self.toolpath)
+
+    def render(self, scale, ox, oy, width, height):
+        # Viewport image for the canvas mapping (x * scale + ox, oy - y * scale)
+        ts = self.tile_size
+        ox = int(round(ox))
+        oy = int(round(oy))
+        tx0 = (-ox) // ts
+        ty0 = (-oy) // ts
+        tx1 = (width - 1 - ox) // ts
+        ty1 = (height - 1 - oy) // ts
+        wanted = [(tx, ty) for ty in range(ty0, ty1 + 1) for tx in range(tx0, tx1 + 1)]
+        self.update_tiles(scale, wanted)
+
+        image = Image.new("RGB", (width, height), self.background)
+        for tx, ty in wanted:
+            image.paste(self.tiles[(scale, tx, ty)][0], (tx * ts + ox, ty * ts + oy))
+        return image
+
+    def update_tiles(self, scale, wanted):
+        tp = self.toolpath
+        total = len(tp) if tp is not None else 0
+        if total != self.count:
+            # Segments were streamed in since the last render: drop tiles of
+            # other zoom levels, and let tiles of this one catch up below.
+            for key in [key for key in self.tiles if key[0] != scale]:
+                del self.tiles[key]
+            self.count = total
+
+        jobs = {}
+        for tx, ty in wanted:
+            key = (scale, tx, ty)
+            tile = self.tiles.get(key)
+            if tile is None:
+                image = Image.new("RGB", (self.tile_size, self.tile_size), self.background)
+                tile = [image, ImageDraw.Draw(image), 0]
+                self.tiles[key] = tile
+            else:
+                self.tiles.move_to_end(key)
+            if tile[2] < total:
+                jobs.setdefault(tile[2], []).append((tx, ty, tile))
+
+        level = tp.lod.level_for(scale) if tp is not None and tp.lod is not None else None
+        for start, tiles in jobs.items():
+            if start == 0 and level is not None:
+                # Zoomed out far enough for a simplified copy to be pixel exact
+                runs = level.runs_in(*self.tile_rect(scale, tiles))
+                polylines = ((run_points(level, k, scale, 0, 0), self.style(level.motion[k], level.z[k]))
+                             for k in runs)
+            else:
+                if start == 0 and tp.index is not None:
+                    ids = tp.index.query(tp, *self.tile_rect(scale, tiles))
+                else:
+                    ids = range(start, total)
+                polylines = toolpath_polylines(tp, ids, scale, 0, 0, self.style)
+            self.draw_polylines(polylines, tiles)
+            for _, _, tile in tiles:
+                tile[2] = total
+
+        while len(self.tiles) > max(self.cache_size, len(wanted)):
+            self.tiles.popitem(last=False)
+
+    def tile_rect(self, scale, tiles):
+        # World rectangle covered by a block of tiles
+        ts = self.tile_size
+        pad = LINE_PAD
+        xmin = (min(tx for tx, _, _ in tiles) * ts - pad) / scale
+        xmax = ((max(tx for tx, _, _ in tiles) + 1) * ts + pad) / scale
+        ymin = -((max(ty for _, ty, _ in tiles) + 1) * ts + pad) / scale
+        ymax = -(min(ty for _, ty, _ in tiles) * ts - pad) / scale
+        return xmin, ymin, xmax, ymax
+
+    def draw_polylines(self, polylines, tiles):
+        # polylines yields (world pixel points, (color, width))
+        ts = self.tile_size
+        lookup = {(tx, ty): tile for tx, ty, tile in tiles}
+        min_tx = min(tx for tx, _, _ in tiles)
+        max_tx = max(tx for tx, _, _ in tiles)
+        min_ty = min(ty for _, ty, _ in tiles)
+        max_ty = max(ty for _, ty, _ in tiles)
+        for points, (color, width) in polylines:
+            xs = points[0::2]
+            ys = points[1::2]
+            width = max(1, int(round(width)))
+            pad = width
+            for ty in range(max(min_ty, int(min(ys) - pad) // ts), min(max_ty, int(max(ys) + pad) // ts) + 1):
+                for tx in range(max(min_tx, int(min(xs) - pad) // ts), min(max_tx, int(max(xs) + pad) // ts) + 1):
+                    tile = lookup.get((tx, ty))
+                    if tile is None:
+                        continue
+                    dx = tx * ts
+                    dy = ty * ts
+                    shifted = [v - dx if k % 2 == 0 else v - dy for k, v in enumerate(points)]
+                    tile[1].line(shifted, fill=color, width=width)
+
+
+class RenderWorker:
+    # Runs a TileRenderer on a background thread so the UI thread never waits
+    # for a frame. request() replaces any frame that hasn't started yet, so
+    # only the latest view is rendered while the user keeps panning/zooming;
+    # result() hands out the newest finished frame once.
+    def __init__(self, renderer):
+        self.renderer = renderer
+        self.lock = threading.Lock()
+        self.wake = threading.Condition(self.lock)
+        self.generation = 0
+        self.pending = None
+        self.finished = None
+        self.reset = False
+        self.changed = []  # rects for TileRenderer.invalidate_rect
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def request(self, scale, ox, oy, width, height):
+        with self.lock:
+            self.generation += 1
+            self.pending = (self.generation, scale, ox, oy, width, height)
+            self.wake.notify()
+            return self.generation
+
+    def invalidate(self):
+        # The toolpath was replaced/spliced or the style changed: the next
+        # frame starts from empty tiles.
+        with self.lock:
+            self.reset = True
+
+    def invalidate_rect(self, rect):
+        # Part of the toolpath was spliced: see TileRenderer.invalidate_rect
+        with self.lock:
+            self.changed.append(rect)
+
+    def result(self):
+        # (generation, image) or None
+        with self.lock:
+            frame, self.finished = self.finished, None
+            return frame
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.wake.notify()
+
+    def run(self):
+        while True:
+            with self.lock:
+                while self.pending is None and not self.closed:
+                    self.wake.wait()
+                if self.closed:
+                    return
+                job, self.pending = self.pending, None
+                reset, self.reset = self.reset, False
+                changed, self.changed = self.changed, []
+            if reset:
+                self.renderer.invalidate()
+            else:
+                for rect in changed:
+                    self.renderer.invalidate_rect(rect)
+            try:
+                image = self.renderer.render(*job[1:])
+            except (IndexError, KeyError, RuntimeError):
+                # The UI thread changed the toolpath mid-frame. Tiles may be
+                # half drawn, so start over unless a newer frame is waiting.
+                self.renderer.invalidate()
+                with self.lock:
+                    if self.pending is None:
+                        self.pending = job
+                continue
+            with self.lock:
+                if job[0] == self.generation:
+                    self.finished = (job[0], image)
+
+
+def toolpath_polylines(tp, ids, scale, ox, oy, style):
+    # Batched tessellation of the segments in ids under the mapping
+    # (x * scale + ox, oy - y * scale). Yields (points, (color, width)) with
+    # runs of consecutive, connected, same-style moves joined into a single
+    # polyline.
+    # Arc step counts follow from CHORD_ERROR_PX at this scale and points are
+    # produced by rotating the radius vector, without per-point trigonometry.
+    motion, z1 = tp.motion, tp.z1
+    x0s, y0s, x1s, y1s = tp.x0, tp.y0, tp.x1, tp.y1
+    cxs, cys, radii = tp.cx, tp.cy, tp.radius
+    tolerance = CHORD_ERROR_PX / scale
+    two_pi = 2 * math.pi
+    atan2, cos, sin, acos, ceil = math.atan2, math.cos, math.sin, math.acos, math.ceil
+
+    points = None
+    current = None
+    prev = -2
+    for i in ids:
+        m = motion[i]
+        st = style(m, z1[i])
+        x0, y0 = x0s[i], y0s[i]
+        if i != prev + 1 or st != current or x0 != x1s[prev] or y0 != y1s[prev]:
+            if points:
+                yield points, current
+            points = [x0 * scale + ox, oy - y0 * scale]
+            current = st
+        prev = i
+        append = points.append
+
+        if m >= MOVE_CW:
+            cx, cy, r = cxs[i], cys[i], radii[i]
+            dx = x0 - cx
+            dy = y0 - cy
+            a0 = atan2(dy, dx)
+            a1 = atan2(y1s[i] - cy, x1s[i] - cx)
+            if m == MOVE_CW:
+                if a1 >= a0:
+                    a1 -= two_pi
+            elif a1 <= a0:
+                a1 += two_pi
+            sweep = a1 - a0
+            if r > tolerance:
+                steps = max(1, int(ceil(abs(sweep) / (2 * acos(1 - tolerance / r)))))
+            else:
+                steps = 1
+            step = sweep / steps
+            c = cos(step)
+            s = sin(step)
+            for _ in range(steps - 1):
+                dx, dy = dx * c - dy * s, dx * s + dy * c
+                append((cx + dx) * scale + ox)
+                append(oy - (cy + dy) * scale)
+
+        append(x1s[i] * scale + ox)
+        append(oy - y1s[i] * scale)
+    if points:
+        yield points, current
+
+
+def segment_points(tp, i, scale, ox, oy):
+    # Flat point list of segment i under the mapping (x * scale + ox, oy - y * scale)
+    for points, _ in toolpath_polylines(tp, (i,), scale, ox, oy, lambda motion, z: None):
+        return points
@@ -0,0 +1,264 @@
+import array
+import bisect
+import itertools
+import math
+import time
+import tkinter as tk
+
+from toolpath import MOVE_CW, RAPID_RATE, arc_angles, format_duration, segment_times
+from toolpath_render import toolpath_polylines
+
+FRAME_SECONDS = 1 / 60
+SPEEDS = (1, 10, 100, 1000, 10000)
+SCRUB_STEPS = 1000
+SIM_TAG = "simulation"
+TOOL_RADIUS = 5  # pixels
+PARTIAL_ARC_POINTS = 8
+REBUILD_RATIO = 2.0
+
+
+def segment_point(tp, i, f):
+    # Point at fraction f (0..1) along segment i, in XY
+    x0, y0, x1, y1 = tp.x0[i], tp.y0[i], tp.x1[i], tp.y1[i]
+    if tp.motion[i] >= MOVE_CW:
+        cx, cy, r = tp.cx[i], tp.cy[i], tp.radius[i]
+        start, end = arc_angles(x0, y0, x1, y1, cx, cy, tp.motion[i] == MOVE_CW)
+        angle = start + (end - start) * f
+        return cx + r * math.cos(angle), cy + r * math.sin(angle)
+    return x0 + (x1 - x0) * f, y0 + (y1 - y0) * f
+
+
+class Simulation:
+    # Plays a toolpath back on a canvas in machine time (segment_times) times
+    # speed. The traversed cut is drawn on top of the viewer's own rendering
+    # and only grows: each frame creates items for the segments finished since
+    # the last one; the partially cut segment and the tool marker are single
+    # items moved with coords(). Pans and zooms scale/move the existing items
+    # like CanvasToolpathView does.
+    #
+    # Frames are paced by time.monotonic(): the playback position is derived
+    # from the wall clock, not counted per tick, and every tick sleeps until
+    # the next frame deadline, skipping frames it was too late for. A slow
+    # frame at 1000x therefore drops frames instead of slowing the job down.
+    #
+    # Same draw(scale, ox, oy) interface as the views; call it after the view.
+    def __init__(self, canvas, style, rapid_rate=RAPID_RATE, on_frame=None):
+        self.canvas = canvas
+        self.style = style
+        self.rapid_rate = rapid_rate
+        self.on_frame = on_frame
+        self.speed = 100
+        self.playing = False
+        self.job = None
+        self.scale = self.ox = self.oy = None
+        self.built_scale = None
+        self.set_toolpath(None)
+
+    def set_toolpath(self, toolpath):
+        self.pause()
+        self.toolpath = toolpath
+        self.ends = array.array("d")  # ends[i]: machine time at which segment i is done
+        self.total = 0.0
+        self.stale_from = 0 if toolpath is not None else None  # ends are wrong from this segment on
+        self.update_times()
+        self.time = 0.0
+        self.clear()
+        self.notify()
+
+    def toolpath_changed(self, first):
+        # The toolpath was edited in place from segment first on. Times are
+        # only recomputed from there, and only once they are needed: right
+        # away if playback has started (keeping its position), else on play.
+        if self.toolpath is None:
+            return
+        self.stale_from = first if self.stale_from is None else min(first, self.stale_from)
+        if not self.playing and not self.time:
+            self.clear()  # just the tool marker at the start, drawn again on play
+            return
+        if first < self.drawn:
+            self.clear()
+        self.update_times()
+        self.seek(self.time)
+
+    def update_times(self):
+        first = self.stale_from
+        if first is None:
+            return
+        self.stale_from = None
+        del self.ends[first:]
+        times = itertools.accumulate(segment_times(self.toolpath, self.rapid_rate, first),
+                                     initial=self.ends[-1] if self.ends else 0.0)
+        next(times)
+        self.ends.extend(times)
+        self.total = self.ends[-1] if self.ends else 0.0
+
+    def clear(self):
+        self.canvas.delete(SIM_TAG)
+        self.drawn = 0
+        self.partial = self.tool = None
+
+    def play(self):
+        self.update_times()
+        if self.playing or not self.total:
+            return
+        if self.time >= self.total:
+            self.seek(0.0)
+        self.playing = True
+        self.anchor()
+        self.deadline = time.monotonic()
+        self.tick()
+
+    def pause(self):
+        self.playing = False
+        if self.job is not None:
+            self.canvas.after_cancel(self.job)
+            self.job = None
+
+    def set_speed(self, speed):
+        self.speed = speed
+        self.anchor()
+
+    def anchor(self):
+        # Playback position is anchor_time + (now - anchor_clock) * speed
+        self.anchor_clock = time.monotonic()
+        self.anchor_time = self.time
+
+    def tick(self):
+        self.job = None
+        now = time.monotonic()
+        self.seek(self.anchor_time + (now - self.anchor_clock) * self.speed)
+        if self.time >= self.total:
+            self.playing = False
+            self.notify()
+            return
+        self.deadline += FRAME_SECONDS
+        if self.deadline < now:
+            self.deadline = now + FRAME_SECONDS
+        delay = self.deadline - time.monotonic()
+        self.job = self.canvas.after(max(1, int(delay * 1000)), self.tick)
+
+    def seek(self, t):
+        # Jump to machine time t; going backwards redraws the cut from the start
+        self.update_times()
+        self.time = min(max(t, 0.0), self.total)
+        if self.playing:
+            self.anchor_time = self.time
+            self.anchor_clock = time.monotonic()
+        k = bisect.bisect_right(self.ends, self.time)  # segments before k are done
+        if k < self.drawn:
+            self.clear()
+        self.draw_done(k)
+        self.draw_current(k)
+        self.notify()
+
+    def move_items(self, scale, ox, oy):
+        f = scale / self.scale
+        self.canvas.scale(SIM_TAG, 0, 0, f, f)
+        self.canvas.move(SIM_TAG, ox - self.ox * f, oy - self.oy * f)
+
+    def preview(self, scale, ox, oy):
+        # Mid-gesture: move what is drawn, never rebuild
+        if self.scale is not None:
+            self.move_items(scale, ox, oy)
+        self.scale, self.ox, self.oy = scale, ox, oy
+
+    def draw(self, scale, ox, oy):
+        if self.scale is not None and self.drawn:
+            ratio = scale / self.built_scale
+            if not 1 / REBUILD_RATIO < ratio < REBUILD_RATIO:
+                self.clear()
+            else:
+                self.move_items(scale, ox, oy)
+        self.scale, self.ox, self.oy = scale, ox, oy
+        # The view may have created items since; frames only add on top
+        self.canvas.tag_raise(SIM_TAG)
+        if self.toolpath is not None and self.stale_from is None:
+            self.draw_done(bisect.bisect_right(self.ends, self.time))
+            self.draw_current(self.drawn)
+
+    def draw_done(self, k):
+        if self.scale is None or k <= self.drawn:
+            return
+        if not self.drawn:
+            self.built_scale = self.scale
+        create_line = self.canvas.create_line
+        for points, (color, width) in toolpath_polylines(self.toolpath, range(self.drawn, k), self.scale,
+                                                         self.ox, self.oy, self.style):
+            create_line(*points, fill=color, width=width, tags=SIM_TAG)
+        self.drawn = k
+
+    def draw_current(self, k):
+        # Partially cut segment k up to the tool, and the tool itself
+        tp = self.toolpath
+        if self.scale is None or tp is None or not len(tp):
+            return
+        canvas = self.canvas
+        if self.tool is None:
+            self.partial = canvas.create_line(0, 0, 0, 0, state=tk.HIDDEN, tags=SIM_TAG)
+            self.tool = canvas.create_oval(0, 0, 0, 0, outline="red", width=2, tags=SIM_TAG)
+        scale, ox, oy = self.scale, self.ox, self.oy
+        if k < len(tp):
+            start = self.ends[k - 1] if k else 0.0
+            duration = self.ends[k] - start
+            f = (self.time - start) / duration if duration > 0 else 0.0
+            steps = PARTIAL_ARC_POINTS if tp.motion[k] >= MOVE_CW else 1
+            points = []
+            for n in range(steps + 1):
+                x, y = segment_point(tp, k, f * n / steps)
+                points += [x * scale + ox, oy - y * scale]
+            color, width = self.style(tp.motion[k], tp.z1[k])
+            canvas.coords(self.partial, *points)
+            canvas.itemconfig(self.partial, fill=color, width=width, state=tk.NORMAL if f > 0 else tk.HIDDEN)
+            x, y = points[-2:]
+        else:
+            canvas.itemconfig(self.partial, state=tk.HIDDEN)
+            x, y = tp.x1[-1] * scale + ox, oy - tp.y1[-1] * scale
+        r = TOOL_RADIUS
+        canvas.coords(self.tool, x - r, y - r, x + r, y + r)
+        canvas.tag_raise(self.partial)
+        canvas.tag_raise(self.tool)
+
+    def notify(self):
+        if self.on_frame:
+            self.on_frame(self)
+
+
+class SimulationBar(tk.Frame):
+    # Play/pause, speed multiplier, scrub slider and clock for a Simulation
+    def __init__(self, master, simulation):
+        super().__init__(master)
+        self.simulation = simulation
+        simulation.on_frame = self.on_frame
+        self.step = 0
+        self.play_button = tk.Button(self, text="Play", width=6, command=self.toggle)
+        self.play_button.pack(side=tk.LEFT)
+        self.speed_var = tk.StringVar(value=f"{simulation.speed}x")
+        tk.OptionMenu(self, self.speed_var, *[f"{s}x" for s in SPEEDS], command=self.on_speed).pack(side=tk.LEFT)
+        self.clock = tk.Label(self, text="", width=20)
+        self.clock.pack(side=tk.RIGHT)
+        self.position = tk.Scale(self, from_=0, to=SCRUB_STEPS, orient=tk.HORIZONTAL, showvalue=False,
+                                 command=self.on_scrub)
+        self.position.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.on_frame(simulation)
+
+    def toggle(self):
+        if self.simulation.playing:
+            self.simulation.pause()
+        else:
+            self.simulation.play()
+        self.on_frame(self.simulation)
+
+    def on_speed(self, value):
+        self.simulation.set_speed(int(value.rstrip("x")))
+
+    def on_scrub(self, value):
+        # Also called back for the value set from on_frame, which is no scrub
+        if int(value) != self.step and self.simulation.total:
+            self.simulation.seek(self.simulation.total * int(value) / SCRUB_STEPS)
+
+    def on_frame(self, simulation):
+        total = simulation.total
+        self.step = int(simulation.time / total * SCRUB_STEPS) if total else 0
+        self.position.set(self.step)
+        self.play_button.config(text="Pause" if simulation.playing else "Play")
+        self.clock.config(text=f"{format_duration(simulation.time)} / {format_duration(total)}")
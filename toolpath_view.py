@@ -0,0 +1,304 @@
+from PIL import ImageTk
+
+from toolpath_lod import run_points
+from toolpath_render import RenderWorker, TileRenderer, segment_points, toolpath_polylines
+
+TAG = "toolpath"
+PICK_RADIUS = 6  # pixels
+FRAME_POLL_MS = 15
+FRAME_MS = 16  # one display frame at 60 Hz
+SETTLE_MS = 150  # a gesture is over once the events stop for this long
+
+
+class ToolpathView:
+    # Shared helpers for the canvas views; subclasses keep self.scale, self.ox
+    # and self.oy up to date with the last draw().
+    def viewport(self):
+        # Visible area in world coordinates: (xmin, ymin, xmax, ymax)
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        return (-self.ox / self.scale, (self.oy - height) / self.scale,
+                (width - self.ox) / self.scale, self.oy / self.scale)
+
+    def to_world(self, x, y):
+        return (x - self.ox) / self.scale, (self.oy - y) / self.scale
+
+    def pick(self, x, y, radius=PICK_RADIUS):
+        # Nearest segment id to canvas point (x, y) within radius pixels, or None
+        tp = self.toolpath
+        if tp is None or tp.index is None or self.scale is None:
+            return None
+        wx, wy = self.to_world(x, y)
+        hit = tp.index.nearest(tp, wx, wy, radius / self.scale)
+        return None if hit is None else hit[0]
+
+    def highlight(self, i, tag, color="yellow", width=3):
+        self.canvas.delete(tag)
+        if i is None or self.scale is None:
+            return
+        points = segment_points(self.toolpath, i, self.scale, self.ox, self.oy)
+        self.canvas.create_line(*points, fill=color, width=width, tags=tag)
+
+    def close(self):
+        # Called when the view is swapped out for another one
+        self.clear()
+
+
+class RedrawScheduler:
+    # Coalesces the redraws of pan/zoom events. Tk delivers motion and wheel
+    # events much faster than a full draw can keep up with, so handlers only
+    # update the transform and call request(): preview() then runs at most
+    # once per display frame, and render() once after the events stop.
+    def __init__(self, widget, preview, render, frame_ms=FRAME_MS, settle_ms=SETTLE_MS):
+        self.widget = widget
+        self.preview = preview
+        self.render = render
+        self.frame_ms = frame_ms
+        self.settle_ms = settle_ms
+        self.frame_job = None
+        self.settle_job = None
+
+    def request(self):
+        if self.frame_job is None:
+            self.frame_job = self.widget.after(self.frame_ms, self.on_frame)
+        if self.settle_job is not None:
+            self.widget.after_cancel(self.settle_job)
+        self.settle_job = self.widget.after(self.settle_ms, self.on_settle)
+
+    def cancel(self):
+        for job in (self.frame_job, self.settle_job):
+            if job is not None:
+                self.widget.after_cancel(job)
+        self.frame_job = self.settle_job = None
+
+    def on_frame(self):
+        self.frame_job = None
+        self.preview()
+
+    def on_settle(self):
+        self.cancel()
+        self.render()
+
+
+class CanvasToolpathView(ToolpathView):
+    # Retained-mode rendering of a Toolpath onto a tk.Canvas. Every segment
+    # is created once as a tagged item; pan and zoom move/scale the existing
+    # items instead of deleting and recreating them. Runs of contiguous moves
+    # become one polyline item. Items are only rebuilt when the zoom drifts
+    # far enough from the scale arcs were tessellated at,
+    # when the view leaves the culled area the items were created for (with a
+    # spatial index), or when a different LOD level becomes the right one.
+    #
+    # World -> canvas mapping: (x * scale + ox, oy - y * scale)
+    # style(motion, z) -> (color, width)
+    # Views sharing a canvas need their own tag.
+    def __init__(self, canvas, style, rebuild_ratio=2.0, tag=TAG):
+        self.canvas = canvas
+        self.style = style
+        self.rebuild_ratio = rebuild_ratio
+        self.tag = tag
+        self.toolpath = None
+        self.count = 0
+        self.built_scale = None
+        self.built_level = None
+        self.covered = None
+        self.scale = self.ox = self.oy = None
+
+    def set_toolpath(self, toolpath):
+        self.toolpath = toolpath
+        self.clear()
+
+    def toolpath_changed(self, rect):
+        # Segments inside the world rectangle rect were spliced (see
+        # Toolpath.replace): items are only rebuilt if it crosses them
+        if rect is None or self.toolpath is None:
+            return
+        if self.covered is None or rects_overlap(self.covered, rect):
+            self.clear()
+        else:
+            self.count = len(self.toolpath)
+
+    def clear(self):
+        self.canvas.delete(self.tag)
+        self.count = 0
+        self.built_scale = None
+        self.built_level = None
+        self.covered = None
+
+    def lod_level(self, scale):
+        tp = self.toolpath
+        return tp.lod.level_for(scale) if tp is not None and tp.lod is not None else None
+
+    def needs_rebuild(self, scale):
+        if self.built_scale is None or self.lod_level(scale) is not self.built_level:
+            return True
+        if self.rebuild_ratio is None:
+            return False
+        ratio = scale / self.built_scale
+        return not (1 / self.rebuild_ratio < ratio < self.rebuild_ratio)
+
+    def move_items(self, scale, ox, oy):
+        f = scale / self.scale
+        if f != 1:
+            self.canvas.scale(self.tag, 0, 0, f, f)
+        dx = ox - self.ox * f
+        dy = oy - self.oy * f
+        if dx or dy:
+            self.canvas.move(self.tag, dx, dy)
+
+    def preview(self, scale, ox, oy):
+        # Stand-in for draw() in the middle of a pan/zoom gesture: the
+        # existing items are moved/scaled, nothing is created or rebuilt
+        if self.scale is not None:
+            self.move_items(scale, ox, oy)
+        self.scale, self.ox, self.oy = scale, ox, oy
+
+    def draw(self, scale, ox, oy):
+        rebuild = self.needs_rebuild(scale)
+        if not rebuild:
+            self.move_items(scale, ox, oy)
+        self.scale, self.ox, self.oy = scale, ox, oy
+
+        tp = self.toolpath
+        if tp is None:
+            return
+        if rebuild or (self.covered is not None and not self.inside_covered()):
+            self.clear()
+            self.built_scale = scale
+            self.built_level = level = self.lod_level(scale)
+            if level is not None or tp.index is not None:
+                # Create items for the viewport plus one viewport of margin on
+                # every side, so short pans stay pure canvas.move calls.
+                xmin, ymin, xmax, ymax = self.viewport()
+                w = xmax - xmin
+                h = ymax - ymin
+                self.covered = (xmin - w, ymin - h, xmax + w, ymax + h)
+            if level is not None:
+                # Zoomed out: one polyline per run of the simplified copy
+                for k in level.runs_in(*self.covered):
+                    color, width = self.style(level.motion[k], level.z[k])
+                    self.canvas.create_line(*run_points(level, k, scale, ox, oy),
+                                            fill=color, width=width, tags=self.tag)
+            elif tp.index is not None:
+                self.create_items(tp.index.query(tp, *self.covered))
+            self.count = len(tp) if self.covered is not None else 0
+
+        # Anything appended since the last draw (streaming loads) is created
+        # directly at the current transform.
+        if self.count < len(tp):
+            ids = range(self.count, len(tp))
+            if self.covered is not None:
+                xmin, ymin, xmax, ymax = self.covered
+                ids = [i for i in ids if tp.xmin[i] <= xmax and tp.xmax[i] >= xmin and
+                       tp.ymin[i] <= ymax and tp.ymax[i] >= ymin]
+            self.create_items(ids)
+            self.count = len(tp)
+
+    def inside_covered(self):
+        xmin, ymin, xmax, ymax = self.viewport()
+        cxmin, cymin, cxmax, cymax = self.covered
+        return cxmin <= xmin and cymin <= ymin and xmax <= cxmax and ymax <= cymax
+
+    def create_items(self, ids):
+        create_line = self.canvas.create_line
+        for points, (color, width) in toolpath_polylines(self.toolpath, ids, self.scale, self.ox, self.oy, self.style):
+            create_line(*points, fill=color, width=width, tags=self.tag)
+
+
+class RasterToolpathView(ToolpathView):
+    # Bitmap rendering of a Toolpath: the canvas holds a single image item
+    # showing the viewport composed from TileRenderer tiles, instead of one
+    # canvas item per segment. Same draw(scale, ox, oy) interface as
+    # CanvasToolpathView so viewers can switch between the two.
+    #
+    # Frames are rendered by a RenderWorker thread. The last finished frame
+    # stays on screen (moved along with pans) until the next one is swapped
+    # in from an after() poll, so draw() returns immediately however large
+    # the program is.
+    def __init__(self, canvas, style, background="black"):
+        self.canvas = canvas
+        self.renderer = TileRenderer(style, background)
+        self.worker = RenderWorker(self.renderer)
+        self.photo = None
+        self.item = None
+        self.shown = 0
+        self.polling = None
+        self.scale = self.ox = self.oy = None
+
+    @property
+    def toolpath(self):
+        return self.renderer.toolpath
+
+    def set_toolpath(self, toolpath):
+        self.renderer.toolpath = toolpath
+        self.worker.invalidate()
+        self.clear()
+
+    def toolpath_changed(self, rect):
+        # Segments inside the world rectangle rect were spliced (see
+        # Toolpath.replace): only the tiles it crosses are rendered again
+        if rect is not None:
+            self.worker.invalidate_rect(rect)
+
+    def set_background(self, color):
+        self.renderer.background = color
+        self.worker.invalidate()
+
+    def clear(self):
+        self.canvas.delete(TAG)
+        self.photo = None
+        self.item = None
+
+    def close(self):
+        self.worker.close()
+        if self.polling is not None:
+            self.canvas.after_cancel(self.polling)
+            self.polling = None
+        self.clear()
+
+    def preview(self, scale, ox, oy):
+        # Pans just slide the last frame along; a bitmap can't be scaled on
+        # the canvas, so zooms ask the worker for a frame straight away
+        if scale != self.scale:
+            self.draw(scale, ox, oy)
+            return
+        if self.item is not None:
+            self.canvas.move(self.item, ox - self.ox, oy - self.oy)
+        self.ox, self.oy = ox, oy
+
+    def draw(self, scale, ox, oy):
+        if self.item is not None and scale == self.scale:
+            self.canvas.move(self.item, ox - self.ox, oy - self.oy)
+        self.scale, self.ox, self.oy = scale, ox, oy
+        width = max(1, self.canvas.winfo_width())
+        height = max(1, self.canvas.winfo_height())
+        self.worker.request(scale, ox, oy, width, height)
+        if self.polling is None:
+            self.polling = self.canvas.after(FRAME_POLL_MS, self.poll)
+
+    def poll(self):
+        frame = self.worker.result()
+        if frame is not None and frame[0] == self.worker.generation:
+            self.shown = frame[0]
+            self.show(frame[1])
+        if self.shown != self.worker.generation:
+            self.polling = self.canvas.after(FRAME_POLL_MS, self.poll)
+        else:
+            self.polling = None
+
+    def show(self, image):
+        if self.photo is not None and (self.photo.width(), self.photo.height()) == image.size:
+            self.photo.paste(image)
+            self.canvas.coords(self.item, 0, 0)
+        else:
+            self.photo = ImageTk.PhotoImage(image)
+            if self.item is None:
+                self.item = self.canvas.create_image(0, 0, anchor="nw", image=self.photo, tags=TAG)
+                self.canvas.tag_lower(self.item)
+            else:
+                self.canvas.itemconfig(self.item, image=self.photo)
+                self.canvas.coords(self.item, 0, 0)
+
+
+def rects_overlap(a, b):
+    return a[0] <= b[2] and a[2] >= b[0] and a[1] <= b[3] and a[3] >= b[1]
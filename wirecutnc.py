@@ -1,13 +1,26 @@
+import array
+import bisect
 import tkinter as tk
 from tkinter import filedialog, messagebox
-import math
-import os
-from PIL import ImageGrab
+
+from toolpath import MOVE_LINE, MOVE_RAPID, Toolpath, stats_text
+from toolpath_check import check_toolpath, load_polygon
+from toolpath_export import write_pdf, write_svg
+from toolpath_index import SegmentGrid
+from toolpath_lines import LineSource, VirtualLineView
+from toolpath_loader import ToolpathLoader, poll_loader
+from toolpath_render import TileRenderer
+from toolpath_sim import Simulation, SimulationBar
+from toolpath_view import CanvasToolpathView, RasterToolpathView, RedrawScheduler
 
 COLOR_RAPID = "gray"
 COLOR_CUT = "green"
 COLOR_SAFE = "blue"
 COLOR_ARC = "orange"
+COLOR_SIM_CUT = "white"
+COLOR_SIM_RAPID = "dim gray"
+COLOR_ISSUE = "red"
+COLOR_BOUNDARY = "yellow"
 
 class GCodeViewer(tk.Tk):
     def __init__(self):
@@ -15,8 +28,10 @@ class GCodeViewer(tk.Tk):
         self.title("NC Viewer")
         self.geometry("1200x700")
 
-        self.gcode_lines = []
-        self.parsed_lines = []
+        self.toolpath = Toolpath()
+        self.loader = None
+        self.lines = None  # LineSource of the open program
+        self.move_ids = array.array("i")  # segment id of every row in the move list
 
         self.canvas = tk.Canvas(self, bg="black")
         self.canvas.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
@@ -33,193 +48,301 @@ class GCodeViewer(tk.Tk):
         self.export_pdf_button = tk.Button(self.text_frame, text="Export PDF", command=self.export_pdf)
         self.export_pdf_button.pack(pady=5)
 
-        self.text_box = tk.Text(self.text_frame, width=50)
+        self.export_svg_button = tk.Button(self.text_frame, text="Export SVG", command=self.export_svg)
+        self.export_svg_button.pack(pady=5)
+
+        self.check_button = tk.Button(self.text_frame, text="Check Stock/Boundary", command=self.check_program)
+        self.check_button.pack(pady=5)
+
+        self.raster_var = tk.BooleanVar(value=True)
+        self.raster_check = tk.Checkbutton(self.text_frame, text="Raster rendering", variable=self.raster_var,
+                                           command=self.toggle_raster)
+        self.raster_check.pack(pady=5)
+
+        self.cancel_button = tk.Button(self.text_frame, text="Cancel Loading", command=self.cancel_load, state=tk.DISABLED)
+        self.cancel_button.pack(pady=5)
+
+        self.simulation = Simulation(self.canvas, self.sim_style)
+        self.sim_bar = SimulationBar(self.text_frame, self.simulation)
+        self.sim_bar.pack(fill=tk.X, pady=5)
+
+        self.status = tk.Label(self.text_frame, text="", anchor="w")
+        self.status.pack(fill=tk.X)
+
+        # Both lists only build the rows on screen, so huge programs load as fast as small ones
+        self.text_box = VirtualLineView(self.text_frame, self.code_row, command=self.on_code_click, width=50)
         self.text_box.pack(fill=tk.BOTH, expand=True)
 
-        self.line_list = tk.Listbox(self.text_frame, width=50)
+        self.line_list = VirtualLineView(self.text_frame, self.move_row, command=self.on_move_click, width=50, height=10)
         self.line_list.pack(fill=tk.BOTH)
 
         self.scale = 5
         self.offset_x = 0
         self.offset_y = 0
+        self.selected = None
+        self.view = self.make_view()
+        # Offending moves found by check_program, drawn over the program
+        self.issues = []
+        self.issue_view = CanvasToolpathView(self.canvas, lambda motion, z2: (COLOR_ISSUE, 4), tag="issues")
+        self.boundary = None
+        self.redraws = RedrawScheduler(self, lambda: self.redraw(preview=True), self.redraw)
 
         self.bind_events()
 
     def bind_events(self):
         self.canvas.bind("<MouseWheel>", self.zoom)
-        self.canvas.bind("<B1-Motion>", self.pan_start)
+        self.canvas.bind("<ButtonPress-1>", self.pan_start)
+        self.canvas.bind("<B1-Motion>", self.pan_move)
         self.canvas.bind("<ButtonRelease-1>", self.pan_end)
 
         self.last_pan = None
+        self.press_pos = None
 
     def pan_start(self, event):
         self.last_pan = (event.x, event.y)
+        self.press_pos = (event.x, event.y)
 
-    def pan_end(self, event):
+    def pan_move(self, event):
         if self.last_pan:
-            dx = event.x - self.last_pan[0]
-            dy = event.y - self.last_pan[1]
-            self.offset_x += dx
-            self.offset_y += dy
-            self.last_pan = None
-            self.redraw()
+            self.offset_x += event.x - self.last_pan[0]
+            self.offset_y += event.y - self.last_pan[1]
+            self.last_pan = (event.x, event.y)
+            self.redraws.request()
+
+    def pan_end(self, event):
+        self.pan_move(event)
+        self.last_pan = None
+        if self.press_pos and abs(event.x - self.press_pos[0]) + abs(event.y - self.press_pos[1]) < 3:
+            self.select_segment(self.view.pick(event.x, event.y))
+        self.press_pos = None
+
+    def select_segment(self, i):
+        self.selected = i
+        self.view.highlight(i, "selection")
+        if i is None:
+            self.text_box.select(None)
+            self.line_list.select(None)
+            return
+        line = self.toolpath.line_no[i]
+        self.text_box.select(line)
+        k = bisect.bisect_left(self.move_ids, i)
+        self.line_list.select(k if k < len(self.move_ids) and self.move_ids[k] == i else None)
+        if self.lines is not None and line < len(self.lines):
+            self.status.config(text=f"Line {line + 1}: {self.lines.line(line).strip()}")
+
+    def code_row(self, k):
+        return self.lines.line(k)
+
+    def move_row(self, k):
+        tp = self.toolpath
+        i = self.move_ids[k]
+        return f"G1 to ({tp.x1[i]:.2f}, {tp.y1[i]:.2f}, {tp.z1[i]:.2f})"
+
+    def on_code_click(self, line):
+        # First segment of the clicked line, if it has one
+        i = bisect.bisect_left(self.toolpath.line_no, line)
+        if i < len(self.toolpath) and self.toolpath.line_no[i] == line:
+            self.select_segment(i)
+
+    def on_move_click(self, k):
+        self.select_segment(self.move_ids[k])
 
     def zoom(self, event):
         delta = 1.1 if event.delta > 0 else 0.9
         self.scale *= delta
-        self.redraw()
+        self.redraws.request()
 
     def open_file(self):
         filepath = filedialog.askopenfilename(filetypes=[("G-code files", "*.nc *.gcode"), ("All files", "*.*")])
         if not filepath:
             return
 
-        with open(filepath, "r") as f:
-            self.gcode_lines = f.readlines()
+        if self.loader:
+            self.loader.cancel()
+        if self.lines:
+            self.lines.close()
+        self.loader = ToolpathLoader(filepath).start()
+        self.toolpath = Toolpath()
+        self.simulation.set_toolpath(None)
+        self.lines = LineSource(filepath, self.toolpath.line_offsets)
+        self.move_ids = array.array("i")
+        self.selected = None
+        self.view.set_toolpath(self.toolpath)
+        self.set_issues([], None)
+        self.text_box.reset()
+        self.line_list.reset()
+        self.add_move_list(0)
+        self.cancel_button.config(state=tk.NORMAL)
+        poll_loader(self, self.loader, self.on_load_chunk, self.on_load_done, self.on_load_cached)
+
+    def on_load_cached(self, toolpath):
+        # The text pane reads lines straight from the file, nothing left to load
+        self.loader.cancel()
+        self.loader = None
+        self.cancel_button.config(state=tk.DISABLED)
+        self.toolpath = toolpath
+        self.lines.offsets = toolpath.line_offsets
+        self.view.set_toolpath(toolpath)
+        self.add_move_list(0)
+        self.status.config(text=stats_text(toolpath))
+        self.simulation.set_toolpath(toolpath)
+        self.redraw()
+
+    def on_load_chunk(self, chunk, text, progress):
+        self.status.config(text=f"Loading... {progress:.0%}")
+        start = len(self.toolpath)
+        self.toolpath.extend(chunk)
+        if self.toolpath.line_offsets is not None:
+            self.lines.offsets = self.toolpath.line_offsets
+        self.add_move_list(start)
+        self.redraw()
 
-        self.text_box.delete("1.0", tk.END)
-        for line in self.gcode_lines:
-            self.text_box.insert(tk.END, line)
+    def on_load_done(self, error):
+        if not error:
+            self.loader.save_cache(self.toolpath)
+        self.loader = None
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status.config(text=stats_text(self.toolpath))
+        self.simulation.set_toolpath(self.toolpath)
+        self.redraw()
+        if error:
+            messagebox.showerror("Open Error", str(error) or type(error).__name__)
+
+    def cancel_load(self):
+        if self.loader:
+            self.loader.cancel()
+            self.loader = None
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status.config(text=f"Cancelled, {len(self.toolpath)} moves loaded")
+
+    def check_program(self):
+        if self.loader or not len(self.toolpath):
+            return
+        # No boundary file: only look for rapids below Z0
+        path = filedialog.askopenfilename(title="Boundary polygon (cancel for rapids only)",
+                                          filetypes=[("Polygon files", "*.txt *.nc *.gcode"), ("All files", "*.*")])
+        boundary = None
+        if path:
+            try:
+                boundary = load_polygon(path)
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Boundary Error", str(e))
+                return
+        issues = check_toolpath(self.toolpath, boundary)
+        self.set_issues(issues, boundary)
+        if not issues:
+            self.status.config(text="No issues found")
+            return
+        lines = sorted({issue.line_no + 1 for issue in issues})
+        shown = ", ".join(str(line) for line in lines[:10]) + (", ..." if len(lines) > 10 else "")
+        self.select_segment(issues[0].segment)
+        self.status.config(text=f"{len(issues)} issues: lines {shown}")
+
+    def set_issues(self, issues, boundary):
+        self.issues = issues
+        self.boundary = boundary
+        marked = None
+        if issues:
+            marked = self.toolpath.take([issue.segment for issue in issues])
+            marked.index = SegmentGrid.build(marked)
+        self.issue_view.set_toolpath(marked)
+        self.canvas.delete("boundary")
+        self.redraw()
 
-        self.parse_gcode()
+    def add_move_list(self, start):
+        tp = self.toolpath
+        self.move_ids.extend(i for i in range(start, len(tp)) if tp.motion[i] == MOVE_LINE)
+        self.line_list.set_count(len(self.move_ids))
+        self.text_box.set_count(len(self.lines))
+
+    def make_view(self):
+        if self.raster_var.get():
+            return RasterToolpathView(self.canvas, self.segment_style, background=self.canvas["bg"])
+        return CanvasToolpathView(self.canvas, self.segment_style)
+
+    def toggle_raster(self):
+        self.view.close()
+        self.canvas.delete("selection")
+        self.view = self.make_view()
+        self.view.set_toolpath(self.toolpath)
         self.redraw()
 
-    def parse_gcode(self):
-        self.parsed_lines = []
-        x, y, z = 0, 0, 0
-        for line in self.gcode_lines:
-            parts = line.strip().split()
-            if not parts:
-                continue
-
-            cmd = parts[0]
-            args = {p[0]: float(p[1:]) for p in parts[1:] if len(p) > 1}
-
-            new_x = args.get("X", x)
-            new_y = args.get("Y", y)
-            new_z = args.get("Z", z)
-
-            if cmd in ("G0", "G1"):
-                self.parsed_lines.append((cmd, x, y, z, new_x, new_y, new_z))
-            elif cmd in ("G2", "G3"):
-                i = args.get("I", 0)
-                j = args.get("J", 0)
-                r = args.get("R", None)
-                self.parsed_lines.append((cmd, x, y, x + i, y + j, new_x, new_y, r))
-
-            x, y, z = new_x, new_y, new_z
-
-        self.line_list.delete(0, tk.END)
-        for line in self.parsed_lines:
-            if line[0] == "G1":
-                self.line_list.insert(tk.END, f"G1 to ({line[4]:.2f}, {line[5]:.2f}, {line[6]:.2f})")
-
-    def redraw(self):
-        self.canvas.delete("all")
-        for line in self.parsed_lines:
-            if line[0] in ("G0", "G1"):
-                _, x1, y1, z1, x2, y2, z2 = line
-                color = COLOR_CUT if z2 < 0 else COLOR_SAFE if line[0] == "G1" else COLOR_RAPID
-                self.draw_line(x1, y1, x2, y2, color)
-            elif line[0] in ("G2", "G3"):
-                self.draw_arc(*line)
-
-    def draw_line(self, x1, y1, x2, y2, color):
-        cx1, cy1 = self.to_canvas_coords(x1, y1)
-        cx2, cy2 = self.to_canvas_coords(x2, y2)
-        self.canvas.create_line(cx1, cy1, cx2, cy2, fill=color, width=2)
-
-    def draw_arc(self, cmd, x1, y1, cx, cy, x2, y2, r):
-        clockwise = cmd == "G2"
-        if r is not None:
-            cx, cy = self.center_from_radius(x1, y1, x2, y2, r, clockwise)
-
-        radius = math.hypot(x1 - cx, y1 - cy)
-        start_angle = math.atan2(y1 - cy, x1 - cx)
-        end_angle = math.atan2(y2 - cy, x2 - cx)
-
-        if clockwise:
-            if end_angle >= start_angle:
-                end_angle -= 2 * math.pi
+    def view_origin(self):
+        canvas_height = self.canvas.winfo_height()
+        return self.offset_x + canvas_height / 2, canvas_height / 2 + self.offset_y
+
+    def redraw(self, preview=False):
+        # preview: pan/zoom in progress, only move what is already drawn
+        origin = self.view_origin()
+        if preview:
+            self.view.preview(self.scale, *origin)
+            self.simulation.preview(self.scale, *origin)
         else:
-            if end_angle <= start_angle:
-                end_angle += 2 * math.pi
-
-        segments = max(10, int(abs(end_angle - start_angle) * radius * self.scale / 5))
-
-        prev_x, prev_y = x1, y1
-        for step in range(1, segments + 1):
-            angle = start_angle + (end_angle - start_angle) * step / segments
-            nx = cx + radius * math.cos(angle)
-            ny = cy + radius * math.sin(angle)
-            self.draw_line(prev_x, prev_y, nx, ny, COLOR_ARC)
-            prev_x, prev_y = nx, ny
-
-    def center_from_radius(self, x1, y1, x2, y2, r, clockwise):
-        dx = x2 - x1
-        dy = y2 - y1
-        chord_len = math.hypot(dx, dy)
-
-        mx = (x1 + x2) / 2
-        my = (y1 + y2) / 2
-
-        h = math.sqrt(abs(r**2 - (chord_len / 2)**2))
-        ux = -dy / chord_len
-        uy = dx / chord_len
-
-        cx1 = mx + h * ux
-        cy1 = my + h * uy
-        cx2 = mx - h * ux
-        cy2 = my - h * uy
-
-        def cross_z(cx, cy):
-            vx1 = x1 - cx
-            vy1 = y1 - cy
-            vx2 = x2 - cx
-            vy2 = y2 - cy
-            return vx1 * vy2 - vy1 * vx2
-
-        if clockwise:
-            return (cx1, cy1) if cross_z(cx1, cy1) < 0 else (cx2, cy2)
+            self.view.draw(self.scale, *origin)
+            self.simulation.draw(self.scale, *origin)
+        if self.issues:
+            (self.issue_view.preview if preview else self.issue_view.draw)(self.scale, *origin)
+            self.canvas.tag_raise("issues")
+        if self.boundary is not None:
+            self.draw_boundary()
+        if self.selected is not None:
+            self.view.highlight(self.selected, "selection")
+
+    def draw_boundary(self):
+        ox, oy = self.view_origin()
+        coords = []
+        for x, y in self.boundary.points + self.boundary.points[:1]:
+            coords += (x * self.scale + ox, oy - y * self.scale)
+        if self.canvas.find_withtag("boundary"):
+            self.canvas.coords("boundary", *coords)
         else:
-            return (cx1, cy1) if cross_z(cx1, cy1) > 0 else (cx2, cy2)
+            self.canvas.create_line(*coords, fill=COLOR_BOUNDARY, dash=(4, 2), tags="boundary")
+        self.canvas.tag_raise("boundary")
 
-    def to_canvas_coords(self, x, y):
-        canvas_height = self.canvas.winfo_height()
-        cx = (x * self.scale) + self.offset_x + canvas_height / 2
-        cy = canvas_height / 2 - (y * self.scale) + self.offset_y
-        return cx, cy
+    def segment_style(self, motion, z2):
+        if motion > MOVE_LINE:
+            return COLOR_ARC, 2
+        return (COLOR_CUT if z2 < 0 else COLOR_SAFE if motion == MOVE_LINE else COLOR_RAPID), 2
+
+    def sim_style(self, motion, z2):
+        return (COLOR_SIM_RAPID if motion == MOVE_RAPID else COLOR_SIM_CUT), 3
 
     def export_png(self):
         try:
             file_path = filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG", "*.png")])
             if not file_path:
                 return
-            self.update()
-            x = self.canvas.winfo_rootx()
-            y = self.canvas.winfo_rooty()
-            w = self.canvas.winfo_width()
-            h = self.canvas.winfo_height()
-            image = ImageGrab.grab(bbox=(x, y, x + w, y + h))
+            # Rendered offscreen from the toolpath, so the window doesn't have to be visible
+            renderer = TileRenderer(self.segment_style, self.canvas["bg"])
+            renderer.toolpath = self.toolpath
+            image = renderer.render(self.scale, *self.view_origin(),
+                                    self.canvas.winfo_width(), self.canvas.winfo_height())
             image.save(file_path)
             messagebox.showinfo("Saved", f"PNG saved: {file_path}")
         except Exception as e:
             messagebox.showerror("Export Error", str(e))
 
     def export_pdf(self):
+        # Whole program, written straight from the toolpath with true arcs
         try:
-            from reportlab.pdfgen import canvas as pdf_canvas
             file_path = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF", "*.pdf")])
             if not file_path:
                 return
-            ps_file = file_path + ".ps"
-            self.canvas.postscript(file=ps_file, colormode='color')
-            os.system(f"gs -sDEVICE=pdfwrite -o \"{file_path}\" \"{ps_file}\"")
-            os.remove(ps_file)
+            write_pdf(self.toolpath, file_path, self.segment_style, background=self.canvas["bg"])
             messagebox.showinfo("Saved", f"PDF saved: {file_path}")
         except Exception as e:
             messagebox.showerror("Export Error", str(e))
 
+    def export_svg(self):
+        try:
+            file_path = filedialog.asksaveasfilename(defaultextension=".svg", filetypes=[("SVG", "*.svg")])
+            if not file_path:
+                return
+            write_svg(self.toolpath, file_path, self.segment_style, background=self.canvas["bg"])
+            messagebox.showinfo("Saved", f"SVG saved: {file_path}")
+        except Exception as e:
+            messagebox.showerror("Export Error", str(e))
+
 
 # 🔁 ✅ MAIN ENTRY POINT: this is required to show your window
 if __name__ == "__main__":